@@ -1,6 +1,7 @@
 '''This script contains all of the functions used in our study'''
 
 from __future__ import print_function
+import functools
 import math
 import numpy as np
 import scipy as sp
@@ -10,8 +11,202 @@ from scipy import stats as stats
 from scipy import optimize as opt
 from scipy import interpolate as interpolate
 import time
-import mpmath
-import random
+
+def count_histogram(data):
+    '''
+    Summarise a dataset of secondary case counts as its distinct values and the
+    number of times each one is observed.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset, or a histogram (values, counts) such as one produced
+            by this function or a row of bootstrap_count_matrix
+
+    Returns
+    -------
+        values : array
+            distinct values observed in data, in increasing order
+        counts : array
+            number of times each distinct value is observed, values with a
+            count of zero being dropped
+    '''
+    if (isinstance(data,tuple) and len(data)==2 and
+            all(np.ndim(d)==1 for d in data)):
+        values,counts=np.asarray(data[0]),np.asarray(data[1])
+        if np.all(counts>0):
+            return values,counts
+        return values[counts>0],counts[counts>0]
+    values,counts=np.unique(np.asarray(data),return_counts=True)
+    return values,counts
+
+def _expand_histogram(values,counts,*params):
+    '''
+    Reshape a count histogram so that its values run along the first axis and
+    broadcast against parameter arrays of any shape.
+    '''
+    shape=(-1,)+(1,)*np.broadcast(*params).ndim
+    return values.reshape(shape),counts.reshape(shape)
+
+def histogram_mean(data):
+    '''
+    Calculate the sample mean of a dataset or count histogram.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+
+    Returns
+    -------
+        : float
+            sample mean
+    '''
+    values,counts=count_histogram(data)
+    return np.sum(values*counts)/np.sum(counts)
+
+def histogram_var(data):
+    '''
+    Calculate the sample variance (normalised by the sample size, as in np.var)
+    of a dataset or count histogram.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+
+    Returns
+    -------
+        : float
+            sample variance
+    '''
+    values,counts=count_histogram(data)
+    sample_mean=np.sum(values*counts)/np.sum(counts)
+    return np.sum(counts*(values-sample_mean)**2)/np.sum(counts)
+
+def bootstrap_count_matrix(data,no_samples,rng=None,positive_mean=True):
+    '''
+    Draw bootstrap replicates of a dataset as count histograms. Resampling n
+    cases with replacement from a dataset is a multinomial draw of n over its
+    distinct values with probabilities given by their observed frequencies,
+    so all of the replicates are generated in one call and each is stored as
+    a row of counts rather than as a list of n cases.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+        no_samples : int
+            number of bootstrap replicates to draw
+        rng : numpy Generator
+            random number generator to draw from, a new one seeded from the
+            operating system is used if None
+        positive_mean : bool
+            if True, replicates with a sample mean of zero are redrawn
+
+    Returns
+    -------
+        values : array
+            distinct values observed in data
+        count_matrix : array
+            no_samples by len(values) array whose rows are the numbers of times
+            each value appears in each replicate, so that
+            (values, count_matrix[i]) is the histogram of replicate i
+    '''
+    values,counts=count_histogram(data)
+    if rng is None:
+        rng=np.random.default_rng()
+    sample_size=np.sum(counts)
+    freqs=counts/sample_size
+    count_matrix=rng.multinomial(sample_size,freqs,size=no_samples)
+    if positive_mean:
+        if not np.any(values>0):
+            raise ValueError('Cannot resample a positive mean from data with no nonzero values')
+        zero_mean=np.nonzero(count_matrix[:,values>0].sum(axis=1)==0)[0]
+        while len(zero_mean)>0:
+            count_matrix[zero_mean]=rng.multinomial(sample_size,freqs,size=len(zero_mean))
+            zero_mean=zero_mean[count_matrix[zero_mean][:,values>0].sum(axis=1)==0]
+    return values,count_matrix
+
+def bootstrap_replicate_counts(data,replicates,seed,key=(),attempts=0,
+                               positive_mean=True):
+    '''
+    Draw chosen bootstrap replicates of a dataset as count histograms, as in
+    bootstrap_count_matrix, but with each replicate drawn from its own random
+    number stream. Replicate i is drawn by a generator seeded from a numpy
+    SeedSequence with entropy seed and spawn key key+(i,attempt), so it depends
+    on nothing but these, and any subset of the replicates of a run can be
+    drawn separately, in any order, and merged.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+        replicates : int or array
+            indices of the replicates to draw
+        seed : int
+            master seed of the bootstrap run
+        key : tuple
+            integers identifying the stream of replicates, for instance the
+            dataset, within the run
+        attempts : int or array
+            number of times each replicate has already been drawn and
+            discarded, for instance because it could not be fitted
+        positive_mean : bool
+            if True, replicates with a sample mean of zero are redrawn from
+            the same stream
+
+    Returns
+    -------
+        values : array
+            distinct values observed in data
+        count_matrix : array
+            len(replicates) by len(values) array whose rows are the numbers
+            of times each value appears in each replicate
+    '''
+    values,counts=count_histogram(data)
+    replicates=np.atleast_1d(replicates)
+    attempts=np.broadcast_to(attempts,replicates.shape)
+    sample_size=np.sum(counts)
+    freqs=counts/sample_size
+    if positive_mean and not np.any(values>0):
+        raise ValueError('Cannot resample a positive mean from data with no nonzero values')
+    count_matrix=np.empty((len(replicates),len(values)),dtype=np.int64)
+    for row,(i,attempt) in enumerate(zip(replicates,attempts)):
+        rng=np.random.default_rng(np.random.SeedSequence(
+            seed,spawn_key=tuple(key)+(int(i),int(attempt))))
+        count_matrix[row]=rng.multinomial(sample_size,freqs)
+        while positive_mean and count_matrix[row,values>0].sum()==0:
+            count_matrix[row]=rng.multinomial(sample_size,freqs)
+    return values,count_matrix
+
+def jackknife_count_matrix(data):
+    '''
+    Build the leave-one-out datasets of the jackknife as count histograms.
+    Leaving out any one of the observations of the same value gives the same
+    dataset, so there is one row per distinct value rather than one per
+    observation, and each row stands for as many leave-one-out datasets as the
+    value has observations.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+
+    Returns
+    -------
+        values : array
+            distinct values observed in data
+        counts : array
+            number of times each value is observed, the multiplicity of each
+            row of count_matrix
+        count_matrix : array
+            len(values) by len(values) array whose row k holds the counts of
+            the dataset with one observation of values[k] left out
+    '''
+    values,counts=count_histogram(data)
+    count_matrix=counts[None,:]-np.eye(len(values),dtype=counts.dtype)
+    return values,counts,count_matrix
 
 def poisson_loglh(data,lmbd):
     '''
@@ -19,19 +214,19 @@ def poisson_loglh(data,lmbd):
 
     Parameters
     ----------
-        data : list
-            sample dataset
-        lmbd : float
+        data : list or tuple
+            sample dataset or count histogram
+        lmbd : float or array
             estimated Poisson parameter
 
     Returns
     -------
-        llh : float
+        llh : float or array
             log likelihood of lmbd given data
     '''
-    llh=0
-    for x in data:
-        llh+=np.log(stats.poisson.pmf(x,lmbd))
+    values,counts=count_histogram(data)
+    x,n=_expand_histogram(values,counts,lmbd)
+    llh=np.sum(n*stats.poisson.logpmf(x,lmbd),axis=0)
     return llh
 
 def geo_loglh(data,lmbd):
@@ -40,19 +235,19 @@ def geo_loglh(data,lmbd):
 
     Parameters
     ----------
-        data : list
-            sample dataset
-        lmbd : float
+        data : list or tuple
+            sample dataset or count histogram
+        lmbd : float or array
             estimated geometric parameter
 
     Returns
     -------
-        llh : float
+        llh : float or array
             log likelihood of lmbd given data
     '''
-    llh=0
-    for x in data:
-        llh+=np.log(stats.geom.pmf(x,1/(lmbd+1),-1))
+    values,counts=count_histogram(data)
+    x,n=_expand_histogram(values,counts,lmbd)
+    llh=np.sum(n*stats.geom.logpmf(x,1/(np.asarray(lmbd)+1),-1),axis=0)
     return llh
 
 def neg_bin_loglh_theta(data,lmbd,theta):
@@ -61,32 +256,35 @@ def neg_bin_loglh_theta(data,lmbd,theta):
 
     Parameters
     ----------
-        data : list
-            sample dataset
-        lmbd : float
+        data : list or tuple
+            sample dataset or count histogram
+        lmbd : float or array
             estimated mean of negative binomial distribution
-        theta : float
+        theta : float or array
             estimated overdispersion of negative binomial distribution
 
     Returns
     -------
-        llh : float
+        llh : float or array
             log likelihood of lmbd and theta given data
     '''
-    llh=0
-    for x in data:
-        llh+=np.log(stats.nbinom.pmf(x,lmbd/theta,1/(theta+1)))
+    values,counts=count_histogram(data)
+    x,n=_expand_histogram(values,counts,lmbd,theta)
+    lmbd=np.asarray(lmbd)
+    theta=np.asarray(theta)
+    llh=np.sum(n*stats.nbinom.logpmf(x,lmbd/theta,1/(theta+1)),axis=0)
     return llh
 
 def get_theta_mle(data,theta_0):
     '''
     Calculate maximum likelihood estimate of negative binomial overdispersion
-    parameter theta given sample data.
+    parameter theta given sample data. Kept for existing callers, this is a
+    wrapper around solve_theta_mle.
 
     Parameters
     ----------
-        data : list
-            sample dataset
+        data : list or tuple
+            sample dataset or count histogram
         theta_0 : float
             initial estimate of overdispersion parameter
 
@@ -95,11 +293,597 @@ def get_theta_mle(data,theta_0):
         : float
             maximum likelihood estimate of overdispersion parameter
     '''
-    def f(theta):
-        lmbd=np.mean(data)
-        return -neg_bin_loglh_theta(data,lmbd,theta)
-    mle=sp.optimize.minimize(f,[theta_0],bounds=((1e-6, 5 * theta_0),))
-    return mle.x[0]
+    return float(solve_theta_mle(data,theta_0))
+
+def neg_bin_theta_score(data,theta):
+    '''
+    Calculate the score equation for the negative binomial overdispersion
+    parameter theta with the mean fixed at its maximum likelihood estimate, the
+    sample mean. Writing r=lambda/theta for the negative binomial size
+    parameter, this is
+        sum_x n_x (psi(x+r)-psi(r)) - n log(1+theta),
+    which is a negative multiple of the derivative of the log likelihood with
+    respect to theta, so the MLE of theta is its root.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+        theta : float or array
+            overdispersion parameter
+
+    Returns
+    -------
+        score : float or array
+            value of the score equation at theta
+    '''
+    values,counts=count_histogram(data)
+    x,n=_expand_histogram(values,counts,theta)
+    theta=np.asarray(theta,dtype=float)
+    r=histogram_mean((values,counts))/theta
+    score=np.sum(n*(spsp.digamma(x+r)-spsp.digamma(r)),axis=0)-np.sum(counts)*np.log1p(theta)
+    return score
+
+def solve_theta_mle(data,theta_0=None,theta_min=1e-6,xtol=1e-12,full_output=False):
+    '''
+    Calculate maximum likelihood estimate of negative binomial overdispersion
+    parameter theta given sample data by bracketing and solving the score
+    equation neg_bin_theta_score. This can be used in place of get_theta_mle.
+
+    If the sample variance does not exceed the sample mean the likelihood is
+    maximised in the Poisson limit theta->0, and theta_min is returned, as is
+    the case if all of the data are zero.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+        theta_0 : float
+            initial estimate of overdispersion parameter, used to start the
+            search for a bracket; defaults to the moment estimate
+        theta_min : float
+            smallest value of theta considered
+        xtol : float
+            absolute tolerance on the root
+        full_output : bool
+            if True, also return the number of score evaluations used
+
+    Returns
+    -------
+        : float
+            maximum likelihood estimate of overdispersion parameter
+        : int
+            number of score evaluations, only returned if full_output is True
+    '''
+    values,counts=count_histogram(data)
+    hist=(values,counts)
+    no_cases=np.sum(counts)
+    sample_mean=histogram_mean(hist)
+    no_evals=0
+    def score(theta):
+        nonlocal no_evals
+        no_evals+=1
+        return neg_bin_theta_score(hist,theta)
+    def output(theta):
+        if full_output:
+            return theta,no_evals
+        return theta
+    if sample_mean==0:
+        return output(theta_min)
+    # Near theta=0 the score behaves like
+    #   theta^2 (n - sum_x n_x x(x-1)/mean^2)/2,
+    # so an interior maximum exists exactly when the data are overdispersed
+    second_factorial_moment=np.sum(counts*values*(values-1))
+    if second_factorial_moment<=no_cases*sample_mean**2:
+        return output(theta_min)
+    if theta_0 is None or not theta_0>theta_min:
+        theta_0=max(second_factorial_moment/(no_cases*sample_mean**2)-1,theta_min)
+    # The score is negative below the root and positive above it
+    hi=theta_0
+    while score(hi)<=0:
+        hi*=2
+    lo=min(theta_0,hi/2)
+    while lo>theta_min and score(lo)>=0:
+        lo/=2
+    if lo<=theta_min:
+        if score(theta_min)>=0:
+            return output(theta_min)
+        lo=theta_min
+    return output(opt.brentq(score,lo,hi,xtol=xtol))
+
+def _batch_theta_score(values,counts,sample_mean,theta,derivative=False):
+    '''
+    Evaluate neg_bin_theta_score for each row of a count matrix at its own
+    value of theta, optionally with the derivative of the score with respect
+    to log(theta).
+    '''
+    r=(sample_mean/theta)[:,None]
+    score=np.sum(counts*(spsp.digamma(values+r)-spsp.digamma(r)),axis=1)-np.sum(counts,axis=1)*np.log1p(theta)
+    if not derivative:
+        return score
+    d_score=(-r[:,0]*np.sum(counts*(spsp.polygamma(1,values+r)-spsp.polygamma(1,r)),axis=1)
+             -np.sum(counts,axis=1)*theta/(1+theta))
+    return score,d_score
+
+def batch_solve_theta_mles(values,count_matrix,theta_0=None,theta_min=1e-6,
+                           xtol=1e-12,max_iter=100,full_output=False):
+    '''
+    Calculate maximum likelihood estimates of negative binomial overdispersion
+    parameter theta for every row of a count matrix at once, as produced by
+    bootstrap_count_matrix. Each row is solved as in solve_theta_mle, but
+    rather than bracketing each root separately all of the rows are advanced
+    together by Newton's method on the score in log(theta), safeguarded by
+    bisection of the bracket formed by the points visited so far. Rows are
+    dropped from the iteration as they converge.
+
+    Parameters
+    ----------
+        values : array
+            distinct values which the columns of count_matrix count
+        count_matrix : array
+            array whose rows are count histograms over values
+        theta_0 : float or array
+            initial estimate of overdispersion parameter for each row;
+            defaults to the moment estimates
+        theta_min : float
+            smallest value of theta considered
+        xtol : float
+            absolute tolerance on the roots
+        max_iter : int
+            maximum number of Newton iterations
+        full_output : bool
+            if True, also return the number of score evaluations used for each
+            row
+
+    Returns
+    -------
+        theta : array
+            maximum likelihood estimate of overdispersion parameter for each
+            row
+        no_evals : array
+            number of score evaluations for each row, only returned if
+            full_output is True
+    '''
+    values=np.asarray(values)
+    count_matrix=np.atleast_2d(count_matrix)
+    no_rows=len(count_matrix)
+    no_cases=np.sum(count_matrix,axis=1)
+    sample_mean=count_matrix@values/no_cases
+    second_factorial_moment=count_matrix@(values*(values-1))
+    theta=np.full(no_rows,float(theta_min))
+    no_evals=np.zeros(no_rows,dtype=int)
+    # Rows whose data are not overdispersed are solved by the Poisson limit,
+    # see solve_theta_mle
+    active=np.nonzero((sample_mean>0)&
+                      (second_factorial_moment>no_cases*sample_mean**2))[0]
+    # The score is negative below the root and positive above it, so a row
+    # whose score is already nonnegative at theta_min is solved by theta_min
+    score_min=_batch_theta_score(values,count_matrix[active],
+                                 sample_mean[active],
+                                 np.full(len(active),float(theta_min)))
+    no_evals[active]+=1
+    active=active[score_min<0]
+    moment_theta=second_factorial_moment/(no_cases*np.where(sample_mean>0,sample_mean,1)**2)-1
+    if theta_0 is None:
+        theta_0=moment_theta
+    theta_0=np.broadcast_to(np.asarray(theta_0,dtype=float),(no_rows,))
+    theta_0=np.where(theta_0>theta_min,theta_0,np.maximum(moment_theta,theta_min))
+    t=theta_0[active]
+    lo=np.full(len(active),float(theta_min))
+    hi=np.full(len(active),np.inf)
+    for i in range(max_iter):
+        if len(active)==0:
+            break
+        score,d_score=_batch_theta_score(values,count_matrix[active],
+                                         sample_mean[active],t,
+                                         derivative=True)
+        no_evals[active]+=1
+        lo=np.where(score<0,np.maximum(lo,t),lo)
+        hi=np.where(score>0,np.minimum(hi,t),hi)
+        # The score dips below zero before rising through the root, so Newton
+        # steps are only taken where it is increasing, and are limited in
+        # length. Otherwise theta is doubled until the root is bracketed above
+        # and the bracket is then bisected geometrically.
+        with np.errstate(divide='ignore',invalid='ignore'):
+            t_new=t*np.exp(np.clip(-score/d_score,-3,3))
+        outside=~((t_new>lo)&(t_new<hi)&(d_score>0))
+        t_new[outside]=np.where(np.isfinite(hi[outside]),
+                                np.sqrt(lo[outside]*hi[outside]),
+                                2*t[outside])
+        converged=(np.abs(t_new-t)<=xtol)|(score==0)
+        theta[active[converged]]=np.where(score==0,t,t_new)[converged]
+        active=active[~converged]
+        t=t_new[~converged]
+        lo=lo[~converged]
+        hi=hi[~converged]
+    theta[active]=t
+    if full_output:
+        return theta,no_evals
+    return theta
+
+HYP1F1_RTOL=1e-12
+
+def _stirling_correction(x):
+    '''
+    Remainder log Gamma(x) - (x-1/2) log(x) + x - log(2 pi)/2 of Stirling's
+    approximation, accurate to double precision for x>=20.
+    '''
+    x2=x*x
+    return (1/12-(1/360-(1/1260-1/(1680*x2))/x2)/x2)/x
+
+def log_poch(x,k):
+    '''
+    Evaluate the log of the Pochhammer symbol, log Gamma(x+k) - log Gamma(x),
+    for x>0 and k>=0 without the cancellation that comes from subtracting
+    the two log gamma functions when x is large.
+
+    Parameters
+    ----------
+        x : float or array
+        k : float or array
+
+    Returns
+    -------
+        : float or array
+            log (x)_k
+    '''
+    x,k=np.broadcast_arrays(np.asarray(x,dtype=float),np.asarray(k,dtype=float))
+    large=x>=20
+    if not np.any(large):
+        return (spsp.gammaln(x+k)-spsp.gammaln(x))[()]
+    with np.errstate(invalid='ignore',divide='ignore'):
+        stirling=((x-0.5)*np.log1p(k/x)+k*np.log(x+k)-k+
+                  _stirling_correction(x+k)-_stirling_correction(x))
+    if np.all(large):
+        return stirling[()]
+    return np.where(large,stirling,spsp.gammaln(x+k)-spsp.gammaln(x))[()]
+
+def _log_hyp1f1_series(a,b,z,rtol=HYP1F1_RTOL,max_terms=500):
+    '''
+    Evaluate log 1F1(a;b;-z) by direct summation of its Maclaurin series. Only
+    used for small z, where the alternating terms do not cancel badly.
+    '''
+    term=np.ones(a.shape)
+    total=np.ones(a.shape)
+    # Each element stops at its own last term, so that its value does not
+    # depend on the other elements evaluated with it
+    active=np.ones(a.shape,dtype=bool)
+    for k in range(max_terms):
+        term=np.where(active,term*(a+k)/(b+k)*(-z)/(k+1),0)
+        total=total+term
+        active&=np.abs(term)>rtol*np.abs(total)
+        if not np.any(active):
+            break
+    with np.errstate(invalid='ignore',divide='ignore'):
+        return np.log(total)
+
+def _log_hyp1f1_asymptotic(a,b,z,rtol=HYP1F1_RTOL,max_terms=40):
+    '''
+    Evaluate log 1F1(a;b;-z) from its large z asymptotic expansion,
+        Gamma(b)/Gamma(b-a) z^(-a) sum_k (a)_k (a-b+1)_k / (k! z^k),
+    truncated at its smallest term. Also returns a mask of the elements for
+    which the truncated expansion and the neglected exponentially small
+    contribution are both within rtol.
+    '''
+    term=np.ones(a.shape)
+    total=np.ones(a.shape)
+    active=np.ones(a.shape,dtype=bool)
+    for k in range(max_terms):
+        next_term=term*(a+k)*(a-b+1+k)/((k+1)*z)
+        # Stop adding terms once they start growing
+        active&=np.abs(next_term)<np.abs(term)
+        term=np.where(active,next_term,term)
+        total=np.where(active,total+term,total)
+        active&=np.abs(term)>rtol*np.abs(total)
+        if not np.any(active):
+            break
+    with np.errstate(invalid='ignore',divide='ignore'):
+        log_neglected=(-z+(2*a-b)*np.log(z)+spsp.gammaln(b-a)-spsp.gammaln(a)-
+                       np.log(np.abs(total)))
+        converged=((np.abs(term)<=rtol*np.abs(total))&(total>0)&
+                   (log_neglected<np.log(rtol)))
+        llh=log_poch(b-a,a)-a*np.log(z)+np.log(total)
+    return llh,converged
+
+def _log_kummer_terms(c,b,logz,k):
+    '''
+    Log magnitude and sign of the terms (c)_k z^k / ((b)_k k!) of the Kummer
+    transformed series.
+    '''
+    logt=log_poch(c,k)-log_poch(b,k)+k*logz-spsp.gammaln(k+1)
+    sign=spsp.gammasgn(c+k)*spsp.gammasgn(c)
+    return logt,sign
+
+def _window_sum(terms):
+    '''
+    Sum each row of terms from left to right. The rows of a block are padded
+    with zeros to its longest window, and unlike the pairwise summation of
+    np.sum, which regroups terms when the padding changes, the sum of each row
+    is then independent of the other rows in its block.
+    '''
+    return np.add.accumulate(terms,axis=1)[:,-1]
+
+def _kummer_derivatives(c,b,z,k,weights,total,order):
+    '''
+    Derivatives of the log of the Kummer transformed series with respect to
+    (a,b,z), calculated as weighted averages over its terms, which are passed
+    in as weights relative to their sum, total. The derivatives of the log of
+    each term are digamma differences in a and b and k/z in z.
+    '''
+    d_c=spsp.digamma(c+k)-spsp.digamma(c)
+    d_b=spsp.digamma(b+k)-spsp.digamma(b)
+    term_grad=[-d_c,d_c-d_b,k/z]
+    def average(q):
+        return _window_sum(weights*q)/total
+    grad=np.array([average(g) for g in term_grad])
+    if order<2:
+        return grad,None
+    t_c=spsp.polygamma(1,c+k)-spsp.polygamma(1,c)
+    t_b=spsp.polygamma(1,b+k)-spsp.polygamma(1,b)
+    term_hess=[[t_c,-t_c,0],
+               [-t_c,t_c-t_b,0],
+               [0,0,-k/z**2]]
+    # Covariances are accumulated about the mean to avoid cancellation
+    centred=[g-grad[i][:,None] for i,g in enumerate(term_grad)]
+    hess=np.zeros((3,3)+total.shape)
+    for i in range(3):
+        for j in range(i,3):
+            hess[i,j]=average(term_hess[i][j]+centred[i]*centred[j])
+            hess[j,i]=hess[i,j]
+    return grad,hess
+
+def _log_hyp1f1_kummer(a,b,z,rtol=HYP1F1_RTOL,max_points=2**20,max_attempts=16,
+                       order=0):
+    '''
+    Evaluate log 1F1(a;b;-z) using Kummer's transformation
+        1F1(a;b;-z) = exp(-z) 1F1(b-a;b;z),
+    where the series on the right has positive terms whenever b>a. The terms
+    are summed in log space over a window around their peak, which is widened
+    until the neglected parts of the series are within rtol of the sum. If
+    order is 1 or 2 the gradient, and Hessian, with respect to (a,b,z) are
+    accumulated over the same terms and also returned.
+    '''
+    c=b-a
+    logz=np.log(z)
+    # The terms peak where the ratio of consecutive terms,
+    # z(c+k)/((b+k)(k+1)), crosses 1
+    disc=(b+1-z)**2-4*(b-c*z)
+    with np.errstate(invalid='ignore'):
+        k_peak=np.where(disc>0,0.5*(z-b-1+np.sqrt(np.maximum(disc,0))),0)
+    k_peak=np.floor(np.maximum(k_peak,0))
+    # The width of the peak follows from the curvature of the log terms, which
+    # can vanish, in which case the window starts from a bounded guess and is
+    # widened as necessary below
+    curvature=np.abs(1/(k_peak+1)+1/(b+k_peak)-1/(c+k_peak))
+    curvature=np.maximum(curvature,1/(k_peak+z+1)**2)
+    half_width=np.ceil(12/np.sqrt(curvature))+16
+    # Terms with c+k<=0 change sign, so these series are summed from k=0
+    from_zero=c<=0
+    log_sum=np.zeros(a.shape)
+    grad=np.zeros((3,)+a.shape)
+    hess=np.zeros((3,3)+a.shape)
+    todo=np.ones(a.shape,dtype=bool)
+    for attempt in range(max_attempts):
+        if not np.any(todo):
+            break
+        idx=np.nonzero(todo)[0]
+        k_lo=np.where(from_zero[idx],0,np.maximum(k_peak[idx]-half_width[idx],0))
+        k_hi=np.maximum(k_peak[idx]+half_width[idx],np.ceil(-c[idx])+1)
+        lengths=(k_hi-k_lo+1).astype(int)
+        by_length=np.argsort(lengths)
+        start=0
+        while start<len(idx):
+            sizes=lengths[by_length[start:]]*np.arange(1,len(idx)-start+1)
+            end=start+max(1,np.searchsorted(sizes,max_points,side='right'))
+            block=by_length[start:end]
+            el=idx[block]
+            offsets=np.arange(lengths[block].max())
+            k=k_lo[block,None]+offsets[None,:]
+            logt,sign=_log_kummer_terms(c[el,None],b[el,None],logz[el,None],k)
+            in_window=offsets[None,:]<lengths[block,None]
+            logt=np.where(in_window,logt,-np.inf)
+            peak=np.max(logt,axis=1)
+            weights=np.where(in_window,sign*np.exp(logt-peak[:,None]),0)
+            total=_window_sum(weights)
+            with np.errstate(invalid='ignore',divide='ignore'):
+                log_sum[el]=peak+np.log(total)
+            if order>0:
+                grad[:,el],block_hess=_kummer_derivatives(
+                    c[el,None],b[el,None],z[el,None],k,weights,total,order)
+                if order>1:
+                    hess[:,:,el]=block_hess
+            start=end
+        # Bound the neglected parts of the series on either side of the window
+        log_tol=np.log(rtol)
+        upper_logt,_=_log_kummer_terms(c[idx],b[idx],logz[idx],k_hi+1)
+        ratio=z[idx]*(c[idx]+k_hi+1)/((b[idx]+k_hi+1)*(k_hi+2))
+        with np.errstate(invalid='ignore',divide='ignore'):
+            upper_ok=(ratio<1)&(upper_logt-np.log1p(-np.minimum(ratio,1))-
+                                log_sum[idx]<log_tol)
+            lower_logt,_=_log_kummer_terms(c[idx],b[idx],logz[idx],
+                                           np.maximum(k_lo-1,0))
+            # Unless c>=1 the terms may also have a local peak at k=0
+            lower_logt=np.where(c[idx]>=1,lower_logt,np.maximum(lower_logt,0))
+            lower_ok=(k_lo==0)|(np.log(k_lo)+lower_logt-log_sum[idx]<log_tol)
+        failed=~(upper_ok&lower_ok)
+        # Anything that fails the check is retried with a wider window, summed
+        # from k=0 if it is the start of the series that is not negligible
+        half_width[idx[failed]]*=2
+        from_zero[idx[failed&~lower_ok]]=True
+        todo[:]=False
+        todo[idx[failed]]=np.isfinite(log_sum[idx[failed]])
+    if order==0:
+        return log_sum-z
+    grad[2]-=1
+    if order==1:
+        return log_sum-z,grad
+    return log_sum-z,grad,hess
+
+def log_hyp1f1_neg(a,b,z,rtol=HYP1F1_RTOL):
+    '''
+    Evaluate the logarithm of the confluent hypergeometric function
+    1F1(a;b;-z) for 0<a<=b and z>=0, as it appears in the beta-Poisson
+    likelihood at feasible parameters (nu<=1/lambda). For a>b, 1F1(a;b;-z) can
+    be negative and none of the regimes below is accurate, so nan is returned
+    there. All arguments are broadcast against each other. Each element is
+    evaluated in the cheapest of three regimes which is accurate for it: the
+    Maclaurin series for z<=1, the large z asymptotic expansion where it
+    converges, and otherwise the Kummer transformed series summed in log space.
+    Series are truncated once the neglected terms are below rtol relative to
+    the sum; over the parameter ranges explored by the beta-Poisson fits
+    (nu>=1e-4, Phi<=50, counts up to 100) the results agree with mpmath to
+    an absolute error below 1e-10 in log 1F1, equivalently a relative error
+    below 1e-10 in 1F1 itself.
+
+    Parameters
+    ----------
+        a : float or array
+        b : float or array
+        z : float or array
+            minus the argument of 1F1
+        rtol : float
+            relative tolerance used to truncate the series
+
+    Returns
+    -------
+        log_hyp : float or array
+            log 1F1(a;b;-z), or nan where a>b
+    '''
+    a,b,z=np.broadcast_arrays(np.asarray(a,dtype=float),
+                              np.asarray(b,dtype=float),
+                              np.asarray(z,dtype=float))
+    shape=a.shape
+    a=a.ravel()
+    b=b.ravel()
+    z=z.ravel()
+    log_hyp=np.zeros(a.shape)
+    undefined=a>b
+    log_hyp[undefined]=np.nan
+    # 1F1(a;a;-z)=exp(-z) exactly
+    degenerate=a==b
+    log_hyp[degenerate]=-z[degenerate]
+    series=(z<=1)&~(degenerate|undefined)
+    if np.any(series):
+        log_hyp[series]=_log_hyp1f1_series(a[series],b[series],z[series],rtol)
+    remaining=~(series|degenerate|undefined)
+    # Only try the asymptotic expansion where its terms decrease quickly
+    asymptotic=remaining&(z>=50)&(b>a)&(np.maximum(a,1)*np.abs(a-b+1)<0.25*z)
+    if np.any(asymptotic):
+        vals,converged=_log_hyp1f1_asymptotic(
+            a[asymptotic],b[asymptotic],z[asymptotic],rtol)
+        idx=np.nonzero(asymptotic)[0][converged]
+        log_hyp[idx]=vals[converged]
+        remaining[idx]=False
+    if np.any(remaining):
+        log_hyp[remaining]=_log_hyp1f1_kummer(
+            a[remaining],b[remaining],z[remaining],rtol)
+    return log_hyp.reshape(shape)[()]
+
+def log_hyp1f1_neg_derivatives(a,b,z,hessian=False,rtol=HYP1F1_RTOL):
+    '''
+    Evaluate log 1F1(a;b;-z) together with its gradient, and optionally its
+    Hessian, with respect to (a,b,z). The derivatives are weighted averages of
+    digamma and trigamma differences over the terms of the Kummer transformed
+    series, so they are accumulated in the same pass as the function value.
+    The derivatives are singular at b=a, which must be avoided, and as in
+    log_hyp1f1_neg nan is returned where a>b.
+
+    Parameters
+    ----------
+        a : float or array
+        b : float or array
+        z : float or array
+            minus the argument of 1F1
+        hessian : bool
+            whether to also calculate second derivatives
+        rtol : float
+            relative tolerance used to truncate the series
+
+    Returns
+    -------
+        log_hyp : float or array
+            log 1F1(a;b;-z)
+        grad : array
+            derivatives with respect to a, b and z, stacked along the first axis
+        hess : array
+            matrix of second derivatives, stacked along the first two axes, only
+            returned if hessian is True
+    '''
+    a,b,z=np.broadcast_arrays(np.asarray(a,dtype=float),
+                              np.asarray(b,dtype=float),
+                              np.asarray(z,dtype=float))
+    shape=a.shape
+    results=_log_hyp1f1_kummer(a.ravel(),b.ravel(),z.ravel(),rtol,
+                               order=2 if hessian else 1)
+    undefined=(a>b).ravel()
+    for result in results:
+        result[...,undefined]=np.nan
+    log_hyp=results[0].reshape(shape)[()]
+    grad=results[1].reshape((3,)+shape)
+    if not hessian:
+        return log_hyp,grad
+    return log_hyp,grad,results[2].reshape((3,3)+shape)
+
+def beta_poisson_logpmf_support(K,lmbd,Phi,N,rtol=HYP1F1_RTOL,max_depth=2**20):
+    '''
+    Evaluate the log probability mass function for the beta-Poisson
+    distribution on the whole support 0,...,K in a single pass.
+
+    The probabilities satisfy the three-term recurrence
+        (x+1)(x+2)P(x+2) = (x+1)(x+Phi*N+N)P(x+1) - N(x+Phi*lmbd)P(x),
+    which follows from Kummer's equation for the generating function. P is
+    the minimal solution of this recurrence, so forward recursion is
+    unstable; instead the ratios P(x+1)/P(x) are computed by backward
+    recursion (the equivalent continued fraction), starting from a depth
+    which is doubled until the ratios on 0,...,K agree to rtol. Only P(0)
+    requires a hypergeometric function evaluation.
+
+    Parameters
+    ----------
+        K : int
+            largest point of the support to evaluate
+        lmbd : float
+        Phi : float
+        N : float
+        rtol : float
+            relative tolerance for the ratios and for 1F1
+        max_depth : int
+            maximum number of backward steps beyond K
+
+    Returns
+    -------
+        logP : array
+            log probability of each point 0,...,K
+    '''
+    K=int(K)
+    a=Phi*lmbd
+    b=Phi*N
+    logP=np.empty(K+1)
+    logP[0]=log_hyp1f1_neg(a,b,N,rtol)
+    if K==0:
+        return logP
+
+    def ratios(depth):
+        r=0.
+        rs=np.empty(K)
+        for x in range(K+depth-1,-1,-1):
+            r=N*(x+a)/((x+1)*(x+b+N-(x+2)*r))
+            if x<K:
+                rs[x]=r
+        return rs
+
+    depth=16
+    rs=ratios(depth)
+    while depth<max_depth:
+        depth*=2
+        rs_new=ratios(depth)
+        converged=np.all(np.abs(rs_new-rs)<=rtol*np.abs(rs_new))
+        rs=rs_new
+        if converged:
+            break
+    with np.errstate(divide='ignore'):
+        logP[1:]=logP[0]+np.cumsum(np.log(rs))
+    return logP
 
 def beta_poisson_pmf(x,lmbd,Phi,N):
     '''
@@ -119,54 +903,227 @@ def beta_poisson_pmf(x,lmbd,Phi,N):
             probability of each point in x
 
     '''
-    if type(x)==int:
-        P=spsp.hyp1f1(x+Phi*lmbd,x+Phi*N,-N)
-        for n in range(1,x+1): # This loop gives us the N^x/gamma(x+1 term)
-            P=(N/n)*P
-        for m in range(x): # This loop gives us the term with the two gamma functions in numerator and denominator
-            P=((m+Phi*lmbd)/(m+Phi*N))*P
-    else:
-        P=[]
-        for i in range(0,len(x)):
-            p=spsp.hyp1f1(x[i]+Phi*lmbd,x[i]+Phi*N,-N)
-            for n in range(1,x[i]+1): # This loop gives us the N^x/gamma(x+1 term)
-                p=(N/n)*p
-            for m in range(x[i]): # This loop gives us the term with the two gamma functions in numerator and denominator
-                p=((m+Phi*lmbd)/(m+Phi*N))*p
-            P=P+[p]
-    return P
-
-hyp1f1_alt=np.frompyfunc(mpmath.hyp1f1,3,1)
+    x=np.asarray(x)
+    P=np.zeros(x.shape)
+    valid=(x>=0)&(x==np.floor(x))
+    if np.any(valid):
+        xv=x[valid].astype(int)
+        P[valid]=np.exp(beta_poisson_logpmf_support(np.max(xv),lmbd,Phi,N)[xv])
+    return P[()]
+
 def beta_poisson_loglh(data,lmbd,phi,nu):
     '''
-    Calculate log likelihood of beta-Poisson parameters given data.
+    Calculate log likelihood of beta-Poisson parameters given data. The
+    parameters can be arrays of any shape, in which case they are broadcast
+    against each other and the log likelihood is evaluated at every element,
+    with the negative binomial limit used wherever nu<1e-4.
 
     Parameters
     ----------
-        data : list
-            sample dataset
-        lmbd : float
-        phi : float
-        nu : float
+        data : list or tuple
+            sample dataset or count histogram
+        lmbd : float or array
+        phi : float or array
+        nu : float or array
             Inverse contact parameter
 
     Returns
     -------
-        llh : float
+        llh : float or array
             log likelihood of parameters given data
     '''
-    if nu<1e-4:
-        return neg_bin_loglh(data,lmbd,phi)
-    else:
-        llh=0
-        N = 1/nu
-        for x in data:
-            llh+=x*np.log(N)-np.real(spsp.loggamma(x+1))+np.real(spsp.loggamma(phi*N))+np.real(spsp.loggamma(x+phi*lmbd))-np.real(spsp.loggamma(x+phi*N))-np.real(spsp.loggamma(phi*lmbd))
-            if x+phi*N<50:
-                llh+=np.log(spsp.hyp1f1(x+phi*lmbd,x+phi*N,-N))
-            else:
-                llh+=np.log(float(hyp1f1_alt(x+phi*lmbd,x+phi*N,-N)))
-        return llh
+    values,counts=count_histogram(data)
+    lmbd,phi,nu=np.broadcast_arrays(np.asarray(lmbd,dtype=float),
+                                    np.asarray(phi,dtype=float),
+                                    np.asarray(nu,dtype=float))
+    llh=np.zeros(lmbd.shape)
+    nb_mask=nu<1e-4
+    if np.any(nb_mask):
+        llh[nb_mask]=neg_bin_loglh((values,counts),lmbd[nb_mask],phi[nb_mask])
+    bp_mask=~nb_mask
+    if np.any(bp_mask):
+        x=values.reshape(-1,1)
+        n=counts.reshape(-1,1)
+        lmbd=lmbd[bp_mask]
+        phi=phi[bp_mask]
+        N=1/nu[bp_mask]
+        terms=x*np.log(N)-spsp.gammaln(x+1)+log_poch(phi*lmbd,x)-log_poch(phi*N,x)
+        hyp=log_hyp1f1_neg(x+phi*lmbd,x+phi*N,N)
+        llh[bp_mask]=np.sum(n*(terms+hyp),axis=0)
+    return llh[()]
+
+def beta_poisson_loglh_grid(data,lmbd,phi,nu,fill_value=np.nan):
+    '''
+    Calculate log likelihood of beta-Poisson parameters given data over arrays
+    of parameters, only evaluating the likelihood at feasible parameter
+    combinations (nu<=1/lmbd).
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+        lmbd : float or array
+        phi : float or array
+        nu : float or array
+            Inverse contact parameter
+        fill_value : float
+            value returned at infeasible parameter combinations
+
+    Returns
+    -------
+        llh : array
+            log likelihood at each element of the broadcast parameter arrays
+    '''
+    lmbd,phi,nu=np.broadcast_arrays(np.asarray(lmbd,dtype=float),
+                                    np.asarray(phi,dtype=float),
+                                    np.asarray(nu,dtype=float))
+    llh=np.full(lmbd.shape,fill_value,dtype=float)
+    feasible=nu<=1/lmbd
+    llh[feasible]=beta_poisson_loglh(data,lmbd[feasible],phi[feasible],nu[feasible])
+    return llh
+
+def beta_poisson_loglh_derivatives(data,lmbd,phi,nu,hessian=False):
+    '''
+    Calculate log likelihood of beta-Poisson parameters given data together
+    with its exact gradient, and optionally its Hessian, with respect to
+    (lambda, phi, nu). Parameters are broadcast as in beta_poisson_loglh, and
+    where nu<1e-4 the derivatives with respect to lambda and phi are those of
+    the negative binomial limit. That limit does not depend on nu, so there the
+    derivative with respect to nu is the exact derivative of the beta-Poisson
+    likelihood at nu=0, and second derivatives involving nu are continued from
+    nu=1e-4, which lets optimisers leave the limit when the likelihood
+    increases with nu.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+        lmbd : float or array
+        phi : float or array
+        nu : float or array
+            Inverse contact parameter
+        hessian : bool
+            whether to also calculate second derivatives
+
+    Returns
+    -------
+        llh : float or array
+            log likelihood of parameters given data
+        grad : array
+            derivatives with respect to lambda, phi and nu, stacked along the
+            first axis
+        hess : array
+            matrix of second derivatives, stacked along the first two axes, only
+            returned if hessian is True
+    '''
+    values,counts=count_histogram(data)
+    lmbd,phi,nu=np.broadcast_arrays(np.asarray(lmbd,dtype=float),
+                                    np.asarray(phi,dtype=float),
+                                    np.asarray(nu,dtype=float))
+    shape=lmbd.shape
+    out=_beta_poisson_loglh_derivatives(values.reshape(-1,1),
+                                        counts.reshape(-1,1),
+                                        lmbd.ravel(),phi.ravel(),nu.ravel(),
+                                        hessian)
+    llh=out[0].reshape(shape)[()]
+    grad=out[1].reshape((3,)+shape)
+    if not hessian:
+        return llh,grad
+    return llh,grad,out[2].reshape((3,3)+shape)
+
+def _beta_poisson_loglh_derivatives(x,n,lmbd,phi,nu,hessian):
+    '''
+    Core of beta_poisson_loglh_derivatives for flat parameter arrays of length
+    M. The values x have shape (K,1) and the counts n have shape (K,1), or
+    (K,M) to give each parameter set its own histogram over the same values.
+    '''
+    def weights(mask):
+        return n if n.shape[1]==1 else n[:,mask]
+    def total(q,axis=0):
+        # Sums over the values are accumulated in order, whereas np.sum sums
+        # pairwise along contiguous axes, so that the result for each
+        # parameter set does not depend on how many are evaluated together
+        return np.take(np.add.accumulate(q,axis=axis),-1,axis=axis)
+    llh=np.zeros(lmbd.shape)
+    grad=np.zeros((3,)+lmbd.shape)
+    hess=np.zeros((3,3)+lmbd.shape)
+    nb_mask=nu<1e-4
+    if np.any(nb_mask):
+        w=weights(nb_mask)
+        l=lmbd[nb_mask]
+        p=phi[nb_mask]
+        r=l*p
+        log_nb=stats.nbinom.logpmf(x,r,p/(p+1))
+        llh[nb_mask]=total(w*log_nb)
+        # Derivatives in (r, phi), with r=lambda*phi
+        d_r=total(w*(spsp.digamma(x+r)-spsp.digamma(r)))+total(w)*np.log(p/(1+p))
+        d_p=total(w*(r/(p*(1+p))-x/(1+p)))
+        grad[0,nb_mask]=p*d_r
+        grad[1,nb_mask]=l*d_r+d_p
+        if hessian:
+            h_rr=total(w*(spsp.polygamma(1,x+r)-spsp.polygamma(1,r)))
+            h_rp=total(w)/(p*(1+p))
+            h_pp=total(w*(-r*(1+2*p)/(p*(1+p))**2+x/(1+p)**2))
+            hess[0,0,nb_mask]=p**2*h_rr
+            hess[0,1,nb_mask]=p*l*h_rr+p*h_rp+d_r
+            hess[1,0,nb_mask]=hess[0,1,nb_mask]
+            hess[1,1,nb_mask]=l**2*h_rr+2*l*h_rp+h_pp
+        # Expanding the PGF to first order in nu gives the derivative of the
+        # pmf at nu=0 as -r(r+1)/(2 phi^3) times the second backward
+        # difference in x of the negative binomial pmf with size r+2
+        second_diff=sum(coeff*np.exp(stats.nbinom.logpmf(x-j,r+2,p/(p+1))-log_nb)
+                        for j,coeff in ((0,1),(1,-2),(2,1)))
+        grad[2,nb_mask]=-r*(r+1)/(2*p**3)*total(w*second_diff)
+        if hessian:
+            # Second derivatives involving nu are continued from nu=1e-4
+            edge=_beta_poisson_loglh_derivatives(x,w,l,p,np.full(l.shape,1e-4),hessian)
+            hess[2,:,nb_mask]=edge[2][2].T
+            hess[:2,2,nb_mask]=edge[2][:2,2]
+    bp_mask=~nb_mask
+    if np.any(bp_mask):
+        w=weights(bp_mask)
+        l=lmbd[bp_mask]
+        p=phi[bp_mask]
+        N=1/nu[bp_mask]
+        r=p*l
+        s=p*N
+        hyp=log_hyp1f1_neg_derivatives(x+r,x+s,N,hessian=hessian)
+        llh[bp_mask]=total(w*(x*np.log(N)-spsp.gammaln(x+1)+log_poch(r,x)-
+                              log_poch(s,x)+hyp[0]))
+        # Derivatives in the inner variables v=(r,s,N), with r=phi*lambda and
+        # s=phi*N, which enter through a=x+r, b=x+s and z=N
+        g_v=np.array([
+            total(w*(spsp.digamma(x+r)-spsp.digamma(r)+hyp[1][0])),
+            total(w*(spsp.digamma(s)-spsp.digamma(x+s)+hyp[1][1])),
+            total(w*(x/N+hyp[1][2]))])
+        # Jacobian of v with respect to w=(lambda,phi,N)
+        zero=np.zeros(l.shape)
+        one=np.ones(l.shape)
+        jac=np.array([[p,l,zero],
+                      [zero,N,p],
+                      [zero,zero,one]])
+        g_w=np.einsum('iw...,i...->w...',jac,g_v)
+        grad[:2,bp_mask]=g_w[:2]
+        grad[2,bp_mask]=-N**2*g_w[2]
+        if hessian:
+            h_v=total(w*hyp[2],axis=2)
+            h_v[0,0]+=total(w*(spsp.polygamma(1,x+r)-spsp.polygamma(1,r)))
+            h_v[1,1]+=total(w*(spsp.polygamma(1,s)-spsp.polygamma(1,x+s)))
+            h_v[2,2]-=total(w*x/N**2)
+            h_w=np.einsum('iu...,ij...,jw...->uw...',jac,h_v,jac)
+            # Second derivatives of r and s themselves
+            h_w[0,1]+=g_v[0]
+            h_w[1,0]+=g_v[0]
+            h_w[1,2]+=g_v[1]
+            h_w[2,1]+=g_v[1]
+            # Change of variables from N to nu=1/N
+            h_w[2,2]=N**4*h_w[2,2]+2*N**3*g_w[2]
+            h_w[:2,2]*=-N**2
+            h_w[2,:2]*=-N**2
+            hess[:,:,bp_mask]=h_w
+    if not hessian:
+        return llh,grad
+    return llh,grad,hess
 
 def neg_bin_loglh(data,lmbd,phi):
     '''
@@ -175,34 +1132,65 @@ def neg_bin_loglh(data,lmbd,phi):
 
     Parameters
     ----------
-        data : list
-            sample dataset
-        lmbd : float
+        data : list or tuple
+            sample dataset or count histogram
+        lmbd : float or array
             estimated mean of negative binomial distribution
-        phi : float
+        phi : float or array
 
     Returns
     -------
-        llh : float
+        llh : float or array
             log likelihood of lmbd and theta given data
     '''
-    llh=0
-    for x in data:
-        llh+=np.log(stats.nbinom.pmf(x,lmbd*phi,phi/(phi+1)))
+    values,counts=count_histogram(data)
+    x,n=_expand_histogram(values,counts,lmbd,phi)
+    lmbd=np.asarray(lmbd)
+    phi=np.asarray(phi)
+    llh=np.sum(n*stats.nbinom.logpmf(x,lmbd*phi,phi/(phi+1)),axis=0)
     return llh
 
-def get_phi_and_N_mles(data,phi_0,nu_0):
+BP_FIT_MAX_RESTARTS=10
+# Bounds on the beta-Poisson Phi. Both Phi->infinity and nu->1/lambda give the
+# Poisson distribution, so where a fit runs Phi to its upper bound the
+# likelihood barely depends on Phi, and a refit which is as good to within
+# BP_FIT_LLH_TOL is kept instead
+BP_PHI_BOUNDS=(1e-6,50)
+BP_FIT_LLH_TOL=1e-5
+# A count x is unlikely unless N=1/nu is about x or more, so the likelihood can
+# also peak with N just above the largest count, and fits which end at the
+# negative binomial limit are repeated from N at this multiple of it
+BP_LARGEST_COUNT_N=1.5
+
+def get_phi_and_N_mles(data,phi_0,nu_0,full_output=False,fallback_start=None,
+                       limit_mles=None):
     '''
     Calculate maximum likelihood estimates of beta-Poisson parameters Phi and N.
 
     Parameters
     ----------
-        data : list
-            sample dataset
+        data : list or tuple
+            sample dataset or count histogram
         phi_0 : float
             initial estimate of Phi
         nu_0 : float
             initial estimate of nu
+        full_output : bool
+            if True, also return the number of likelihood evaluations used
+        fallback_start : tuple
+            optional second initial estimate (phi, nu). The likelihood can
+            have local maxima at its negative binomial limit nu=0, at its
+            Poisson limit nu=1/lambda and with Phi on its upper bound, so if
+            the fit from (phi_0, nu_0) ends at any of these it is repeated
+            from this estimate and the better of the two fits is kept. A fit
+            with Phi on its upper bound gives way to a refit which is as
+            good, see BP_PHI_BOUNDS.
+        limit_mles : tuple
+            optional maximum likelihood estimates (theta, lambda) of the
+            negative binomial and zero-inflated Poisson distributions, which
+            the beta-Poisson approaches as nu->0 and as Phi->0. If the
+            beta-Poisson likelihood at either limit exceeds that of the fit by
+            more than BP_FIT_LLH_TOL, the fit is repeated from that limit.
 
     Returns
     -------
@@ -210,17 +1198,370 @@ def get_phi_and_N_mles(data,phi_0,nu_0):
             maximum likelihood estimate of Phi
         : float
             maximum likelihood estimate of nu
-    '''
+        : int
+            number of likelihood evaluations, only returned if full_output is
+            True
+    '''
+    hist=count_histogram(data)
+    lmbd=histogram_mean(hist)
+    best=[np.inf,None,None]
+    no_evals=0
     def f(params):
-        lmbd=np.mean(data)
+        nonlocal no_evals
+        no_evals+=1
         phi=params[0]
         nu=params[1]
-        return -beta_poisson_loglh(data,lmbd,phi,nu)
+        llh,grad=beta_poisson_loglh_derivatives(hist,lmbd,phi,nu)
+        if -llh<best[0]:
+            best[0]=-llh
+            best[1]=np.array(params,dtype=float)
+            best[2]=-grad[1:]
+        return -llh,-grad[1:]
+
+    # At nu=1/lambda the beta distribution degenerates and the derivatives of
+    # the likelihood are singular, so the upper bound is kept just inside it
+    bounds=(BP_PHI_BOUNDS,(0,(1-1e-6)/lmbd))
+    lower=np.array([b[0] for b in bounds])
+    upper=np.array([b[1] for b in bounds])
+    def fit(phi_0,nu_0):
+        # For nu<1e-4 the likelihood is its negative binomial limit, which is
+        # flat in nu, so fits are started just outside it
+        x=np.array([min(max(phi_0,lower[0]),upper[0]),
+                    min(max(nu_0,2e-4),upper[1])])
+        best[:]=[np.inf,None,None]
+        # The likelihood has a narrow curved ridge along which L-BFGS-B can
+        # stall, sometimes reporting a worse point than one it has already
+        # evaluated, so restart it from the best point seen until it stops
+        # making progress
+        for attempt in range(BP_FIT_MAX_RESTARTS):
+            f_prev=best[0]
+            sp.optimize.minimize(f,x,jac=True,bounds=bounds,options={'ftol':1e-13,'gtol':1e-7})
+            x=best[1]
+            jac=best[2]
+            proj_grad=np.where(((x<=lower)&(jac>0))|((x>=upper)&(jac<0)),0,jac)
+            # As in _batch_phi_and_N_fit, the gradient in nu is weighed over
+            # the whole range of nu
+            if (np.max(np.abs(proj_grad)*np.array([max(abs(x[0]),1e-3),upper[1]]))<1e-6
+                    or f_prev-best[0]<=1e-12*abs(best[0])):
+                break
+        return x,best[0]
+
+    x,fun=fit(phi_0,nu_0)
+    if fallback_start is not None and (x[1]<1e-4 or x[1]>=upper[1] or x[0]>=upper[0]):
+        x_fallback,fun_fallback=fit(*fallback_start)
+        if (fun_fallback<fun-BP_FIT_LLH_TOL or
+                (x[0]>=upper[0] and fun_fallback<fun+BP_FIT_LLH_TOL)):
+            x,fun=x_fallback,fun_fallback
+    if x[1]<1e-4:
+        x_refit,fun_refit=fit(x[0],1/(BP_LARGEST_COUNT_N*np.max(hist[0][hist[1]>0])))
+        if fun_refit<fun-BP_FIT_LLH_TOL:
+            x,fun=x_refit,fun_refit
+    if limit_mles is not None:
+        theta,lmbd_zip=limit_mles
+        for limit in ((min(max(1/theta,lower[0]),upper[0]),0),
+                      (lower[0],min(1/lmbd_zip,upper[1]))):
+            if -beta_poisson_loglh(hist,lmbd,*limit)<fun-BP_FIT_LLH_TOL:
+                x_limit,fun_limit=fit(*limit)
+                if fun_limit<fun-BP_FIT_LLH_TOL:
+                    x,fun=x_limit,fun_limit
+    x=x.copy()
+    if x[1]<0:
+        x[1]=0
+    if full_output:
+        return x[0],x[1],no_evals
+    return x[0],x[1]
+
+def _batch_phi_and_N_fit(values,count_matrix,sample_mean,phi_0,nu_0,max_iter):
+    '''
+    Maximise the beta-Poisson likelihood in (Phi, nu) for each row of a count
+    matrix, with lambda fixed at the row's sample mean, by projected
+    quasi-Newton iterations damped as in Levenberg-Marquardt, in
+    (log(Phi), nu) since the estimates of Phi range over orders of magnitude.
+    The curvature model of each row starts from finite differences of the
+    gradient at its initial estimate and is then updated by BFGS, so only the
+    likelihood and its gradient are ever evaluated. Returns the fitted parameters, their log
+    likelihoods, the number of likelihood evaluations and whether each row
+    converged. A row which stops at nu=0 although the likelihood increases
+    with nu there has not converged.
+    '''
+    no_rows=len(count_matrix)
+    x_vals=values.reshape(-1,1)
+    lower=np.zeros((no_rows,2))
+    lower[:,0]=np.log(BP_PHI_BOUNDS[0])
+    upper=np.zeros((no_rows,2))
+    upper[:,0]=np.log(BP_PHI_BOUNDS[1])
+    upper[:,1]=(1-1e-6)/sample_mean
+    # Convergence is judged on the changes in the log likelihood which the
+    # gradient predicts for relative changes in Phi and for changes in nu
+    # across its range
+    no_evals=np.zeros(no_rows,dtype=int)
+    def evaluate(rows,params):
+        no_evals[rows]+=1
+        phi=np.exp(params[:,0])
+        llh,grad=_beta_poisson_loglh_derivatives(x_vals,count_matrix[rows].T,
+                                                 sample_mean[rows],
+                                                 phi,params[:,1],
+                                                 hessian=False)
+        return llh,np.stack([phi*grad[1],grad[2]],axis=1)
+    def scale(params):
+        return np.stack([np.ones(len(params)),np.maximum(np.abs(params[:,1]),1e-3)],axis=1)
+    # Fits are started outside the negative binomial limit nu<1e-4, where the
+    # likelihood is flat in nu, and far enough from it that the likelihood is
+    # not expensive to evaluate
+    x=np.empty((no_rows,2))
+    x[:,0]=np.clip(np.log(phi_0),lower[:,0],upper[:,0])
+    x[:,1]=np.clip(np.maximum(nu_0,1e-3),lower[:,1],upper[:,1])
+    converged=np.zeros(no_rows,dtype=bool)
+    active=np.arange(no_rows)
+    f,g=evaluate(active,x)
+    llh=f.copy()
+    eye=np.eye(2)
+    # B models minus the Hessian, and starts from finite differences of the
+    # gradient, which are much cheaper than the exact Hessian. Where these
+    # are not positive definite their diagonal magnitudes are used instead.
+    B=np.zeros((no_rows,2,2))
+    for j in range(2):
+        h=1e-6*scale(x)[:,j]
+        h=np.where(x[:,j]+h<=upper[:,j],h,-h)
+        shifted=x.copy()
+        shifted[:,j]+=h
+        B[:,:,j]=-(evaluate(active,shifted)[1]-g)/h[:,None]
+    B=(B+np.swapaxes(B,1,2))/2
+    indefinite=~((B[:,0,0]>0)&(B[:,0,0]*B[:,1,1]-B[:,0,1]*B[:,1,0]>0))
+    B[indefinite]=np.maximum(np.abs(np.diagonal(B[indefinite],axis1=1,axis2=2)),1e-12)[:,:,None]*eye
+    def damped_step(B,mu,g,fixed):
+        # The damping is scaled by the diagonal of the curvature model, which
+        # puts Phi and nu, whose scales differ by orders of magnitude, on an
+        # equal footing
+        scale=np.maximum(np.abs(np.diagonal(B,axis1=1,axis2=2)),1e-12)
+        A=B+mu[:,None,None]*scale[:,:,None]*eye
+        free=~fixed
+        A=A*(free[:,:,None]&free[:,None,:])+fixed[:,:,None]*eye
+        det=A[:,0,0]*A[:,1,1]-A[:,0,1]*A[:,1,0]
+        with np.errstate(divide='ignore',invalid='ignore'):
+            return np.stack([A[:,1,1]*g[:,0]-A[:,0,1]*g[:,1],
+                             A[:,0,0]*g[:,1]-A[:,1,0]*g[:,0]],axis=1)/det[:,None]
+    mu=np.full(no_rows,1e-3)
+    # Rows at nu=0 whose last attempt to leave the negative binomial limit did
+    # not increase the likelihood
+    exit_failed=np.zeros(no_rows,dtype=bool)
+    def project(xa,step):
+        # Steps into the negative binomial limit are taken all the way to its
+        # boundary nu=0, since the likelihood does not change within it
+        with np.errstate(invalid='ignore'):
+            trial=np.clip(xa+step,lower[active],upper[active])
+        trial[trial[:,1]<1e-4,1]=0
+        return trial
+    for i in range(max_iter):
+        if len(active)==0:
+            break
+        xa=x[active]
+        # Parameters on a bound whose gradient points out of the box are held
+        # there
+        fixed=((xa<=lower[active])&(g<0))|((xa>=upper[active])&(g>0))
+        step=damped_step(B,mu[active],np.where(fixed,0,g),fixed)
+        # The likelihood does not change within the negative binomial limit, so
+        # a step from nu=0 which would stay inside it is instead taken to just
+        # outside it if the likelihood increases with nu, as fits are started,
+        # and nu is held at 0 otherwise
+        in_limit=(xa[:,1]==0)&(step[:,1]<1e-4)
+        leave=in_limit&(g[:,1]>0)&~exit_failed[active]
+        fixed[:,1]|=in_limit&~leave
+        pg=np.where(fixed,0,g)
+        step=damped_step(B,mu[active],pg,fixed)
+        step[leave,1]=2e-4
+        # Rows whose projected gradient vanishes have converged. The gradient
+        # in nu is weighed over the whole range of nu rather than relative to
+        # nu, as the likelihood can rise slowly along a ridge from near nu=0
+        done=np.max(np.abs(pg)*np.stack([np.ones(len(active)),upper[active,1]],axis=1),
+                    axis=1)<1e-6
+        trial=project(xa,step)
+        # A parameter is only moved onto a bound along its gradient. Where the
+        # curvature model would carry it onto a bound against the gradient it
+        # is held where it is for this step instead, as otherwise the fit can
+        # end at a corner of the box from which the likelihood increases
+        # along the bound
+        hold=(((trial<=lower[active])&(xa>lower[active])&(g>0))|
+              ((trial>=upper[active])&(xa<upper[active])&(g<0)))
+        # At the Poisson limit nu=1/lambda the likelihood barely depends on
+        # Phi, so Phi is also held on a step which takes nu to its upper
+        # bound, and only moves along that bound if its gradient there has not
+        # converged
+        hold[:,0]|=(trial[:,1]>=upper[active,1])&(xa[:,1]<upper[active,1])
+        hold&=~fixed
+        if np.any(hold):
+            fixed|=hold
+            step=damped_step(B,mu[active],np.where(fixed,0,g),fixed)
+            step[leave,1]=2e-4
+            trial=project(xa,step)
+        step=trial-xa
+        predicted=np.sum(g*step,axis=1)-0.5*np.einsum('ri,rij,rj->r',step,B,step)
+        tried=~done&np.all(np.isfinite(trial),axis=1)
+        f_trial=np.full(len(active),-np.inf)
+        g_trial=np.zeros(g.shape)
+        if np.any(tried):
+            f_trial[tried],g_trial[tried]=evaluate(active[tried],trial[tried])
+        gain=f_trial-f
+        with np.errstate(divide='ignore',invalid='ignore'):
+            accept=tried&np.isfinite(f_trial)&(gain>0)&(gain>=1e-4*predicted)
+            rho=np.where(accept,gain/predicted,0)
+        # Rows which can no longer improve, because the damping has grown until
+        # the steps vanish or because the gains are at rounding level, are
+        # stopped where they are
+        relative_step=np.max(np.abs(step)/scale(xa),axis=1)
+        stalled=((~accept&~done&(mu[active]>1e12))|
+                 (accept&(gain<=1e-13*np.abs(f))&(relative_step<1e-10)))
+        mu_a=mu[active]
+        mu_a=np.where(accept&(rho>0.75),mu_a/3,mu_a)
+        mu_a=np.where(accept&(rho<0.25),mu_a*2,mu_a)
+        mu_a=np.where(accept,mu_a,mu_a*4)
+        mu[active]=np.maximum(mu_a,1e-12)
+        # A failed attempt to leave the negative binomial limit is not
+        # repeated until another step has been taken
+        exit_failed[active[leave&~accept]]=True
+        exit_failed[active[accept]]=False
+        # BFGS update of the curvature model over accepted steps, skipped where
+        # the curvature along the step is not positive
+        y=g-g_trial
+        sy=np.sum(step*y,axis=1)
+        Bs=np.einsum('rij,rj->ri',B,step)
+        sBs=np.sum(step*Bs,axis=1)
+        update=accept&(sy>1e-10*np.sqrt(np.sum(step**2,axis=1)*np.sum(y**2,axis=1)))&(sBs>0)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            B_new=(B-Bs[:,:,None]*Bs[:,None,:]/sBs[:,None,None]
+                   +y[:,:,None]*y[:,None,:]/sy[:,None,None])
+        B=np.where(update[:,None,None],B_new,B)
+        x[active[accept]]=trial[accept]
+        llh[active[accept]]=f_trial[accept]
+        f=np.where(accept,f_trial,f)
+        g=np.where(accept[:,None],g_trial,g)
+        finished=done|stalled
+        converged[active[finished]]=~exit_failed[active[finished]]
+        active=active[~finished]
+        f=f[~finished]
+        g=g[~finished]
+        B=B[~finished]
+    on_bounds=[x[:,0]<=lower[:,0],x[:,0]>=upper[:,0]]
+    x[:,0]=np.exp(x[:,0])
+    x[:,0]=np.select(on_bounds,BP_PHI_BOUNDS,x[:,0])
+    return x,llh,no_evals,converged
+
+def batch_phi_and_N_mles(values,count_matrix,phi_0,nu_0,fallback_start=None,
+                         limit_mles=None,max_iter=200,full_output=False):
+    '''
+    Calculate maximum likelihood estimates of beta-Poisson parameters Phi and
+    nu for every row of a count matrix at once, as produced by
+    bootstrap_count_matrix. Rather than calling an optimiser for each row,
+    all of the rows are advanced together by projected quasi-Newton
+    iterations, each evaluating the likelihood and its gradient for every
+    active row in one call to the vectorised derivatives behind
+    beta_poisson_loglh_derivatives. Each row keeps its own curvature model,
+    its own Levenberg-Marquardt damping and its own bounds, as in
+    get_phi_and_N_mles, and is dropped from the iteration once converged.
 
-    mle=sp.optimize.minimize(f,[phi_0,nu_0],bounds=((1e-6,50),(0,1/np.mean(data))))
-    if mle.x[1]<0:
-        mle.x[1]=0
-    return mle.x[0],mle.x[1]
+    Parameters
+    ----------
+        values : array
+            distinct values which the columns of count_matrix count
+        count_matrix : array
+            array whose rows are count histograms over values
+        phi_0 : float or array
+            initial estimate of Phi for each row
+        nu_0 : float or array
+            initial estimate of nu for each row
+        fallback_start : tuple
+            optional second initial estimates (phi, nu), each a float or an
+            array over the rows. Rows whose fit ends at the negative binomial
+            limit nu=0, the Poisson limit nu=1/lambda or with Phi on its upper
+            bound are refitted from them and the better of the two fits is
+            kept, see get_phi_and_N_mles.
+        limit_mles : tuple
+            optional maximum likelihood estimates (theta, lambda) of the
+            negative binomial and zero-inflated Poisson distributions for each
+            row. Rows whose fit is worse than the beta-Poisson likelihood at
+            either limit are refitted from it, see get_phi_and_N_mles.
+        max_iter : int
+            maximum number of iterations
+        full_output : bool
+            if True, also return the number of likelihood evaluations used for
+            each row and whether each fit converged
+
+    Returns
+    -------
+        phi : array
+            maximum likelihood estimate of Phi for each row
+        nu : array
+            maximum likelihood estimate of nu for each row
+        no_evals : array
+            number of likelihood evaluations for each row, only returned if
+            full_output is True
+        converged : array
+            whether each fit converged within max_iter iterations, only
+            returned if full_output is True
+    '''
+    values=np.asarray(values)
+    count_matrix=np.atleast_2d(count_matrix)
+    no_rows=len(count_matrix)
+    sample_mean=count_matrix@values/np.sum(count_matrix,axis=1)
+    phi=np.array(np.broadcast_to(np.asarray(phi_0,dtype=float),(no_rows,)))
+    nu=np.array(np.broadcast_to(np.asarray(nu_0,dtype=float),(no_rows,)))
+    no_evals=np.zeros(no_rows,dtype=int)
+    converged=np.ones(no_rows,dtype=bool)
+    # With a sample mean of zero the likelihood does not depend on Phi or nu,
+    # and the initial estimates are returned
+    rows=np.nonzero(sample_mean>0)[0]
+    if len(rows)>0:
+        x,llh,no_evals[rows],converged[rows]=_batch_phi_and_N_fit(
+            values,count_matrix[rows],sample_mean[rows],phi[rows],nu[rows],
+            max_iter)
+        phi[rows]=x[:,0]
+        nu[rows]=x[:,1]
+        def refit(redo,phi_start,nu_start,ties=False):
+            # Refits the rows flagged in redo from the given starts, keeping
+            # the refits which are better by more than BP_FIT_LLH_TOL, or
+            # which are as good if ties is set
+            refit_rows=rows[redo]
+            if len(refit_rows)==0:
+                return
+            x_refit,llh_refit,evals,conv=_batch_phi_and_N_fit(
+                values,count_matrix[refit_rows],sample_mean[refit_rows],
+                phi_start,nu_start,max_iter)
+            no_evals[refit_rows]+=evals
+            gain=llh_refit-llh[redo]
+            better=gain>(-BP_FIT_LLH_TOL if ties else BP_FIT_LLH_TOL)
+            phi[refit_rows[better]]=x_refit[better,0]
+            nu[refit_rows[better]]=x_refit[better,1]
+            converged[refit_rows[better]]=conv[better]
+            llh[np.nonzero(redo)[0][better]]=llh_refit[better]
+        if fallback_start is not None:
+            phi_fallback=np.broadcast_to(np.asarray(fallback_start[0],dtype=float),(no_rows,))
+            nu_fallback=np.broadcast_to(np.asarray(fallback_start[1],dtype=float),(no_rows,))
+            on_phi_bound=phi[rows]>=BP_PHI_BOUNDS[1]
+            redo=((nu[rows]<1e-4)|(nu[rows]>=(1-1e-6)/sample_mean[rows])|
+                  on_phi_bound)
+            # Refits as good as fits with Phi on its upper bound are kept
+            refit(redo&~on_phi_bound,phi_fallback[rows[redo&~on_phi_bound]],
+                  nu_fallback[rows[redo&~on_phi_bound]])
+            refit(on_phi_bound,phi_fallback[rows[on_phi_bound]],
+                  nu_fallback[rows[on_phi_bound]],ties=True)
+        nb_limit=nu[rows]<1e-4
+        largest=np.max(np.where(count_matrix[rows[nb_limit]]>0,values,0),axis=1)
+        refit(nb_limit,phi[rows[nb_limit]],1/(BP_LARGEST_COUNT_N*largest))
+        if limit_mles is not None:
+            theta=np.broadcast_to(np.asarray(limit_mles[0],dtype=float),(no_rows,))[rows]
+            lmbd_zip=np.broadcast_to(np.asarray(limit_mles[1],dtype=float),(no_rows,))[rows]
+            for phi_limit,nu_limit in (
+                    (np.clip(1/theta,*BP_PHI_BOUNDS),np.zeros(len(rows))),
+                    (np.full(len(rows),BP_PHI_BOUNDS[0]),
+                     np.minimum(1/lmbd_zip,(1-1e-6)/sample_mean[rows]))):
+                llh_limit=_beta_poisson_loglh_derivatives(
+                    values.reshape(-1,1),count_matrix[rows].T,sample_mean[rows],
+                    phi_limit,nu_limit,hessian=False)[0]
+                redo=llh_limit>llh+BP_FIT_LLH_TOL
+                refit(redo,phi_limit[redo],nu_limit[redo])
+    if full_output:
+        return phi,nu,no_evals,converged
+    return phi,nu
 
 def zip_pmf(x,lmbd,sigma):
     '''
@@ -253,23 +1594,25 @@ def zip_loglh(data,lmbd,sigma):
 
     Parameters
     ----------
-        data : list
-            sample dataset
-        lmbd : float
+        data : list or tuple
+            sample dataset or count histogram
+        lmbd : float or array
             mean of Poisson component
-        sigma : float
+        sigma : float or array
             degree of zero inflation
     Returns
     -------
-        llh : float
+        llh : float or array
             log likelihood of lmbd and sigma given data
     '''
-    llh=0
-    for x in data:
-        if x==0:
-            llh+=np.log(sigma+(1-sigma)*np.exp(-lmbd))
-        else:
-            llh+=np.log(1-sigma)+np.log(stats.poisson.pmf(x,lmbd))
+    values,counts=count_histogram(data)
+    x,n=_expand_histogram(values,counts,lmbd,sigma)
+    lmbd=np.asarray(lmbd)
+    sigma=np.asarray(sigma)
+    with np.errstate(divide='ignore'):
+        llh=np.sum(np.where(x==0,
+                n*np.log(sigma+(1-sigma)*np.exp(-lmbd)),
+                n*(np.log(1-sigma)+stats.poisson.logpmf(x,lmbd))),axis=0)
     return llh
 
 def get_zip_mles(data,lmbd_0,sigma_0):
@@ -278,8 +1621,8 @@ def get_zip_mles(data,lmbd_0,sigma_0):
 
     Parameters
     ----------
-        data : list
-            sample dataset
+        data : list or tuple
+            sample dataset or count histogram
         lmbd_0 : float
             initial estimate of lambda
         sigma_0 : float
@@ -292,250 +1635,662 @@ def get_zip_mles(data,lmbd_0,sigma_0):
         : float
             maximum likelihood estimate of sigma
     '''
+    hist=count_histogram(data)
     def f(params):
         lmbd=params[0]
         sigma=params[1]
-        return -zip_loglh(data,lmbd,sigma)
-    mle=sp.optimize.minimize(f,[lmbd_0,sigma_0],bounds=((np.mean(data),50),(0,1-1e-6)))
+        return -zip_loglh(hist,lmbd,sigma)
+    mle=sp.optimize.minimize(f,[lmbd_0,sigma_0],bounds=((histogram_mean(hist),50),(0,1-1e-6)))
     return mle.x[0],mle.x[1]
 
-def beta_poisson_pgf(s,lmbd,phi,N):
+def solve_zip_mles(data,xtol=1e-12):
     '''
-    Probability generating function of the beta-Poisson distribution.
+    Calculate maximum likelihood estimates of ZIP parameters lambda and sigma
+    from the profile likelihood. For fixed lambda the MLE of sigma satisfies
+    (1-sigma)lambda = sample mean, and substituting this in leaves the
+    zero-truncated Poisson mean equation
+        lambda/(1-exp(-lambda)) = mean of the nonzero counts,
+    which has a unique root whenever some nonzero count exceeds 1. This can be
+    used in place of get_zip_mles.
+
+    If the data contain no more zeros than a Poisson distribution with the
+    sample mean would predict, the MLE lies on the boundary sigma=0 and the
+    Poisson fit is returned. The same holds if the data contain only zeros and
+    ones, as the likelihood then increases towards sigma=0 and lambda equal to
+    the sample mean. If all of the data are zero, the point mass at zero,
+    lambda=sigma=0, is returned.
 
     Parameters
     ----------
-        s : float
-            point at which to evaluate PGF
-        lmbd : float
-        Phi : float
-        N : float
+        data : list or tuple
+            sample dataset or count histogram
+        xtol : float
+            absolute tolerance on lambda
 
     Returns
     -------
-        G : float or array
-            PGF evaluated at s
+        : float
+            maximum likelihood estimate of lambda
+        : float
+            maximum likelihood estimate of sigma
     '''
-    if np.size(np.asarray(s))==1:
-        G=spsp.hyp1f1(lmbd*phi,N*phi,N*(s-1));
+    values,counts=count_histogram(data)
+    sample_mean=histogram_mean((values,counts))
+    no_nonzero=np.sum(counts[values>0])
+    if no_nonzero==0:
+        return 0.0,0.0
+    nonzero_mean=np.sum(values*counts)/no_nonzero
+    zero_prop=1-no_nonzero/np.sum(counts)
+    if nonzero_mean<=1 or zero_prop<=np.exp(-sample_mean):
+        return sample_mean,0.0
+    def f(lmbd):
+        return lmbd+nonzero_mean*np.expm1(-lmbd)
+    # f is convex, negative just above zero and positive at the nonzero mean
+    lmbd_mle=opt.brentq(f,xtol,nonzero_mean,xtol=xtol)
+    sigma_mle=max(1-sample_mean/lmbd_mle,0.0)
+    return lmbd_mle,sigma_mle
+
+def batch_solve_zip_mles(values,count_matrix,xtol=1e-12,max_iter=100):
+    '''
+    Calculate maximum likelihood estimates of ZIP parameters lambda and sigma
+    for every row of a count matrix at once, as produced by
+    bootstrap_count_matrix. Each row is solved as in solve_zip_mles, with the
+    zero-truncated Poisson mean equations of all of the rows solved together
+    by Newton's method. The equation is convex in lambda, so starting from the
+    mean of the nonzero counts, where it is positive, the iterates decrease
+    monotonically to the root.
+
+    Parameters
+    ----------
+        values : array
+            distinct values which the columns of count_matrix count
+        count_matrix : array
+            array whose rows are count histograms over values
+        xtol : float
+            absolute tolerance on lambda
+        max_iter : int
+            maximum number of Newton iterations
+
+    Returns
+    -------
+        lmbd : array
+            maximum likelihood estimate of lambda for each row
+        sigma : array
+            maximum likelihood estimate of sigma for each row
+    '''
+    values=np.asarray(values)
+    count_matrix=np.atleast_2d(count_matrix)
+    no_cases=np.sum(count_matrix,axis=1)
+    total=count_matrix@values
+    sample_mean=total/no_cases
+    no_nonzero=count_matrix@(values>0)
+    nonzero_mean=total/np.maximum(no_nonzero,1)
+    zero_prop=1-no_nonzero/no_cases
+    lmbd=sample_mean.astype(float)
+    sigma=np.zeros(len(count_matrix))
+    active=np.nonzero((no_nonzero>0)&(nonzero_mean>1)&
+                      (zero_prop>np.exp(-sample_mean)))[0]
+    l=nonzero_mean[active]
+    for i in range(max_iter):
+        if len(active)==0:
+            break
+        y=nonzero_mean[active]
+        l_new=l-(l+y*np.expm1(-l))/(1-y*np.exp(-l))
+        converged=np.abs(l_new-l)<=xtol
+        lmbd[active[converged]]=l_new[converged]
+        active=active[~converged]
+        l=l_new[~converged]
+    lmbd[active]=l
+    solved=(no_nonzero>0)&(lmbd>sample_mean)
+    sigma[solved]=1-sample_mean[solved]/lmbd[solved]
+    return lmbd,sigma
+
+DIST_TABLE_TOL=1e-12
+DIST_TABLE_CACHE_SIZE=256
+
+def _dist_logpmf_support(model,params,K):
+    '''
+    Log probability mass function of one of the five offspring distributions
+    on 0,...,K, with parameters in the layout used by generate_mle_dict.
+    '''
+    x=np.arange(K+1)
+    if model=='poisson':
+        return stats.poisson.logpmf(x,params[0])
+    elif model=='geometric':
+        return stats.geom.logpmf(x,1/(params[0]+1),-1)
+    elif model=='negative binomial':
+        return stats.nbinom.logpmf(x,params[0]/params[1],1/(params[1]+1))
+    elif model=='zip':
+        with np.errstate(divide='ignore'):
+            return np.log(zip_pmf(x,params[0],params[1]))
+    elif model=='beta-Poisson':
+        lmbd,phi,nu=params
+        if nu<1e-4:
+            return stats.nbinom.logpmf(x,lmbd*phi,phi/(phi+1))
+        return beta_poisson_logpmf_support(K,lmbd,phi,1/nu)
+    raise ValueError('Unknown model {0}'.format(model))
+
+def _dist_truncation_depth(model,params,tol):
+    '''
+    Upper bound on the point beyond which the tail mass of the distribution is
+    at most tol, or None if no closed form bound is available.
+    '''
+    if model=='poisson':
+        return stats.poisson.isf(tol,params[0])
+    elif model=='geometric':
+        return stats.geom.isf(tol,1/(params[0]+1),-1)
+    elif model=='negative binomial':
+        return stats.nbinom.isf(tol,params[0]/params[1],1/(params[1]+1))
+    elif model=='zip':
+        if params[1]>=1:
+            return 0
+        return stats.poisson.isf(tol/(1-params[1]),params[0])
+    elif model=='beta-Poisson':
+        lmbd,phi,nu=params
+        if nu<1e-4:
+            return stats.nbinom.isf(tol,lmbd*phi,phi/(phi+1))
+        # The beta-Poisson is a Poisson(N*p) mixture with p<=1, so its tail is
+        # dominated by that of a Poisson with mean N=1/nu
+        return stats.poisson.isf(tol,1/nu)
+    raise ValueError('Unknown model {0}'.format(model))
+
+@functools.lru_cache(maxsize=DIST_TABLE_CACHE_SIZE)
+def _cached_dist_table(model,params,tol):
+    K_max=int(_dist_truncation_depth(model,params,tol))
+    if model=='beta-Poisson' and params[2]>=1e-4:
+        # The Poisson bound can be very loose when N is large, so grow the
+        # support until the remaining mass is below tol
+        K=min(max(16,int(4*params[0])),K_max)
+        logp=_dist_logpmf_support(model,params,K)
+        while K<K_max and 1-np.sum(np.exp(logp))>tol:
+            K=min(2*K,K_max)
+            logp=_dist_logpmf_support(model,params,K)
     else:
-        G=[]
-        for i in range(0,np.size(np.asarray(s))):
-            G=G+[spsp.hyp1f1(lmbd*phi,N*phi,N*(s[i]-1))]
-    return G
+        logp=_dist_logpmf_support(model,params,max(K_max,0))
+    pmf=np.exp(logp)
+    cdf=np.minimum(np.cumsum(pmf),1)
+    # Summing the upper tail directly keeps sf accurate where cdf is close to 1
+    tail=max(1-np.sum(pmf),0)
+    sf=np.append(np.cumsum(pmf[:0:-1])[::-1],0)+tail
+    for table in (pmf,cdf,sf):
+        table.flags.writeable=False
+    return pmf,cdf,sf
+
+def dist_table(model,params,tol=DIST_TABLE_TOL):
+    '''
+    Tabulate the probability mass, cumulative distribution and survival
+    functions of a fitted offspring distribution on 0,...,K, where K is chosen
+    so that the mass beyond K is at most tol. Tables are held in a bounded
+    least-recently-used cache keyed by (model, parameters, tolerance), so
+    repeated calls with the same fitted parameters do not rebuild them.
+
+    Parameters
+    ----------
+        model : string
+            one of 'poisson', 'geometric', 'negative binomial', 'zip' or
+            'beta-Poisson'
+        params : float or tuple
+            parameters of the model as stored in the output of
+            generate_mle_dict
+        tol : float
+            maximum probability mass allowed beyond the end of the table
+
+    Returns
+    -------
+        pmf : array
+            probability of each point 0,...,K
+        cdf : array
+            probability of at most x for each point 0,...,K
+        sf : array
+            probability of more than x for each point 0,...,K
+    '''
+    params=tuple(float(p) for p in np.atleast_1d(params))
+    return _cached_dist_table(model,params,float(tol))
+
+def dist_table_cache_info():
+    '''
+    Hit, miss and size statistics for the distribution table cache.
+
+    Returns
+    -------
+        cache_info : dictionary
+            numbers of hits and misses and current and maximum numbers of
+            stored tables
+    '''
+    info=_cached_dist_table.cache_info()
+    return {
+        'hits' : info.hits,
+        'misses' : info.misses,
+        'size' : info.currsize,
+        'maxsize' : info.maxsize
+    }
+
+def dist_table_cache_clear():
+    '''
+    Empty the distribution table cache and reset its statistics.
+    '''
+    _cached_dist_table.cache_clear()
 
-def poisson_pgf(s,lmbd):
+def _dist_table_lookup(table,x,below,above):
+    x=np.floor(np.asarray(x,dtype=float))
+    vals=np.where(x<0,below,above)
+    inside=(x>=0)&(x<len(table))
+    vals[inside]=table[x[inside].astype(int)]
+    return vals[()]
+
+def dist_pmf(model,x,params,tol=DIST_TABLE_TOL):
     '''
-    Probability generating function of the Poisson distribution.
+    Probability mass function of a fitted offspring distribution, read from
+    the cached table built by dist_table.
 
     Parameters
     ----------
-        s : float
-            point at which to evaluate PGF
-        lmbd : float
+        model : string
+            name of model, see dist_table
+        x : int or array
+            point(s) at which to evaluate function
+        params : float or tuple
+            parameters of the model
+        tol : float
+            tail mass tolerance of the table
 
     Returns
     -------
-        G : float or array
-            PGF evaluated at s
+        P : float or array
+            probability of each point in x
     '''
-    if np.size(np.asarray(s))==1:
-        G=np.exp(lmbd*(s-1))
-    else:
-        G=[]
-        for i in range(0,np.size(np.asarray(s))):
-            G=G+[np.exp(lmbd*(s[i]-1))]
-    return G
+    x=np.asarray(x,dtype=float)
+    pmf=dist_table(model,params,tol)[0]
+    return np.where(x==np.floor(x),_dist_table_lookup(pmf,x,0.,0.),0.)[()]
 
-def geom_pgf(s,lmbd):
+def dist_cdf(model,x,params,tol=DIST_TABLE_TOL):
     '''
-    Probability generating function of the geometric distribution.
+    Cumulative distribution function of a fitted offspring distribution, read
+    from the cached table built by dist_table.
 
     Parameters
     ----------
-        s : float
-            point at which to evaluate PGF
-        lmbd : float
+        model : string
+            name of model, see dist_table
+        x : float or array
+            point(s) at which to evaluate function
+        params : float or tuple
+            parameters of the model
+        tol : float
+            tail mass tolerance of the table
+
+    Returns
+    -------
+        F : float or array
+            probability of at most x for each point in x
+    '''
+    return _dist_table_lookup(dist_table(model,params,tol)[1],x,0.,1.)
+
+def dist_sf(model,x,params,tol=DIST_TABLE_TOL):
+    '''
+    Survival function of a fitted offspring distribution, read from the cached
+    table built by dist_table. Values beyond the end of the table are
+    returned as zero, with absolute error at most tol.
+
+    Parameters
+    ----------
+        model : string
+            name of model, see dist_table
+        x : float or array
+            point(s) at which to evaluate function
+        params : float or tuple
+            parameters of the model
+        tol : float
+            tail mass tolerance of the table
+
+    Returns
+    -------
+        S : float or array
+            probability of more than x for each point in x
+    '''
+    return _dist_table_lookup(dist_table(model,params,tol)[2],x,1.,0.)
+
+def dist_ppf(model,q,params,tol=DIST_TABLE_TOL):
+    '''
+    Percent point function (inverse of the cumulative distribution function)
+    of a fitted offspring distribution, read from the cached table built by
+    dist_table. Quantiles which fall in the truncated tail cannot be resolved
+    at the given tolerance and are returned as nan.
+
+    Parameters
+    ----------
+        model : string
+            name of model, see dist_table
+        q : float or array
+            probabilities at which to evaluate function
+        params : float or tuple
+            parameters of the model
+        tol : float
+            tail mass tolerance of the table
+
+    Returns
+    -------
+        x : float or array
+            smallest point with cumulative probability at least q
+    '''
+    cdf=dist_table(model,params,tol)[1]
+    q=np.asarray(q,dtype=float)
+    x=np.searchsorted(cdf,q.ravel(),side='left').astype(float).reshape(q.shape)
+    x[q>cdf[-1]]=np.nan
+    x[q>=1]=np.inf
+    x[(q<0)|(q>1)|np.isnan(q)]=np.nan
+    return x[()]
+
+def beta_poisson_pgf(s,lmbd,phi,N,derivatives=False):
+    '''
+    Probability generating function of the beta-Poisson distribution,
+        G(s)=1F1(Phi*lmbd;Phi*N;N(s-1)).
+    All arguments are broadcast against each other. The derivatives in s use
+    the identity d/dz 1F1(a;b;z)=(a/b)1F1(a+1;b+1;z).
+
+    Parameters
+    ----------
+        s : float or array
+            point(s) at which to evaluate PGF
+        lmbd : float or array
+        phi : float or array
+        N : float or array
+        derivatives : bool
+            if True, also return the first and second derivatives in s
 
     Returns
     -------
         G : float or array
             PGF evaluated at s
+        dG : float or array
+            first derivative of PGF at s, only returned if derivatives is True
+        d2G : float or array
+            second derivative of PGF at s, only returned if derivatives is True
+    '''
+    N=np.asarray(N)
+    a=np.asarray(phi)*np.asarray(lmbd)
+    b=np.asarray(phi)*N
+    u=N*(np.asarray(s)-1)
+    G=spsp.hyp1f1(a,b,u)
+    if not derivatives:
+        return G
+    dG=N*a/b*spsp.hyp1f1(a+1,b+1,u)
+    d2G=N**2*a*(a+1)/(b*(b+1))*spsp.hyp1f1(a+2,b+2,u)
+    return G,dG,d2G
+
+def poisson_pgf(s,lmbd,derivatives=False):
+    '''
+    Probability generating function of the Poisson distribution. All arguments
+    are broadcast against each other.
+
+    Parameters
+    ----------
+        s : float or array
+            point(s) at which to evaluate PGF
+        lmbd : float or array
+        derivatives : bool
+            if True, also return the first and second derivatives in s
+
+    Returns
+    -------
+        G : float or array
+            PGF evaluated at s
+        dG : float or array
+            first derivative of PGF at s, only returned if derivatives is True
+        d2G : float or array
+            second derivative of PGF at s, only returned if derivatives is True
     '''
-    if np.size(np.asarray(s))==1:
-        G=1/(lmbd+1-lmbd*s)
-    else:
-        G=[]
-        for i in range(0,np.size(np.asarray(s))):
-            G=G+[1/(lmbd+1-lmbd*s[i])]
-    return G
+    s=np.asarray(s)
+    lmbd=np.asarray(lmbd)
+    G=np.exp(lmbd*(s-1))
+    if not derivatives:
+        return G
+    return G,lmbd*G,lmbd**2*G
 
-def neg_bin_pgf(s,lmbd,theta):
+def geom_pgf(s,lmbd,derivatives=False):
     '''
-    Probability generating function of the negative binomial distribution.
+    Probability generating function of the geometric distribution. All
+    arguments are broadcast against each other.
 
     Parameters
     ----------
-        s : float
-            point at which to evaluate PGF
-        lmbd : float
-        theta : float
+        s : float or array
+            point(s) at which to evaluate PGF
+        lmbd : float or array
+        derivatives : bool
+            if True, also return the first and second derivatives in s
 
     Returns
     -------
         G : float or array
             PGF evaluated at s
+        dG : float or array
+            first derivative of PGF at s, only returned if derivatives is True
+        d2G : float or array
+            second derivative of PGF at s, only returned if derivatives is True
     '''
-    if np.size(np.asarray(s))==1:
-        G=(theta+1-s*theta)**(-lmbd/theta)
-    else:
-        G=[]
-        for i in range(0,np.size(np.asarray(s))):
-            G=G+[(theta+1-s[i]*theta)**(-lmbd/theta)]
-    return G
+    s=np.asarray(s)
+    lmbd=np.asarray(lmbd)
+    G=1/(lmbd+1-lmbd*s)
+    if not derivatives:
+        return G
+    return G,lmbd*G**2,2*lmbd**2*G**3
 
-def zip_pgf(s,lmbd,sigma):
+def neg_bin_pgf(s,lmbd,theta,derivatives=False):
     '''
-    Probability generating function of the zero-inflated Poisson distribution.
+    Probability generating function of the negative binomial distribution. All
+    arguments are broadcast against each other.
 
     Parameters
     ----------
-        s : float
-            point at which to evaluate PGF
-        lmbd : float
-        sigma : float
+        s : float or array
+            point(s) at which to evaluate PGF
+        lmbd : float or array
+        theta : float or array
+        derivatives : bool
+            if True, also return the first and second derivatives in s
 
     Returns
     -------
         G : float or array
             PGF evaluated at s
+        dG : float or array
+            first derivative of PGF at s, only returned if derivatives is True
+        d2G : float or array
+            second derivative of PGF at s, only returned if derivatives is True
+    '''
+    s=np.asarray(s)
+    lmbd=np.asarray(lmbd)
+    theta=np.asarray(theta)
+    base=theta+1-s*theta
+    G=base**(-lmbd/theta)
+    if not derivatives:
+        return G
+    dG=lmbd*G/base
+    return G,dG,(lmbd+theta)*dG/base
+
+def zip_pgf(s,lmbd,sigma,derivatives=False):
     '''
-    if np.size(np.asarray(s))==1:
-        G=sigma+(1-sigma)*np.exp(lmbd*(s-1))
-    else:
-        G=[]
-        for i in range(0,np.size(np.asarray(s))):
-            G=G+[sigma+(1-sigma)*np.exp(lmbd*(s[i]-1))]
-    return G
+    Probability generating function of the zero-inflated Poisson distribution.
+    All arguments are broadcast against each other.
+
+    Parameters
+    ----------
+        s : float or array
+            point(s) at which to evaluate PGF
+        lmbd : float or array
+        sigma : float or array
+        derivatives : bool
+            if True, also return the first and second derivatives in s
+
+    Returns
+    -------
+        G : float or array
+            PGF evaluated at s
+        dG : float or array
+            first derivative of PGF at s, only returned if derivatives is True
+        d2G : float or array
+            second derivative of PGF at s, only returned if derivatives is True
+    '''
+    s=np.asarray(s)
+    lmbd=np.asarray(lmbd)
+    sigma=np.asarray(sigma)
+    poi=(1-sigma)*np.exp(lmbd*(s-1))
+    G=sigma+poi
+    if not derivatives:
+        return G
+    return G,lmbd*poi,lmbd**2*poi
+
+def _solve_extinction(pgf,mean,params,xtol=1e-12,max_iter=100):
+    '''
+    Solve G(s)=s for the smallest root in [0,1] for a batch of parameter sets
+    at once. G(s)-s is convex with G(0)>=0, so starting from s=0 each entry
+    is updated by Halley's method while the step stays inside the bracket
+    formed by the points visited so far, falling back to a Newton step and
+    then to bisection otherwise. Entries are dropped from the iteration once
+    converged, and subcritical entries (mean<=1) are set to one without a
+    solve.
+
+    Parameters
+    ----------
+        pgf : function
+            PGF taking (s,*params,derivatives=True)
+        mean : float or array
+            mean of the offspring distribution for each parameter set
+        params : tuple
+            parameters of the PGF, broadcast against mean
+        xtol : float
+            absolute tolerance on the extinction probability
+        max_iter : int
+            maximum number of iterations
 
-def beta_poisson_extinction_prob( lmbd,phi,N ):
+    Returns
+    -------
+        q : float or array
+            extinction probability for each parameter set
+    '''
+    arrays=np.broadcast_arrays(*[np.asarray(p,dtype=float)
+                                 for p in (mean,)+tuple(params)])
+    shape=arrays[0].shape
+    mean=arrays[0].ravel()
+    params=[p.ravel() for p in arrays[1:]]
+    q=np.ones(mean.shape)
+    active=np.nonzero(mean>1)[0]
+    s=np.zeros(active.shape)
+    lo=np.zeros(active.shape)
+    hi=np.ones(active.shape)
+    for i in range(max_iter):
+        if len(active)==0:
+            break
+        G,dG,d2G=pgf(s,*[p[active] for p in params],derivatives=True)
+        f=G-s
+        df=dG-1
+        lo=np.where(f>0,s,lo)
+        hi=np.where(f<0,s,hi)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            s_new=s-2*f*df/(2*df**2-f*d2G)
+            outside=~((s_new>lo)&(s_new<hi))
+            s_new[outside]=(s-f/df)[outside]
+        outside=~((s_new>lo)&(s_new<hi))
+        s_new[outside]=(lo[outside]+hi[outside])/2
+        converged=(np.abs(s_new-s)<=xtol)|(f==0)
+        q[active[converged]]=np.where(f==0,s,s_new)[converged]
+        active=active[~converged]
+        s=s_new[~converged]
+        lo=lo[~converged]
+        hi=hi[~converged]
+    q[active]=s
+    return q.reshape(shape)[()]
+
+def beta_poisson_extinction_prob(lmbd,phi,N):
     '''
     Calculate the probability that the beta-Poisson branching process becomes
-    extinct.
+    extinct. Arrays of parameters are broadcast against each other and solved
+    together.
 
     Parameters
     ----------
-        lmbd : float
-        phi : float
-        N : float
+        lmbd : float or array
+        phi : float or array
+        N : float or array
 
     Returns
     -------
-        q : float
+        q : float or array
             extinction probability
     '''
-    if lmbd<=1:
-        return 1
-    else:
-        def f(s):
-            return beta_poisson_pgf(s,lmbd,phi,N)-s
-        q=opt.brentq(
-            f, 0, 1-1e-4);
-        return q
+    return _solve_extinction(beta_poisson_pgf,lmbd,(lmbd,phi,N))
 
-def poisson_extinction_prob( lmbd ):
+def poisson_extinction_prob(lmbd):
     '''
     Calculate the probability that the Poisson branching process becomes
-    extinct.
+    extinct. Arrays of parameters are broadcast against each other and solved
+    together.
 
     Parameters
     ----------
-        lmbd : float
+        lmbd : float or array
 
     Returns
     -------
-        q : float
+        q : float or array
             extinction probability
     '''
-    if lmbd<=1:
-        return 1
-    else:
-        def f(s):
-            return poisson_pgf(s,lmbd)-s
-    q=opt.brentq(
-        f, 0, 1-1e-6)
-    return q
+    return _solve_extinction(poisson_pgf,lmbd,(lmbd,))
 
-def geom_extinction_prob( lmbd ):
+def geom_extinction_prob(lmbd):
     '''
     Calculate the probability that the geometric branching process becomes
-    extinct.
+    extinct. Arrays of parameters are broadcast against each other and solved
+    together.
 
     Parameters
     ----------
-        lmbd : float
+        lmbd : float or array
 
     Returns
     -------
-        q : float
+        q : float or array
             extinction probability
     '''
-    if lmbd<=1:
-        return 1
-    else:
-        def f(s):
-            return geom_pgf(s,lmbd)-s
-    q=opt.brentq(
-        f, 0, 1-1e-6)
-    return q
+    return _solve_extinction(geom_pgf,lmbd,(lmbd,))
 
-def neg_bin_extinction_prob( lmbd,theta ):
+def neg_bin_extinction_prob(lmbd,theta):
     '''
     Calculate the probability that the negative binomial branching process
-    becomes extinct.
+    becomes extinct. Arrays of parameters are broadcast against each other and
+    solved together.
 
     Parameters
     ----------
-        lmbd : float
-        theta : float
+        lmbd : float or array
+        theta : float or array
 
     Returns
     -------
-        q : float
+        q : float or array
             extinction probability
     '''
-    if lmbd<=1:
-        return 1
-    else:
-        def f(s):
-            return neg_bin_pgf(s,lmbd,theta)-s
-        q=opt.brentq(
-            f, 0, 1-1e-6)
-        return q
+    return _solve_extinction(neg_bin_pgf,lmbd,(lmbd,theta))
 
-def zip_extinction_prob( lmbd,sigma ):
+def zip_extinction_prob(lmbd,sigma):
     '''
     Calculate the probability that the zero-inflated Poisson branching process
-    becomes extinct.
+    becomes extinct. Arrays of parameters are broadcast against each other and
+    solved together.
 
     Parameters
     ----------
-        lmbd : float
-        sigma : float
+        lmbd : float or array
+        sigma : float or array
 
     Returns
     -------
-        q : float
+        q : float or array
             extinction probability
     '''
-    if (1-sigma)*lmbd<=1:
-        return 1
-    else:
-        def f(s):
-            return zip_pgf(s,lmbd,sigma)-s
-        q=opt.brentq(
-            f, 0, 1-1e-6)
-        return q
+    mean=(1-np.asarray(sigma))*np.asarray(lmbd)
+    return _solve_extinction(zip_pgf,mean,(lmbd,sigma))
 
 def empirical_loglh(data):
     '''
@@ -544,19 +2299,16 @@ def empirical_loglh(data):
 
     Parameters
     ----------
-        data : list
-            sample data
+        data : list or tuple
+            sample data or count histogram
 
     Returns
     -------
         llh : float
             log likelihood
     '''
-    counts,bins=np.histogram(data,max(data)+1)
-    dist=counts/len(data)
-    llh=0
-    for x in data:
-        llh+=np.log(dist[x])
+    values,counts=count_histogram(data)
+    llh=np.sum(counts*np.log(counts/np.sum(counts)))
     return llh
 
 def get_lambda_and_phi_mles(data,lmbd_0,phi_0,N_emp):
@@ -566,8 +2318,8 @@ def get_lambda_and_phi_mles(data,lmbd_0,phi_0,N_emp):
 
     Parameters
     ----------
-        data : list
-            sample dataset
+        data : list or tuple
+            sample dataset or count histogram
         lmbd_0 : float
             initial estimate of lambda
         phi_0 : float
@@ -582,11 +2334,13 @@ def get_lambda_and_phi_mles(data,lmbd_0,phi_0,N_emp):
         : float
             maximum likelihood estimate of Phi
     '''
+    hist=count_histogram(data)
     def f(params):
         lmbd=params[0]
         phi=params[1]
-        return -beta_poisson_loglh(data,lmbd,phi,N_emp)
-    mle=sp.optimize.minimize(f,[lmbd_0,phi_0],bounds=((1e-6,10),(1e-6,50)))
+        llh,grad=beta_poisson_loglh_derivatives(hist,lmbd,phi,N_emp)
+        return -llh,-grad[:2]
+    mle=sp.optimize.minimize(f,[lmbd_0,phi_0],jac=True,bounds=((1e-6,10),(1e-6,50)))
     return mle.x[0],mle.x[1]
 
 def generate_mle_dict(data,
@@ -594,15 +2348,17 @@ def generate_mle_dict(data,
                       phi_0,
                       nu_0,
                       lmbd_0,
-                      sigma_0):
+                      sigma_0,
+                      full_output=False,
+                      bp_fallback_start=None):
     '''
     Calculate maximum likelihood estimates of parameters for each offspring
     distribution and output them as a dictionary.
 
     Parameters
     ----------
-        data : list
-            sample data to fit to
+        data : list or tuple
+            sample data or count histogram to fit to
         theta_0 : float
             initial estimate of negative binomial overdispersion parameter
         phi_0 : float
@@ -610,38 +2366,129 @@ def generate_mle_dict(data,
         nu_0 : float
             initial estimate of beta-Poisson parameter nu
         lmbd_0 : float
-            initial estimate of ZIP baseline lambda
+            unused, as the ZIP fit needs no initial estimates, see
+            solve_zip_mles
         sigma_0 : float
-            initial estimate of ZIP inflation parameter sigma
+            unused, as the ZIP fit needs no initial estimates, see
+            solve_zip_mles
+        full_output : bool
+            if True, also return the numbers of function evaluations used by
+            the negative binomial and beta-Poisson fits
+        bp_fallback_start : tuple
+            optional second initial estimate of beta-Poisson (Phi, nu), see
+            get_phi_and_N_mles
 
     Returns
     -------
         mle_dict : dictionary
             dictionary containing maximum likelihood estimates of parameters for
             each model.
+        eval_dict : dictionary
+            dictionary containing the number of function evaluations used by
+            each iterative fit, only returned if full_output is True
     '''
-    theta_mle=get_theta_mle(data, theta_0)
-    phi_mle,nu_mle=get_phi_and_N_mles(data, phi_0, nu_0)
-    lmbd_mle,sigma_mle=get_zip_mles(data, lmbd_0, sigma_0)
+    hist=count_histogram(data)
+    sample_mean=histogram_mean(hist)
+    theta_mle,theta_evals=solve_theta_mle(hist, theta_0, full_output=True)
+    lmbd_mle,sigma_mle=solve_zip_mles(hist)
+    phi_mle,nu_mle,bp_evals=get_phi_and_N_mles(hist, phi_0, nu_0, full_output=True, fallback_start=bp_fallback_start,
+                                               limit_mles=(theta_mle,lmbd_mle))
 
     mle_dict = {
-        'poisson' : np.mean(data),
-        'geometric' : np.mean(data),
-        'negative binomial' : [np.mean(data), theta_mle],
+        'poisson' : sample_mean,
+        'geometric' : sample_mean,
+        'negative binomial' : [sample_mean, theta_mle],
         'zip' : [lmbd_mle, sigma_mle],
-        'beta-Poisson' : [np.mean(data), phi_mle, nu_mle]
+        'beta-Poisson' : [sample_mean, phi_mle, nu_mle]
     }
 
+    if full_output:
+        eval_dict = {
+            'negative binomial' : theta_evals,
+            'beta-Poisson' : bp_evals
+        }
+        return mle_dict, eval_dict
     return mle_dict
 
+def generate_mle_dicts(values,
+                       count_matrix,
+                       theta_0,
+                       phi_0,
+                       nu_0,
+                       full_output=False,
+                       bp_fallback_start=None):
+    '''
+    Calculate maximum likelihood estimates of parameters for each offspring
+    distribution for every row of a count matrix, as produced by
+    bootstrap_count_matrix, using the batched fitters so that all of the rows
+    are fitted together. The initial estimates can be given separately for
+    each row.
+
+    Parameters
+    ----------
+        values : array
+            distinct values which the columns of count_matrix count
+        count_matrix : array
+            array whose rows are count histograms over values
+        theta_0 : float or array
+            initial estimate of negative binomial overdispersion parameter
+        phi_0 : float or array
+            initial estimate of beta-Poisson parameter Phi
+        nu_0 : float or array
+            initial estimate of beta-Poisson parameter nu
+        full_output : bool
+            if True, also return the numbers of function evaluations used by
+            the negative binomial and beta-Poisson fits to each row, and
+            whether each beta-Poisson fit converged
+        bp_fallback_start : tuple
+            optional second initial estimates of beta-Poisson (Phi, nu), see
+            batch_phi_and_N_mles
+
+    Returns
+    -------
+        mle_dicts : list
+            dictionary of maximum likelihood estimates for each row, laid out
+            as in generate_mle_dict
+        eval_dicts : list
+            dictionary of function evaluation counts for each row, only
+            returned if full_output is True
+        converged : array
+            whether each beta-Poisson fit converged, only returned if
+            full_output is True
+    '''
+    count_matrix=np.atleast_2d(count_matrix)
+    sample_mean=count_matrix@values/np.sum(count_matrix,axis=1)
+    theta_mle,theta_evals=batch_solve_theta_mles(values,count_matrix,theta_0,
+                                                 full_output=True)
+    lmbd_mle,sigma_mle=batch_solve_zip_mles(values,count_matrix)
+    phi_mle,nu_mle,bp_evals,converged=batch_phi_and_N_mles(
+        values,count_matrix,phi_0,nu_0,fallback_start=bp_fallback_start,
+        limit_mles=(theta_mle,lmbd_mle),full_output=True)
+
+    mle_dicts = [{
+        'poisson' : sample_mean[i],
+        'geometric' : sample_mean[i],
+        'negative binomial' : [sample_mean[i], theta_mle[i]],
+        'zip' : [lmbd_mle[i], sigma_mle[i]],
+        'beta-Poisson' : [sample_mean[i], phi_mle[i], nu_mle[i]]
+    } for i in range(len(count_matrix))]
+
+    if full_output:
+        eval_dicts = [{
+            'negative binomial' : theta_evals[i],
+            'beta-Poisson' : bp_evals[i]
+        } for i in range(len(count_matrix))]
+        return mle_dicts, eval_dicts, converged
+    return mle_dicts
+
 def generate_var_dict(data, mle_dict):
     '''
     Calculates variances of fitted distributions based on MLEs.
 
     Parameters
     ----------
-        data : list
-            sample dataset
+        data : list or tuple
+            sample dataset or count histogram
         mle_dict : dictionary
             dictionary containing maximum likelihood estimates of parameters for
             each model, outputted by generate_mle_dict
@@ -653,7 +2500,7 @@ def generate_var_dict(data, mle_dict):
             likelihood fit
     '''
 
-    sample_mean = np.mean(data)
+    sample_mean = histogram_mean(data)
 
     p_var = sample_mean
     g_var = sample_mean * (1 + sample_mean)
@@ -671,7 +2518,7 @@ def generate_var_dict(data, mle_dict):
             (mle_dict['beta-Poisson'][1] + mle_dict['beta-Poisson'][2]))
 
     var_dict = {
-        'sample' : np.var(data),
+        'sample' : histogram_var(data),
         'poisson' : p_var,
         'geometric' : g_var,
         'negative binomial' : nb_var,
@@ -681,14 +2528,43 @@ def generate_var_dict(data, mle_dict):
 
     return var_dict
 
+def superspread_prop(model, superspread_bd, params):
+    '''
+    Proportion of superspreaders of a fitted offspring distribution, the
+    probability of more than superspread_bd secondary cases. This is the one
+    definition used both for the point estimates of generate_superspread_dict
+    and for the delta method intervals of generate_wald_ci_dicts. A
+    beta-Poisson with nu<1e-4 takes the negative binomial limit of its own
+    parameters, through dist_sf, as its likelihood does.
+
+    Parameters
+    ----------
+        model : string
+            name of model, see dist_table
+        superspread_bd : int
+            superspreading threshold, the Poisson 99th percentile of the
+            sample mean
+        params : float or tuple
+            parameters of the model
+
+    Returns
+    -------
+        prop : float
+            proportion of superspreaders
+    '''
+    if model == 'poisson':
+        # The threshold is the 99th percentile of the Poisson itself
+        return .01
+    return dist_sf(model, superspread_bd, params)
+
 def generate_superspread_dict(data, mle_dict):
     '''
     Calculates proportions of superspreaders by Poisson 99th percentile definition of fitted distributions based on MLEs.
 
     Parameters
     ----------
-        data : list
-            sample dataset
+        data : list or tuple
+            sample dataset or count histogram
         mle_dict : dictionary
             dictionary containing maximum likelihood estimates of parameters for
             each model, outputted by generate_mle_dict
@@ -700,35 +2576,21 @@ def generate_superspread_dict(data, mle_dict):
             likelihood fit
     '''
 
-    sample_mean = np.mean(data)
+    values, counts = count_histogram(data)
+    sample_mean = histogram_mean((values, counts))
 
-    superspread_bd = int(stats.poisson(sample_mean).ppf(.99))
+    superspread_bd = int(dist_ppf('poisson', .99, sample_mean))
 
-    sample_prop = sum(np.array(data)>=superspread_bd) / len(data)
-
-    p_prop = .01
-    g_prop = 1 - stats.geom(1/(mle_dict['geometric']+1),-1).cdf(superspread_bd)
-    nb_prop = 1 - stats.nbinom(mle_dict['negative binomial'][0]/mle_dict['negative binomial'][1],
-        1/(mle_dict['negative binomial'][1]+1)).cdf(superspread_bd)
-    zip_prop = 1 - np.sum(zip_pmf(np.arange(superspread_bd + 1), mle_dict['zip'][0],mle_dict['zip'][1]))
-
-    if mle_dict['beta-Poisson'][2] < 5e-2:
-        bp_prop = nb_prop
-    else:
-        bp_prop = 1 - np.sum(beta_poisson_pmf(np.arange(superspread_bd + 1),
-            mle_dict['beta-Poisson'][0],
-            mle_dict['beta-Poisson'][1],
-            1/mle_dict['beta-Poisson'][2]))
+    sample_prop = np.sum(counts[values>=superspread_bd]) / np.sum(counts)
 
     superspread_dict = {
         'boundary' : superspread_bd,
-        'sample' : sample_prop,
-        'poisson' : p_prop,
-        'geometric' : g_prop,
-        'negative binomial' : nb_prop,
-        'zip' : zip_prop,
-        'beta-Poisson' : bp_prop
+        'sample' : sample_prop
     }
+    for model in ['poisson', 'geometric', 'negative binomial', 'zip',
+                  'beta-Poisson']:
+        superspread_dict[model] = superspread_prop(model, superspread_bd,
+                                                   mle_dict[model])
 
     return superspread_dict
 
@@ -738,8 +2600,8 @@ def generate_p0_dict(data, mle_dict):
 
     Parameters
     ----------
-        data : list
-            sample dataset
+        data : list or tuple
+            sample dataset or count histogram
         mle_dict : dictionary
             dictionary containing maximum likelihood estimates of parameters for
             each model, outputted by generate_mle_dict
@@ -751,24 +2613,15 @@ def generate_p0_dict(data, mle_dict):
             likelihood fit
     '''
 
-    nb_p0 = stats.nbinom(mle_dict['negative binomial'][0]/mle_dict['negative binomial'][1],
-            1/(mle_dict['negative binomial'][1]+1)).pmf(0)
-
-    if mle_dict['beta-Poisson'][2] < 5e-2:
-        bp_p0 = nb_p0
-    else:
-        bp_p0 = beta_poisson_pmf(0,
-            mle_dict['beta-Poisson'][0],
-            mle_dict['beta-Poisson'][1],
-            1/mle_dict['beta-Poisson'][2])
+    values, counts = count_histogram(data)
 
     p0_dict = {
-        'sample' : data.count(0)/len(data),
-        'poisson' : stats.poisson(mle_dict['poisson']).pmf(0),
-        'geometric' : stats.geom(1/(mle_dict['geometric']+1),-1).pmf(0),
-        'negative binomial' : nb_p0,
-        'zip' : zip_pmf(0, mle_dict['zip'][0],mle_dict['zip'][1]),
-        'beta-Poisson' : bp_p0
+        'sample' : np.sum(counts[values==0]) / np.sum(counts),
+        'poisson' : dist_pmf('poisson', 0, mle_dict['poisson']),
+        'geometric' : dist_pmf('geometric', 0, mle_dict['geometric']),
+        'negative binomial' : dist_pmf('negative binomial', 0, mle_dict['negative binomial']),
+        'zip' : dist_pmf('zip', 0, mle_dict['zip']),
+        'beta-Poisson' : dist_pmf('beta-Poisson', 0, mle_dict['beta-Poisson'])
     }
 
     return p0_dict
@@ -779,8 +2632,8 @@ def generate_llh_dict(data, mle_dict):
 
     Parameters
     ----------
-        data : list
-            sample dataset
+        data : list or tuple
+            sample dataset or count histogram
         mle_dict : dictionary
             dictionary containing maximum likelihood estimates of parameters for
             each model, outputted by generate_mle_dict
@@ -821,6 +2674,493 @@ def generate_llh_dict(data, mle_dict):
 
     return llh_dict
 
+PROFILE_MAX_STEPS=60
+PROFILE_BOUNDED_STEPS=3
+
+def _profile_model(model,hist,params):
+    '''
+    Log likelihood of the parameters of a model, in the order of the entries of
+    mle_dict, together with its gradient if it is available, and the bounds on
+    the parameters, which for the beta-Poisson depend on lambda.
+    '''
+    if model=='poisson':
+        return poisson_loglh(hist,params[0]),None,[(1e-10,np.inf)]
+    if model=='geometric':
+        return geo_loglh(hist,params[0]),None,[(1e-10,np.inf)]
+    if model=='negative binomial':
+        return neg_bin_loglh_theta(hist,*params),None,[(1e-10,np.inf),(1e-6,np.inf)]
+    if model=='zip':
+        return zip_loglh(hist,*params),None,[(1e-10,np.inf),(0,1-1e-6)]
+    if model=='beta-Poisson':
+        llh,grad=beta_poisson_loglh_derivatives(hist,*params)
+        return llh,grad,[(1e-10,np.inf),(1e-6,50),(0,(1-1e-6)/params[0])]
+    raise ValueError('No profile likelihood for model '+str(model))
+
+def _natural_bounds(model,params):
+    '''
+    Bounds of the parameters of a model, in the order of the entries of
+    mle_dict, as set by the model itself rather than by the optimizer, so that
+    rates and shapes are only cut off at zero and sigma and lambda*nu at one.
+    '''
+    if model in ('poisson','geometric'):
+        return [(0.0,np.inf)]
+    if model=='negative binomial':
+        return [(0.0,np.inf),(0.0,np.inf)]
+    if model=='zip':
+        return [(0.0,np.inf),(0.0,1.0)]
+    if model=='beta-Poisson':
+        return [(0.0,np.inf),(0.0,np.inf),(0.0,1.0/params[0])]
+    raise ValueError('No parameter bounds for model '+str(model))
+
+def profile_likelihood_ci(data,model,mle,param,confidence_level=95,rtol=1e-6,full_output=False):
+    '''
+    Calculate a profile likelihood confidence interval for one parameter of a
+    model. The interval holds the values of the parameter at which the log
+    likelihood, maximised over the other parameters, is within half the
+    chi-square critical value of its maximum. Its endpoints are bracketed by
+    stepping out from the MLE and then found by Brent's method, with the other
+    parameters refitted at each value starting from the nearest value already
+    fitted. If the MLE lies on a bound of the parameter, such as sigma=0 for
+    the ZIP or nu=0 for the beta-Poisson, the interval starts at the bound and
+    its other endpoint uses the critical value of the 50:50 mixture of chi-square
+    distributions with zero and one degree of freedom. An endpoint at which the
+    likelihood has not dropped far enough by the other bound of the parameter
+    is placed at that bound. Both endpoints are floats.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+        model : str
+            name of the model, as in mle_dict
+        mle : float or list
+            maximum likelihood estimates of the parameters of the model, as in
+            mle_dict
+        param : int
+            index of the parameter in mle
+        confidence_level : float
+            confidence level of the interval as a percentage
+        rtol : float
+            relative tolerance on the endpoints
+        full_output : bool
+            if True, also return the number of times the other parameters were
+            refitted
+
+    Returns
+    -------
+        ci : list
+            lower and upper bounds of the confidence interval
+        : int
+            number of refits, only returned if full_output is True
+    '''
+    hist=count_histogram(data)
+    mle=np.atleast_1d(np.asarray(mle,dtype=float))
+    max_llh,grad,bounds=_profile_model(model,hist,mle)
+    lower,upper=bounds[param]
+    free=[i for i in range(len(mle)) if i!=param]
+    fitted=[(mle[param],mle.copy())]
+    no_fits=0
+
+    def profile(value):
+        nonlocal no_fits
+        # Refit the other parameters starting from the nearest fitted value
+        start=min(fitted,key=lambda fit:abs(fit[0]-value))[1].copy()
+        start[param]=value
+        bounds=_profile_model(model,hist,start)[2]
+        for i in free:
+            start[i]=np.clip(start[i],*bounds[i])
+        if len(free)==0:
+            return _profile_model(model,hist,start)[0]
+        best=[np.inf,start[free]]
+        def f(x):
+            params=start.copy()
+            params[free]=x
+            llh,grad,_=_profile_model(model,hist,params)
+            if -llh<best[0]:
+                best[:]=[-llh,np.array(x,dtype=float)]
+            if grad is None:
+                return -llh
+            return -llh,-grad[free]
+        free_bounds=[(bounds[i][0],None if np.isinf(bounds[i][1]) else bounds[i][1]) for i in free]
+        # As in get_phi_and_N_mles, L-BFGS-B is restarted from the best point
+        # seen until it stops making progress
+        x=start[free]
+        for attempt in range(BP_FIT_MAX_RESTARTS):
+            f_prev=best[0]
+            sp.optimize.minimize(f,x,jac=grad is not None,bounds=free_bounds,options={'ftol':1e-13,'gtol':1e-7})
+            x=best[1]
+            if f_prev-best[0]<=1e-12*abs(best[0]):
+                break
+        no_fits+=1
+        start[free]=x
+        fitted.append((value,start))
+        return -best[0]
+
+    ci=[lower,upper]
+    for side,bound in enumerate([lower,upper]):
+        other=[upper,lower][side]
+        if np.isclose(mle[param],bound,rtol=1e-8,atol=1e-12):
+            ci[side]=bound
+            continue
+        # The critical value is reduced if the interval starts at the other bound
+        at_bound=np.isclose(mle[param],other,rtol=1e-8,atol=1e-12)
+        critical=stats.chi2.ppf(1-2*(1-confidence_level/100) if at_bound else confidence_level/100,1)
+        def excess(value):
+            return profile(value)-(max_llh-critical/2)
+        # A few steps out from the MLE are tried before the bound itself, or
+        # the steps keep doubling if the bound is infinite
+        if side==0:
+            steps=[bound+(mle[param]-bound)*0.5**k for k in range(1,PROFILE_BOUNDED_STEPS+1)]+[bound]
+        else:
+            step=0.05*mle[param] if mle[param]>0 else 0.01*min(upper,1)
+            if np.isfinite(bound):
+                steps=[min(mle[param]+step*2**k,bound) for k in range(PROFILE_BOUNDED_STEPS)]+[bound]
+            else:
+                steps=[mle[param]+step*2**k for k in range(PROFILE_MAX_STEPS)]
+        inner=mle[param]
+        for value in steps:
+            if excess(value)<0:
+                ci[side]=opt.brentq(excess,min(inner,value),max(inner,value),xtol=1e-12,rtol=rtol)
+                break
+            inner=value
+            if value==bound:
+                break
+    ci=[float(ci[0]),float(ci[1])]
+    if full_output:
+        return ci,no_fits
+    return ci
+
+def generate_profile_ci_dict(data,mle_dict,confidence_level=95,full_output=False):
+    '''
+    Calculate profile likelihood confidence intervals for the parameters of
+    each model, see profile_likelihood_ci.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+        mle_dict : dictionary
+            dictionary containing maximum likelihood estimates of parameters for
+            each model, outputted by generate_mle_dict
+        confidence_level : float
+            confidence level of the intervals as a percentage
+        full_output : bool
+            if True, also return the total number of refits used
+
+    Returns
+    -------
+        ci_dict : dictionary
+            dictionary containing the confidence interval of each parameter of
+            each model, laid out as mle_dict
+        : int
+            number of refits, only returned if full_output is True
+    '''
+    hist=count_histogram(data)
+    ci_dict={}
+    no_fits=0
+    for model,mle in mle_dict.items():
+        cis=[]
+        for param in range(np.size(mle)):
+            ci,fits=profile_likelihood_ci(hist,model,mle,param,confidence_level,full_output=True)
+            cis.append(ci)
+            no_fits+=fits
+        ci_dict[model]=cis[0] if np.ndim(mle)==0 else cis
+    if full_output:
+        return ci_dict,no_fits
+    return ci_dict
+
+def _numerical_hessian(f,x,lower,rel_step=1e-4):
+    '''
+    Hessian of a scalar function by central differences, evaluated just inside
+    the lower bounds of its arguments if it is at one of them.
+    '''
+    h=rel_step*np.maximum(np.abs(x),1e-2)
+    x=np.maximum(x,np.asarray(lower)+2*h)
+    hess=np.zeros((len(x),len(x)))
+    for i in range(len(x)):
+        for j in range(i,len(x)):
+            def shifted(si,sj):
+                y=x.copy()
+                y[i]+=si*h[i]
+                y[j]+=sj*h[j]
+                return f(y)
+            hess[i,j]=(shifted(1,1)-shifted(1,-1)-shifted(-1,1)+shifted(-1,-1))/(4*h[i]*h[j])
+            hess[j,i]=hess[i,j]
+    return hess
+
+def _numerical_gradient(f,x,lower,rel_step=1e-5):
+    '''
+    Gradient of a scalar function by central differences, evaluated just inside
+    the lower bounds of its arguments if it is at one of them.
+    '''
+    h=rel_step*np.maximum(np.abs(x),1e-2)
+    x=np.maximum(x,np.asarray(lower)+h)
+    grad=np.zeros(len(x))
+    for i in range(len(x)):
+        step=np.zeros(len(x))
+        step[i]=h[i]
+        grad[i]=(f(x+step)-f(x-step))/(2*h[i])
+    return grad
+
+def observed_information(data,model,mle):
+    '''
+    Calculate the observed information matrix, the negative Hessian of the log
+    likelihood, of a model at its maximum likelihood estimates. The Hessian of
+    the beta-Poisson likelihood is exact, and those of the other models are
+    taken by central differences.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+        model : str
+            name of the model, as in mle_dict
+        mle : float or list
+            maximum likelihood estimates of the parameters of the model, as in
+            mle_dict
+
+    Returns
+    -------
+        information : array
+            observed information matrix, with rows and columns in the order of
+            the parameters in mle_dict
+    '''
+    hist=count_histogram(data)
+    mle=np.atleast_1d(np.asarray(mle,dtype=float))
+    if model=='beta-Poisson':
+        return -beta_poisson_loglh_derivatives(hist,*mle,hessian=True)[2]
+    lower=[bound[0] for bound in _profile_model(model,hist,mle)[2]]
+    return -_numerical_hessian(lambda params:_profile_model(model,hist,params)[0],mle,lower)
+
+def generate_information_dict(data,mle_dict):
+    '''
+    Calculate the observed information matrix of each model at its maximum
+    likelihood estimates, see observed_information.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+        mle_dict : dictionary
+            dictionary containing maximum likelihood estimates of parameters for
+            each model, outputted by generate_mle_dict
+
+    Returns
+    -------
+        information_dict : dictionary
+            dictionary containing the observed information matrix of each model
+    '''
+    hist=count_histogram(data)
+    return {model:observed_information(hist,model,mle) for model,mle in mle_dict.items()}
+
+def _derived_quantities(model,params,superspread_bd):
+    '''
+    Variance, overdispersion, proportion of superspreaders, P[0] and extinction
+    probability of a model as functions of its parameters alone, in the
+    layout of mle_dict, as used by the delta method.
+    '''
+    if model=='poisson':
+        lmbd=params[0]
+        var=lmbd
+        superspread=superspread_prop(model,superspread_bd,params)
+        extinction=poisson_extinction_prob(lmbd)
+    elif model=='geometric':
+        lmbd=params[0]
+        var=lmbd*(1+lmbd)
+        superspread=superspread_prop(model,superspread_bd,params)
+        extinction=geom_extinction_prob(lmbd)
+    elif model=='negative binomial':
+        lmbd,theta=params
+        var=lmbd*(1+theta)
+        superspread=superspread_prop(model,superspread_bd,params)
+        extinction=neg_bin_extinction_prob(lmbd,theta)
+    elif model=='zip':
+        lmbd,sigma=params
+        var=lmbd*(1-sigma)*(1+lmbd*sigma)
+        superspread=superspread_prop(model,superspread_bd,params)
+        extinction=zip_extinction_prob(lmbd,sigma)
+        lmbd=lmbd*(1-sigma)
+    elif model=='beta-Poisson':
+        lmbd,phi,nu=params
+        var=lmbd*(1+(1-lmbd*nu)/(phi+nu))
+        superspread=superspread_prop(model,superspread_bd,params)
+        if nu<1e-4:
+            extinction=neg_bin_extinction_prob(lmbd,1/phi)
+        else:
+            extinction=beta_poisson_extinction_prob(lmbd,phi,1/nu)
+    else:
+        raise ValueError('Unknown model {0}'.format(model))
+    return {'var':var,
+            'od':(var-lmbd)/lmbd,
+            'superspread':superspread,
+            'p0':dist_pmf(model,0,params),
+            'extinction':extinction}
+
+def generate_wald_ci_dicts(data,mle_dict,confidence_level=95):
+    '''
+    Calculate Wald confidence intervals for the parameters of each model from
+    its observed information matrix, and delta method confidence intervals for
+    the variance, overdispersion, proportion of superspreaders, P[0] and
+    extinction probability of each model, with the gradients of these taken by
+    central differences. Intervals are cut off at the natural bounds of the
+    quantities they cover, such as zero for rates and shapes, one for sigma and
+    probabilities and 1/lambda for nu, rather than at the bounds of the
+    optimizer, and their endpoints are floats. A beta-Poisson fit with nu<1e-4
+    lies on the boundary nu=0 of its parameter space, where the Wald interval
+    for nu is not defined and is returned as [nan,nan]. Nu is then held at zero,
+    and the other intervals come from the information for lambda and Phi
+    alone, which is that of the negative binomial limit. A ZIP fit on its
+    boundary sigma=0 is treated the same way, with sigma held at zero and the
+    other intervals those of the Poisson limit.
+
+    Parameters
+    ----------
+        data : list or tuple
+            sample dataset or count histogram
+        mle_dict : dictionary
+            dictionary containing maximum likelihood estimates of parameters for
+            each model, outputted by generate_mle_dict
+        confidence_level : float
+            confidence level of the intervals as a percentage
+
+    Returns
+    -------
+        ci_dict : dictionary
+            confidence intervals for the parameters of each model, laid out as
+            mle_dict
+        var_ci_dict : dictionary
+            confidence interval for the variance of each model
+        od_ci_dict : dictionary
+            confidence interval for the overdispersion of each model other than
+            the Poisson
+        superspread_ci_dict : dictionary
+            confidence interval for the proportion of superspreaders of each
+            model
+        p0_ci_dict : dictionary
+            confidence interval for P[0] of each model
+        extinction_ci_dict : dictionary
+            confidence interval for the extinction probability of each model
+    '''
+    hist=count_histogram(data)
+    superspread_bd=int(dist_ppf('poisson',.99,histogram_mean(hist)))
+    z=stats.norm.ppf(0.5+confidence_level/200)
+    ci_dict={}
+    derived_ci_dicts={name:{} for name in ['var','od','superspread','p0','extinction']}
+    derived_bounds={'var':(0.0,np.inf),'od':(0.0,np.inf),'superspread':(0.0,1.0),'p0':(0.0,1.0),'extinction':(0.0,1.0)}
+    for model,mle in mle_dict.items():
+        params=np.atleast_1d(np.asarray(mle,dtype=float))
+        lower=[bound[0] for bound in _profile_model(model,hist,params)[2]]
+        information=observed_information(hist,model,params)
+        free=np.ones(len(params),dtype=bool)
+        if model=='beta-Poisson' and params[2]<1e-4:
+            free[2]=False
+        if model=='zip' and params[1]<=0:
+            free[1]=False
+        cov=np.zeros((len(params),len(params)))
+        cov[np.ix_(free,free)]=np.linalg.inv(information[np.ix_(free,free)])
+        se=np.sqrt(np.diag(cov))
+        cis=[[float(max(p-z*e,b[0])),float(min(p+z*e,b[1]))] if f else [np.nan,np.nan]
+             for p,e,b,f in zip(params,se,_natural_bounds(model,params),free)]
+        ci_dict[model]=cis[0] if np.ndim(mle)==0 else cis
+        derived=_derived_quantities(model,params,superspread_bd)
+        for name,value in derived.items():
+            if name=='od' and model=='poisson':
+                continue
+            grad=_numerical_gradient(lambda x:_derived_quantities(model,x,superspread_bd)[name],params,lower)
+            e=np.sqrt(grad@cov@grad)
+            derived_ci_dicts[name][model]=[float(max(value-z*e,derived_bounds[name][0])),
+                                           float(min(value+z*e,derived_bounds[name][1]))]
+    return (ci_dict,
+            derived_ci_dicts['var'],
+            derived_ci_dicts['od'],
+            derived_ci_dicts['superspread'],
+            derived_ci_dicts['p0'],
+            derived_ci_dicts['extinction'])
+
+def highest_density_region(weights,mass=0.95,axes=None,cells=None):
+    '''
+    Find the highest density region of a distribution given by weights over a
+    grid or histogram of any dimension, the smallest set of cells holding at
+    least the given share of the total weight. The weights are sorted once and
+    the threshold read off their cumulative sum, and every cell whose weight
+    reaches the threshold is in the region, so that tied cells are kept or
+    dropped together. The weights can be given over a dense grid, or only over
+    the occupied cells of a sparse one, as produced by sparse_histogram.
+
+    Parameters
+    ----------
+        weights : array
+            non-negative weights over the grid, which need not be normalised
+        mass : float
+            share of the total weight the region must hold
+        axes : list
+            coordinates of the grid points along each axis, if None the bounds
+            are given as indices
+        cells : array
+            integer coordinates of the cell of each weight, one row per
+            weight, if the weights are given over a sparse grid
+
+    Returns
+    -------
+        region : array
+            boolean mask of the cells in the region
+        bounds : list
+            lower and upper bounds of the region along each axis
+    '''
+    weights=np.asarray(weights,dtype=float)
+    ordered=np.sort(weights.ravel())[::-1]
+    cumulative=np.cumsum(ordered)
+    cutoff=min(np.searchsorted(cumulative,mass*cumulative[-1]),len(ordered)-1)
+    region=weights>=ordered[cutoff]
+    if cells is None:
+        occupied=[np.nonzero(np.any(region,axis=tuple(a for a in range(weights.ndim) if a!=axis)))[0]
+                  for axis in range(weights.ndim)]
+    else:
+        occupied=[np.sort(cells[region,axis]) for axis in range(cells.shape[1])]
+    bounds=[]
+    for axis,indices in enumerate(occupied):
+        if axes is None:
+            bounds.append([indices[0],indices[-1]])
+        else:
+            bounds.append([axes[axis][indices[0]],axes[axis][indices[-1]]])
+    return region,bounds
+
+def sparse_histogram(samples,bin_widths):
+    '''
+    Bin a set of samples in any number of dimensions, storing only the
+    occupied cells, so that memory grows with the number of samples rather
+    than the volume of their bounding box. The cell of a sample has integer
+    coordinates floor(x/w) along each axis, so that cell i spans [iw,(i+1)w).
+
+    Parameters
+    ----------
+        samples : array
+            samples to bin, one row per sample
+        bin_widths : array
+            width of the bins along each axis
+
+    Returns
+    -------
+        cells : array
+            integer coordinates of the occupied cells, one row per cell
+        counts : array
+            number of samples in each occupied cell
+    '''
+    coordinates=np.floor(np.asarray(samples)/np.asarray(bin_widths)).astype(np.int64)
+    cells,counts=np.unique(coordinates,axis=0,return_counts=True)
+    return cells,counts
+
+def scott_bin_widths(samples):
+    '''
+    Choose histogram bin widths for a set of samples in d dimensions by
+    Scott's rule, sigma n^(-1/(d+4)) along each axis, where sigma is the
+    standard deviation of the samples along that axis. Axes along which the
+    samples do not vary are given bins of width 0.01.
+    '''
+    no_samples,dimension=np.shape(samples)
+    widths=np.std(samples,axis=0)*no_samples**(-1/(dimension+4))
+    return np.where(widths>0,widths,0.01)
+
 def poisson_mle_grid(data, interval, points):
     '''
     Calculate a confidence interval for the MLE of the Poisson distribution
@@ -847,19 +3187,10 @@ def poisson_mle_grid(data, interval, points):
             95% confidence interval for lambda given data
     '''
     lmbd=np.linspace(interval[0],interval[1],points)
-    llh=np.zeros(points)
-    for x in data:
-        llh=llh+np.log(stats.poisson.pmf(x,lmbd))
+    llh=poisson_loglh(data,lmbd)
     mle_loc=np.argmax(llh)
     mle=lmbd[mle_loc]
-    lh_normed=np.exp(llh)/np.sum(np.exp(llh))
-    current_max=lh_normed[mle_loc]
-    interval_weight=current_max
-    while interval_weight<0.95:
-        max_loc=np.argmax(lh_normed[np.where(lh_normed<current_max)])
-        current_max=lh_normed[np.where(lh_normed<current_max)][max_loc]
-        interval_weight+=current_max
-    ci=[np.min(lmbd[np.where(lh_normed>=current_max)[0]]),np.max(lmbd[np.where(lh_normed>=current_max)[0]])]
+    ci=highest_density_region(np.exp(llh-llh[mle_loc]),0.95,[lmbd])[1][0]
     return lmbd,llh,mle,ci
 
 def geometric_mle_grid(data,interval,points):
@@ -888,19 +3219,10 @@ def geometric_mle_grid(data,interval,points):
             95% confidence interval for lambda given data
     '''
     lmbd=np.linspace(interval[0],interval[1],points)
-    llh=np.zeros(points)
-    for x in data:
-        llh=llh+np.log(stats.geom.pmf(x,1/(lmbd+1),-1))
+    llh=geo_loglh(data,lmbd)
     mle_loc=np.argmax(llh)
     mle=lmbd[mle_loc]
-    lh_normed=np.exp(llh)/np.sum(np.exp(llh))
-    current_max=lh_normed[mle_loc]
-    interval_weight=current_max
-    while interval_weight<0.95:
-        max_loc=np.argmax(lh_normed[np.where(lh_normed<current_max)])
-        current_max=lh_normed[np.where(lh_normed<current_max)][max_loc]
-        interval_weight+=current_max
-    ci=[np.min(lmbd[np.where(lh_normed>=current_max)[0]]),np.max(lmbd[np.where(lh_normed>=current_max)[0]])]
+    ci=highest_density_region(np.exp(llh-llh[mle_loc]),0.95,[lmbd])[1][0]
     return lmbd,llh,mle,ci
 
 def zip_mle_grid(data,lmbd_interval,sigma_interval,lmbd_points,sigma_points):
@@ -941,25 +3263,242 @@ def zip_mle_grid(data,lmbd_interval,sigma_interval,lmbd_points,sigma_points):
     sigma=np.linspace(sigma_interval[0],sigma_interval[1],sigma_points)
 
     lmbdgrid,sigmagrid=np.meshgrid(lmbd,sigma)
-    llh=np.zeros(lmbdgrid.shape)
-    for x in data:
-        llh=llh+zip_loglh(x,lmbdgrid,sigmagrid)
+    llh=zip_loglh(data,lmbdgrid,sigmagrid)
     mle_loc=np.unravel_index(np.argmax(llh),llh.shape)
     lmbdmle=lmbdgrid[mle_loc]
     sigmamle=sigmagrid[mle_loc]
-    lh_normed=np.exp(llh)/np.sum(np.exp(llh))
-    current_max=lh_normed[mle_loc]
-    interval_weight=current_max
-    while interval_weight<0.95:
-        max_loc=np.unravel_index(np.argmax(lh_normed),lh_normed.shape)
-        current_max=lh_normed[max_loc]
-        lh_normed[max_loc]=0
-        interval_weight+=current_max
-    lh_normed=np.exp(llh)/np.sum(np.exp(llh))
-    lmbdci=[np.min(lmbdgrid[np.where(lh_normed>=current_max)]),np.max(lmbdgrid[np.where(lh_normed>=current_max)])]
-    sigmaci=[np.min(sigmagrid[np.where(lh_normed>=current_max)]),np.max(sigmagrid[np.where(lh_normed>=current_max)])]
+    # The meshgrid runs over sigma along the first axis and lambda along the
+    # second
+    sigmaci,lmbdci=highest_density_region(np.exp(llh-llh[mle_loc]),0.95,[sigma,lmbd])[1]
     return lmbdgrid,sigmagrid,llh,lmbdmle,sigmamle,lmbdci,sigmaci
 
+QUANTILE_SKETCH_COMPRESSION=1000
+
+def _compress_centroids(means,weights,exact,compression):
+    '''
+    Merge centroids of a quantile sketch, which must be sorted by mean. Tied
+    centroids are first combined, and the result stays exact, then those whose
+    centres fall in the same unit interval of the t-digest scale function
+    k(q)=compression/(2 pi) arcsin(2q-1) become one, unless either already
+    spans a whole unit of it. The scale function is steepest in the tails,
+    where the centroids are kept smallest.
+    '''
+    ties=np.concatenate(([0],np.nonzero(np.diff(means))[0]+1))
+    means=means[ties]
+    weights=np.add.reduceat(weights,ties)
+    exact=np.logical_and.reduceat(exact,ties)
+    total=np.sum(weights)
+    def scale(q):
+        return compression/(2*np.pi)*np.arcsin(np.clip(2*q-1,-1,1))
+    upper=np.cumsum(weights)
+    heavy=scale(upper/total)-scale((upper-weights)/total)>=1
+    k=np.floor(scale((upper-weights/2)/total))
+    new_group=np.diff(k)!=0
+    new_group|=heavy[1:]|heavy[:-1]
+    starts=np.concatenate(([0],np.nonzero(new_group)[0]+1))
+    merged_weights=np.add.reduceat(weights,starts)
+    merged_means=np.add.reduceat(weights*means,starts)/merged_weights
+    # Centroids left on their own keep their exact value
+    single=np.diff(np.append(starts,len(means)))==1
+    merged_means[single]=means[starts[single]]
+    merged_exact=single&exact[starts]
+    return merged_means,merged_weights,merged_exact
+
+def quantile_sketch(samples,compression=QUANTILE_SKETCH_COMPRESSION):
+    '''
+    Summarise a set of samples by a mergeable quantile sketch, a merging
+    t-digest, which holds a bounded number of weighted centroids however many
+    samples it summarises, and whose centroids are smallest, and so its
+    quantiles most accurate, in the tails. Tied samples are kept together as
+    an exact centroid. Sketches of separate sets of samples can be combined
+    with merge_quantile_sketches, and quantiles read off with sketch_quantile.
+    Non-finite samples are ignored.
+
+    Parameters
+    ----------
+        samples : array
+            set of samples to summarise
+        compression : float
+            compression parameter of the t-digest, roughly twice the number of
+            centroids kept
+
+    Returns
+    -------
+        sketch : tuple
+            means and weights of the centroids, sorted by mean, which of them
+            hold only tied samples, and the smallest and largest samples
+    '''
+    samples=np.sort(np.asarray(samples,dtype=float).ravel())
+    samples=samples[np.isfinite(samples)]
+    if len(samples)==0:
+        return np.zeros(0),np.zeros(0),np.zeros(0,dtype=bool),np.inf,-np.inf
+    means,weights,exact=_compress_centroids(samples,
+                                            np.ones(len(samples)),
+                                            np.ones(len(samples),dtype=bool),
+                                            compression)
+    return means,weights,exact,samples[0],samples[-1]
+
+def merge_quantile_sketches(sketches,compression=QUANTILE_SKETCH_COMPRESSION):
+    '''
+    Merge quantile sketches, as produced by quantile_sketch, into a single
+    sketch of all the samples they summarise. Entries which are None are
+    skipped, so that a running sketch can start from None.
+
+    Parameters
+    ----------
+        sketches : list
+            quantile sketches to merge
+        compression : float
+            compression parameter of the merged sketch
+
+    Returns
+    -------
+        sketch : tuple
+            merged quantile sketch
+    '''
+    sketches=[sketch for sketch in sketches if sketch is not None]
+    means=np.concatenate([sketch[0] for sketch in sketches])
+    weights=np.concatenate([sketch[1] for sketch in sketches])
+    exact=np.concatenate([sketch[2] for sketch in sketches])
+    minimum=min(sketch[3] for sketch in sketches)
+    maximum=max(sketch[4] for sketch in sketches)
+    if len(means)==0:
+        return means,weights,exact,minimum,maximum
+    order=np.argsort(means,kind='stable')
+    means,weights,exact=_compress_centroids(means[order],weights[order],
+                                            exact[order],compression)
+    return means,weights,exact,minimum,maximum
+
+def sketch_quantile(sketch,q):
+    '''
+    Estimate quantiles of the samples summarised by a quantile sketch. Each
+    centroid is placed at the rank of its centre, or across all the ranks it
+    holds if its samples are tied, and the quantiles are interpolated linearly
+    between them and the smallest and largest samples. This reproduces the
+    linear interpolation of np.percentile exactly while every centroid holds
+    only tied samples.
+
+    Parameters
+    ----------
+        sketch : tuple
+            quantile sketch, as produced by quantile_sketch
+        q : float or array
+            quantile(s) to estimate, between 0 and 1
+
+    Returns
+    -------
+        quantiles : float or array
+            estimated quantiles
+    '''
+    if len(sketch[0])==0:
+        return np.full(np.shape(q),np.nan)[()]
+    no_samples=np.sum(sketch[1])
+    ranks,anchors=_sketch_anchors(sketch)
+    return np.interp(np.asarray(q)*(no_samples-1),ranks,anchors)[()]
+
+def _sketch_anchors(sketch):
+    '''
+    Ranks and values between which the quantiles of a quantile sketch are
+    interpolated, both non-decreasing.
+    '''
+    means,weights,exact,minimum,maximum=sketch
+    no_samples=np.sum(weights)
+    upper=np.cumsum(weights)
+    centres=upper-weights/2-0.5
+    ranks=np.column_stack((np.where(exact,upper-weights,centres),
+                           np.where(exact,upper-1,centres))).ravel()
+    return (np.concatenate(([0],ranks,[no_samples-1])),
+            np.concatenate(([minimum],np.repeat(means,2),[maximum])))
+
+# Samples this close to a value are counted as equal to it, so that fits to
+# the same data by different solvers compare as equal
+TIE_RTOL=1e-9
+TIE_ATOL=1e-12
+
+def sketch_cdf(sketch,x):
+    '''
+    Estimate the fraction of the samples summarised by a quantile sketch which
+    lie below a value, counting samples equal to it, up to TIE_RTOL, as half
+    below, by inverting the interpolation of sketch_quantile.
+
+    Parameters
+    ----------
+        sketch : tuple
+            quantile sketch, as produced by quantile_sketch
+        x : float
+            value to compare the samples to
+
+    Returns
+    -------
+        : float
+            estimated fraction of the samples below x
+    '''
+    if len(sketch[0])==0:
+        return np.nan
+    no_samples=np.sum(sketch[1])
+    ranks,anchors=_sketch_anchors(sketch)
+    if x<anchors[0]:
+        return 0.0
+    if x>anchors[-1]:
+        return 1.0
+    tol=TIE_RTOL*abs(x)+TIE_ATOL
+    left=np.searchsorted(anchors,x-tol,side='left')
+    right=np.searchsorted(anchors,x+tol,side='right')
+    if left<right:
+        # x is one of the anchors, or a run of tied ones
+        rank=(ranks[left]+ranks[right-1])/2
+    else:
+        rank=ranks[left-1]+(ranks[left]-ranks[left-1])*(x-anchors[left-1])/(anchors[left]-anchors[left-1])
+    return (rank+0.5)/no_samples
+
+def bootstrap_percentile(samples, percent):
+    '''
+    Calculate a percentile of a set of bootstrap samples, or estimate it from
+    a quantile sketch of them.
+
+    Parameters
+    ----------
+        samples : array or tuple
+            set of samples of parameter generated by bootstrapping, or a
+            quantile sketch of them
+        percent : float
+            percentile to calculate
+
+    Returns
+    -------
+        percentile : float
+            percentile of the samples
+    '''
+    if isinstance(samples, tuple):
+        return sketch_quantile(samples, percent / 100)
+    return np.percentile(samples, percent)
+
+def bootstrap_fraction_below(samples, value):
+    '''
+    Calculate the fraction of a set of bootstrap samples which lie below a
+    value, with samples equal to it, up to TIE_RTOL, counted as half below, or
+    estimate it from a quantile sketch of them.
+
+    Parameters
+    ----------
+        samples : array or tuple
+            set of samples of parameter generated by bootstrapping, or a
+            quantile sketch of them
+        value : float
+            value to compare the samples to
+
+    Returns
+    -------
+        fraction : float
+            fraction of the samples below value
+    '''
+    if isinstance(samples, tuple):
+        return sketch_cdf(samples, value)
+    samples = np.asarray(samples)
+    samples = samples[np.isfinite(samples)]
+    equal = np.abs(samples - value) <= TIE_RTOL * abs(value) + TIE_ATOL
+    return (np.sum((samples < value) & ~equal) + np.sum(equal) / 2) / len(samples)
+
 def rp_ci_from_bootstrap_samples(samples, mle, confidence_level):
     '''
     Calculate reverse percentile confidence intervals from a set of bootstrap
@@ -967,8 +3506,9 @@ def rp_ci_from_bootstrap_samples(samples, mle, confidence_level):
 
     Parameters
     ----------
-        samples : array
-            set of samples of parameter generated by bootstrapping
+        samples : array or tuple
+            set of samples of parameter generated by bootstrapping, or a
+            quantile sketch of them
         mle : float
             maximum likelikelihood estimate of parameter
         confidence_level : float
@@ -982,8 +3522,8 @@ def rp_ci_from_bootstrap_samples(samples, mle, confidence_level):
 
     alpha = 100 - confidence_level
 
-    ci=[2 * mle - np.percentile(samples, 100 - alpha/2),
-        2 * mle - np.percentile(samples, alpha/2)]
+    ci=[2 * mle - bootstrap_percentile(samples, 100 - alpha/2),
+        2 * mle - bootstrap_percentile(samples, alpha/2)]
 
     return ci
 
@@ -993,8 +3533,9 @@ def ci_from_bootstrap_samples(samples, mle, confidence_level):
 
     Parameters
     ----------
-        samples : array
-            set of samples of parameter generated by bootstrapping
+        samples : array or tuple
+            set of samples of parameter generated by bootstrapping, or a
+            quantile sketch of them
         mle : float
             maximum likelikelihood estimate of parameter
         confidence_level : float
@@ -1008,11 +3549,134 @@ def ci_from_bootstrap_samples(samples, mle, confidence_level):
 
     alpha = 100 - confidence_level
 
-    ci=[np.percentile(samples, alpha/2),
-        np.percentile(samples, 100 - alpha/2)]
+    ci=[bootstrap_percentile(samples, alpha/2),
+        bootstrap_percentile(samples, 100 - alpha/2)]
 
     return ci
 
+def jackknife_acceleration(estimates, multiplicities):
+    '''
+    Calculate the acceleration of a BCa bootstrap interval from jackknife
+    estimates of a parameter. With count data each estimate can stand for
+    several leave-one-out datasets, see jackknife_count_matrix, and is weighted
+    by their number. Estimates which are not finite, for instance from fits
+    which failed, are left out.
+
+    Parameters
+    ----------
+        estimates : array
+            estimate of parameter from each distinct leave-one-out dataset
+        multiplicities : array
+            number of leave-one-out datasets each estimate stands for
+
+    Returns
+    -------
+        acceleration : float
+            acceleration of the BCa interval
+    '''
+
+    finite = np.isfinite(estimates)
+    estimates = np.asarray(estimates)[finite]
+    multiplicities = np.asarray(multiplicities)[finite]
+    deviations = (np.sum(multiplicities * estimates) / np.sum(multiplicities)
+                  - estimates)
+    scale = np.sum(multiplicities * deviations**2)
+    if scale == 0:
+        return 0.0
+    return np.sum(multiplicities * deviations**3) / (6 * scale**1.5)
+
+def bca_ci_from_bootstrap_samples(samples, mle, confidence_level, acceleration):
+    '''
+    Calculate bias-corrected and accelerated (BCa) confidence intervals from a
+    set of bootstrap samples. The percentiles of the samples used as endpoints
+    are shifted by the bias correction, the normal quantile of the fraction of
+    the samples below the MLE, and by the acceleration, which accounts for the
+    spread of the estimates changing with the parameter.
+
+    Parameters
+    ----------
+        samples : array or tuple
+            set of samples of parameter generated by bootstrapping, or a
+            quantile sketch of them
+        mle : float
+            maximum likelikelihood estimate of parameter
+        confidence_level : float
+            confidence level to calculate interval for as a percentage
+        acceleration : float
+            acceleration, as calculated by jackknife_acceleration
+
+    Returns
+    -------
+        ci : list
+            confidence interval
+    '''
+
+    alpha = 100 - confidence_level
+
+    # The fraction below the MLE is kept off 0 and 1 so that the bias
+    # correction stays finite
+    no_samples = (np.sum(samples[1]) if isinstance(samples, tuple)
+                  else np.sum(np.isfinite(samples)))
+    fraction = np.clip(bootstrap_fraction_below(samples, mle),
+                       0.5 / no_samples, 1 - 0.5 / no_samples)
+    bias = stats.norm.ppf(fraction)
+
+    ci = []
+    for percent in [alpha/2, 100 - alpha/2]:
+        z = bias + stats.norm.ppf(percent / 100)
+        adjusted = stats.norm.cdf(bias + z / (1 - acceleration * z))
+        ci.append(bootstrap_percentile(samples, 100 * adjusted))
+
+    return ci
+
+def ci_monte_carlo_error(samples, confidence_level, error_level=95):
+    '''
+    Estimate the Monte Carlo error in the endpoints of a confidence interval
+    calculated from a set of bootstrap samples by ci_from_bootstrap_samples,
+    that is, how far they could move if the bootstrap were repeated with the
+    same number of samples. Each endpoint is a sample quantile, and the rank
+    of the samples falling below the true quantile q is binomial, so the
+    order statistics at ranks Bq -/+ z sqrt(Bq(1-q)) bound a distribution
+    free error_level% confidence interval for it. The error is half the width
+    of that interval.
+
+    Parameters
+    ----------
+        samples : array or tuple
+            set of samples of parameter generated by bootstrapping, or a
+            quantile sketch of them
+        confidence_level : float
+            confidence level of the interval as a percentage
+        error_level : float
+            confidence level as a percentage at which the error is bounded
+
+    Returns
+    -------
+        errors : array
+            Monte Carlo errors of the lower and upper endpoints
+    '''
+
+    if isinstance(samples, tuple):
+        no_samples = np.sum(samples[1])
+        def order_statistic(rank):
+            return sketch_quantile(samples, rank / max(no_samples - 1, 1))
+    else:
+        samples = np.sort(samples)
+        no_samples = len(samples)
+        def order_statistic(rank):
+            return samples[int(rank)]
+    alpha = 100 - confidence_level
+    z = stats.norm.ppf(0.5 + error_level / 200)
+
+    errors = np.zeros(2)
+    for i, q in enumerate([alpha / 200, 1 - alpha / 200]):
+        half_width = z * np.sqrt(no_samples * q * (1 - q))
+        lower = np.clip(np.floor(no_samples * q - half_width), 0, no_samples - 1)
+        upper = np.clip(np.ceil(no_samples * q + half_width), 0, no_samples - 1)
+        errors[i] = (order_statistic(upper) - order_statistic(lower)) / 2
+
+    return errors
+
 def neg_bin_bootstrap(data,no_samples,theta_0):
     '''
     Calculate confidence intervals for negative binomial parameter MLEs using
@@ -1056,19 +3720,21 @@ def neg_bin_bootstrap(data,no_samples,theta_0):
     sample_size=np.size(data)
 
     lmbd_mle=np.mean(data)
-    theta_mle=get_theta_mle(data,theta_0)
+    theta_mle=solve_theta_mle(data,theta_0)
     var_mle=lmbd_mle*(1+theta_mle)
-    lmbd_samples=np.zeros(no_samples)
-    theta_samples=np.zeros(no_samples)
     print('Now calculating',no_samples,'bootstrap samples.')
     start_time=time.time()
 
-    for i in range(no_samples):
-        data_now=random.choices(data,k=sample_size)
-        lmbd_samples[i]=np.mean(data_now)
-        theta_samples[i]=get_theta_mle(data_now,theta_0)
-        if ((i+1)%100)==0:
-            print('Sample',i+1,'of',no_samples,'completed.',time.time()-start_time,'seconds elapsed, approximately',(no_samples-i-1)*(time.time()-start_time)/(i+1),'remaining.')
+    values,count_matrix=bootstrap_count_matrix(data,no_samples,positive_mean=False)
+    lmbd_samples=count_matrix@values/sample_size
+    # Duplicate replicates are fitted once
+    unique_counts,inverse=np.unique(count_matrix,axis=0,return_inverse=True)
+    no_unique=len(unique_counts)
+    print(no_unique,'distinct replicates to fit,',no_samples-no_unique,'fits saved.')
+    # All replicates are fitted together
+    theta_unique=batch_solve_theta_mles(values,unique_counts,theta_0)
+    print(no_unique,'fits completed in',time.time()-start_time,'seconds.')
+    theta_samples=theta_unique[inverse.ravel()]
 
     var_samples=np.multiply(lmbd_samples,(1+theta_samples))
 
@@ -1078,10 +3744,11 @@ def neg_bin_bootstrap(data,no_samples,theta_0):
 
     return lmbd_mle,lmbd_ci,lmbd_samples,theta_mle,theta_ci,theta_samples,var_mle,var_ci,var_samples
 
-def beta_poisson_bootstrap(data,no_samples,phi_0,nu_0):
+def beta_poisson_bootstrap(data,no_samples,phi_0,nu_0,bin_widths=0.01):
     '''
     Calculate confidence intervals for beta-Poisson parameter MLEs using
-    bootstrapping.
+    bootstrapping. The intervals are the bounds of the 95% highest density
+    region of a histogram of the samples, which only stores occupied bins.
 
     Parameters
     ----------
@@ -1093,6 +3760,10 @@ def beta_poisson_bootstrap(data,no_samples,phi_0,nu_0):
             starting value of Phi to use in MLE calculations
         nu_0 : float
             starting value of N to use in MLE calculations
+        bin_widths : float, list or str
+            width of the histogram bins along all axes, or along the lambda,
+            phi and nu axes in turn, or 'scott' to choose them from the
+            samples by Scott's rule
 
     Returns
     -------
@@ -1125,57 +3796,29 @@ def beta_poisson_bootstrap(data,no_samples,phi_0,nu_0):
     lmbd_mle=np.mean(data)
     phi_mle,nu_mle=get_phi_and_N_mles(data,phi_0,nu_0)
     var_mle=lmbd_mle*(1+(1-lmbd_mle*nu_mle)/(phi_mle+nu_mle))
-    lmbd_samples=np.zeros(no_samples)
-    phi_samples=np.zeros(no_samples)
-    nu_samples=np.zeros(no_samples)
     print('Now calculating',no_samples,'bootstrap samples.')
     start_time=time.time()
 
-    for i in range(no_samples):
-        data_now=random.choices(data,k=sample_size)
-        lmbd_samples[i]=np.mean(data_now)
-        phi_samples[i],nu_samples[i]=get_phi_and_N_mles(data_now,phi_0,nu_0)
-        if ((i+1)%100)==0:
-            print('Sample',i+1,'of',no_samples,'completed.',time.time()-start_time,'seconds elapsed, approximately',(no_samples-i-1)*(time.time()-start_time)/(i+1),'remaining.')
-
-    sample_array=np.zeros((no_samples,3))
-    sample_array[:,1]=lmbd_samples # np.histogram does things in a slightly unintuitive order - this makes it come out right
-    sample_array[:,0]=phi_samples
-    sample_array[:,2]=nu_samples
-
-    lmbd_grid_length=int(100*np.max(lmbd_samples))+1
-    lmbd_max_rdd=0.01*(lmbd_grid_length-1)
-    phi_grid_length=int(100*np.max(phi_samples))+1
-    phi_max_rdd=0.01*(phi_grid_length-1)
-    nu_grid_length=int(100*np.max(nu_samples))+1
-    nu_max_rdd=0.01*(nu_grid_length-1)
-
-    H,edges=np.histogramdd(sample_array,
-            bins=(np.linspace(0,lmbd_max_rdd,lmbd_grid_length),
-                  np.linspace(0,phi_max_rdd,phi_grid_length),
-                  np.linspace(0,nu_max_rdd,nu_grid_length)))
-    H_normed=H/np.sum(H)
-    mle_loc=np.unravel_index(np.argmax(H_normed),H_normed.shape)
-    current_max=H_normed[mle_loc]
-    H_normed[mle_loc]==0
-    interval_weight=current_max
-    print('Now calculating 95% confidence interval.')
-    start_time=time.time()
-    next_marker=0.1
-    while interval_weight<0.95:
-        max_loc=np.unravel_index(np.argmax(H_normed),H_normed.shape)
-        current_max=H_normed[max_loc]
-        H_normed[max_loc]=0
-        interval_weight+=current_max
-        if interval_weight>next_marker:
-            next_marker=np.around(interval_weight,decimals=1)
-            if next_marker<interval_weight:
-                next_marker+=0.1
-            print('Surpassed',next_marker-0.1,'at time',time.time()-start_time,'.')
-    H_normed=H/np.sum(H)
-    lmbdgrid,phigrid,nugrid=np.meshgrid(edges[0],edges[1],edges[2])
-    lmbd_ci=[np.min(lmbdgrid[np.where(H_normed>=current_max)]),np.max(lmbdgrid[np.where(H_normed>=current_max)])]
-    phi_ci=[np.min(phigrid[np.where(H_normed>=current_max)]),np.max(phigrid[np.where(H_normed>=current_max)])]
-    nu_ci=[np.min(nugrid[np.where(H_normed>=current_max)]),np.max(nugrid[np.where(H_normed>=current_max)])]
+    values,count_matrix=bootstrap_count_matrix(data,no_samples,positive_mean=False)
+    lmbd_samples=count_matrix@values/sample_size
+    # Duplicate replicates are fitted once
+    unique_counts,inverse=np.unique(count_matrix,axis=0,return_inverse=True)
+    no_unique=len(unique_counts)
+    print(no_unique,'distinct replicates to fit,',no_samples-no_unique,'fits saved.')
+    # All replicates are fitted together
+    phi_unique,nu_unique=batch_phi_and_N_mles(values,unique_counts,phi_0,nu_0)
+    print(no_unique,'fits completed in',time.time()-start_time,'seconds.')
+    phi_samples=phi_unique[inverse.ravel()]
+    nu_samples=nu_unique[inverse.ravel()]
+
+    sample_array=np.column_stack((lmbd_samples,phi_samples,nu_samples))
+
+    if isinstance(bin_widths,str):
+        bin_widths=scott_bin_widths(sample_array)
+    bin_widths=np.broadcast_to(np.asarray(bin_widths,dtype=float),(3,))
+    cells,counts=sparse_histogram(sample_array,bin_widths)
+    # The region is bounded by the outer edges of its outermost bins
+    bounds=highest_density_region(counts,0.95,cells=cells)[1]
+    lmbd_ci,phi_ci,nu_ci=[[lo*width,(hi+1)*width] for (lo,hi),width in zip(bounds,bin_widths)]
 
     return lmbd_mle,lmbd_ci,lmbd_samples,phi_mle,phi_ci,phi_samples,nu_mle,nu_ci,nu_samples
@@ -1,18 +1,33 @@
 from argparse import ArgumentParser
-from numpy import arange, array, mean, percentile, size, var
-from os import mkdir
+from numpy import (arange, array, array_split, atleast_1d, concatenate,
+    count_nonzero, dtype, empty, mean, nan, ndarray, nonzero, savez, size,
+    unique, var, vstack, where, zeros)
+from numpy import load as load_npz
+from numpy.linalg import LinAlgError
+from os import listdir, makedirs, mkdir, replace
 from os.path import isdir, isfile
-from pickle import dump
-from random import choices
-from copy import deepcopy
+from pickle import dump, load
+from sys import exit
 from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from numpy.random import SeedSequence
 from time import time as get_time
+from zlib import crc32
 from datasets import (plague_data, mpox_data, nigeria_ebola_data,
     guinea_ebola_data, singapore_sars_data, sk_mers_data, sa_mers_data, noro_data)
-from functions import (ci_from_bootstrap_samples, generate_llh_dict,
-    generate_mle_dict, generate_p0_dict, generate_superspread_dict, generate_var_dict)
+from functions import (BP_FIT_LLH_TOL, bca_ci_from_bootstrap_samples,
+    beta_poisson_loglh, bootstrap_replicate_counts, ci_from_bootstrap_samples,
+    ci_monte_carlo_error, count_histogram, generate_llh_dict, generate_mle_dict, generate_mle_dicts,
+    generate_p0_dict, generate_profile_ci_dict, generate_superspread_dict,
+    generate_var_dict, generate_wald_ci_dicts, histogram_mean, histogram_var,
+    jackknife_acceleration, jackknife_count_matrix, merge_quantile_sketches,
+    quantile_sketch)
 
 MAX_SAMPLE_ATTEMPTS = 100
+# Intervals narrower than this, relative to the size of their endpoints, are
+# treated as having collapsed onto a single value
+DEGENERATE_CI_WIDTH = 1e-9
+BOOTSTRAP_STORE_DIR = 'outputs/bootstrap'
 
 data_dict = {
     'plague_data' : plague_data,
@@ -32,6 +47,73 @@ if isdir('outputs') is False:
 if isdir('outputs/mles') is False:
     mkdir('outputs/mles')
 
+MODELS = ['poisson', 'geometric', 'negative binomial', 'zip', 'beta-Poisson']
+MODEL_PARAMS = {
+    'poisson' : ['lmbd'],
+    'geometric' : ['lmbd'],
+    'negative binomial' : ['lmbd', 'theta'],
+    'zip' : ['lmbd', 'sigma'],
+    'beta-Poisson' : ['lmbd', 'phi', 'nu']
+    }
+FITTED_MODELS = ['negative binomial', 'beta-Poisson']
+
+# Status of each bootstrap replicate. Replicates whose beta-Poisson fit did not
+# converge are kept, as they were before the status was recorded.
+FIT_OK = 0
+FIT_NOT_CONVERGED = 1
+FIT_FAILED = 2
+
+# Exceptions which the fitters raise on replicates they cannot fit. Each
+# failed record keeps the position in this tuple of the exception which failed
+# it, plus one, in its error field, so that failures can be counted by reason.
+# LinAlgError comes before ValueError, which it subclasses.
+FIT_ERRORS = (LinAlgError, FloatingPointError, ZeroDivisionError, ValueError)
+
+# Each bootstrap replicate is summarised by one record with a field for every
+# model parameter and derived statistic, so that the results of a whole
+# bootstrap are held in a single structured array
+RESULT_DTYPE = dtype(
+    [('status', 'i1'), ('error', 'i1'), ('serial fallback', '?')] +
+    [(model + ' ' + param, 'f8')
+        for model in MODELS for param in MODEL_PARAMS[model]] +
+    [(model + ' ' + stat, 'f8')
+        for stat in ['var', 'superspread', 'p0'] for model in MODELS] +
+    [(model + ' evals', 'i4') for model in FITTED_MODELS])
+
+def result_record(mle_dict, var_dict, superspread_dict, p0_dict, eval_dict,
+                  status=FIT_OK):
+    record = zeros((), dtype=RESULT_DTYPE)
+    record['status'] = status
+    for model in MODELS:
+        for param, value in zip(MODEL_PARAMS[model],
+                                atleast_1d(mle_dict[model])):
+            record[model + ' ' + param] = value
+        record[model + ' var'] = var_dict[model]
+        record[model + ' superspread'] = superspread_dict[model]
+        record[model + ' p0'] = p0_dict[model]
+    for model in FITTED_MODELS:
+        record[model + ' evals'] = eval_dict[model]
+    return record
+
+def failed_records(no_records):
+    records = zeros(no_records, dtype=RESULT_DTYPE)
+    for field in RESULT_DTYPE.names:
+        if RESULT_DTYPE[field].kind == 'f':
+            records[field] = nan
+    records['status'] = FIT_FAILED
+    return records
+
+def fit_error_code(err):
+    # Code kept in the error field of a record which failed with err
+    for code, error_type in enumerate(FIT_ERRORS, start=1):
+        if isinstance(err, error_type):
+            return code
+
+def count_fit_errors(records):
+    # Number of records which failed with each of the FIT_ERRORS, by name
+    return {error_type.__name__ : count_nonzero(records['error'] == code)
+            for code, error_type in enumerate(FIT_ERRORS, start=1)}
+
 class MLECalculator:
     def __init__(self, data_set):
 
@@ -46,6 +128,7 @@ class MLECalculator:
         sigma_0 = 0.5
 
         self.data_set = data_set
+        self.values, self.counts = count_histogram(data_set)
         self.mle_dict = generate_mle_dict(data_set,
                             theta_0,
                             phi_0,
@@ -61,27 +144,62 @@ class MLECalculator:
         self.sample_size = size(data_set)
 
     def __call__(self, p):
-        flag=1
-        n_attempts = 0
-        while flag:
+        try:
+            return self._fit_replicate(p)
+        except FIT_ERRORS as err:
+            record = failed_records(1)[0]
+            record['error'] = fit_error_code(err)
+            return record
+
+    def fit_batch(self, replicate_rows):
+        # Fits a block of replicates together with the batched fitters. If
+        # the batched fit of the block fails, the block is split in two and
+        # each half is fitted as a batch of its own, down to single rows,
+        # which are fitted one at a time. Rows whose batched fit cannot be
+        # summarised are also fitted one at a time, so that a failure only
+        # costs the batched fit of the rows it touches. Rows fitted one at a
+        # time are flagged in their serial fallback field.
+        replicate_rows = array(replicate_rows)
+        try:
+            fits = self._fit_batch(replicate_rows)
+        except FIT_ERRORS:
+            if len(replicate_rows) == 1:
+                return self._fit_serial(replicate_rows)
+            return concatenate([self.fit_batch(rows) for rows
+                                in array_split(replicate_rows, 2)])
+        records = failed_records(len(replicate_rows))
+        for i, (sample_dict, sample_evals, converged) in enumerate(zip(*fits)):
             try:
-                results = self._resample_and_fit(p)
-                flag=0
-                return results
-            except:
-                n_attempts += 1
-                if n_attempts >= MAX_SAMPLE_ATTEMPTS:
-                    print('Failed to generate successful bootstrap sample, returning 0.0 on this attempt.')
-                    return 0.0
-
-    def _resample_and_fit(self, p):
-        sample_flag = 0
-        while sample_flag==0:
-            data_now=choices(self.data_set, k=self.sample_size)
-            sample_mean = mean(data_now)
-            if sample_mean > 0:
-                sample_flag = 1
-        sample_var = var(data_now)
+                records[i] = self._summarise((self.values, replicate_rows[i]),
+                                             sample_dict,
+                                             sample_evals,
+                                             converged)
+            except FIT_ERRORS:
+                records[i] = self._fit_serial(replicate_rows[i:i + 1])[0]
+        return records
+
+    def _fit_serial(self, replicate_rows):
+        records = array([self(p) for p in replicate_rows], dtype=RESULT_DTYPE)
+        records['serial fallback'] = True
+        return records
+
+    def _fit_batch(self, replicate_rows):
+        sample_mean = replicate_rows @ self.values / replicate_rows.sum(axis=1)
+        sample_var = (replicate_rows @ self.values**2 /
+                      replicate_rows.sum(axis=1)) - sample_mean**2
+        theta_0 = where(sample_var > sample_mean,
+                        sample_var / sample_mean - 1,
+                        1e-1)
+        phi_0 = 1 / theta_0
+        N_0 = 2 * sample_mean
+        return generate_mle_dicts(self.values, replicate_rows,
+                                  theta_0, phi_0, 1 / N_0,
+                                  full_output=True)
+
+    def _fit_replicate(self, replicate_counts):
+        data_now = (self.values, replicate_counts)
+        sample_mean = histogram_mean(data_now)
+        sample_var = histogram_var(data_now)
         if sample_var > sample_mean:
             theta_0 = (sample_var / sample_mean) - 1
         else:
@@ -90,36 +208,475 @@ class MLECalculator:
         N_0 = 2 * sample_mean
         zip_lmbd_0 = sample_mean
         sigma_0 = 0.5
-        sample_dict = generate_mle_dict(data_now,
+        sample_dict, sample_evals = generate_mle_dict(data_now,
                               theta_0,
                               phi_0,
                               1 / N_0,
                               zip_lmbd_0,
-                              sigma_0)
+                              sigma_0,
+                              full_output=True)
+        return self._summarise(data_now, sample_dict, sample_evals)
+
+    def _summarise(self, data_now, sample_dict, sample_evals, converged=True):
         sample_vars = generate_var_dict(data_now, sample_dict)
         sample_props = generate_superspread_dict(data_now,
                             sample_dict)
         sample_p0 = generate_p0_dict(data_now, sample_dict)
-        return [sample_dict, sample_vars, sample_props, sample_p0]
+        return result_record(sample_dict, sample_vars, sample_props, sample_p0,
+                             sample_evals,
+                             FIT_OK if converged else FIT_NOT_CONVERGED)
+
+def bootstrap_statistics(samples):
+    # Bootstrap samples of every statistic which a confidence interval is
+    # reported for, by name
+    statistics = {
+        model + ' ' + param : samples[model + ' ' + param]
+        for model in MODELS for param in MODEL_PARAMS[model]}
+    statistics['zip mean'] = samples['zip lmbd'] * (1 - samples['zip sigma'])
+    for stat in ['var', 'superspread', 'p0']:
+        for model in MODELS:
+            statistics[model + ' ' + stat] = samples[model + ' ' + stat]
+    statistics['geometric od'] = (samples['geometric var'] - samples['geometric lmbd']) / samples['geometric lmbd']
+    statistics['negative binomial od'] = samples['negative binomial theta']
+    statistics['zip od'] = (samples['zip var'] - statistics['zip mean']) / statistics['zip mean']
+    statistics['beta-Poisson od'] = (samples['beta-Poisson var'] - samples['beta-Poisson lmbd']) / samples['beta-Poisson lmbd']
+    return statistics
+
+def update_sketches(sketches, records):
+    # Merges the statistics of a batch of records into the running quantile
+    # sketch of each statistic
+    samples = records[records['status'] != FIT_FAILED]
+    for name, values in bootstrap_statistics(samples).items():
+        sketches[name] = merge_quantile_sketches([sketches.get(name),
+                                                  quantile_sketch(values)])
+
+def ci_precision(statistics):
+    # Monte Carlo error of each confidence interval endpoint relative to the
+    # width of its interval, from the samples or quantile sketch of each
+    # statistic. Intervals which have collapsed onto a single value, or which
+    # are pinned to a pile of samples at a bound, with one endpoint exact and
+    # the other within its Monte Carlo error of it, have no width to measure
+    # their errors against. This happens to nu when most fits end at the
+    # negative binomial limit nu=0. Such intervals are returned separately and
+    # left out of the precision
+    precision = {}
+    degenerate = {}
+    for name, values in statistics.items():
+        ci = ci_from_bootstrap_samples(values, None, confidence_level)
+        errors = ci_monte_carlo_error(values, confidence_level)
+        width = ci[1] - ci[0]
+        pinned = ((errors[0] == 0 and errors[1] >= width) or
+                  (errors[1] == 0 and errors[0] >= width))
+        if (pinned or
+                width <= DEGENERATE_CI_WIDTH * max(1, abs(ci[0]), abs(ci[1]))):
+            degenerate[name] = ci
+            continue
+        precision[name] = where(errors > 0, errors / width, 0)
+    return precision, degenerate
+
+def largest_error(precision):
+    # Name of the statistic with the largest relative Monte Carlo error, and
+    # that error
+    if len(precision) == 0:
+        return None, 0
+    worst = max(precision, key=lambda name: max(precision[name]))
+    return worst, max(precision[worst])
+
+# State of each worker process, set once by init_worker when the pool starts
+# and kept for the life of the pool, so that tasks only carry the rows of the
+# shared count matrix which they fit
+worker_state = {}
+
+def init_worker(calculator, counts_name, counts_shape, counts_dtype):
+    counts_memory = SharedMemory(name=counts_name)
+    worker_state['calculator'] = calculator
+    worker_state['counts_memory'] = counts_memory
+    worker_state['count_matrix'] = ndarray(counts_shape,
+                                           dtype=counts_dtype,
+                                           buffer=counts_memory.buf)
+
+def fit_task(rows):
+    return worker_state['calculator'].fit_batch(
+                worker_state['count_matrix'][rows])
+
+class ReplicateFitter:
+    # Fits batches of bootstrap replicates with a pool of workers. Replicate
+    # i is drawn from its own stream, seeded by the master seed, the dataset
+    # and i, and identical count vectors have identical fits, so each
+    # distinct vector is fitted once and its record is shared by every
+    # replicate which draws it. The record of each replicate therefore depends
+    # on nothing but its index, whichever batch it is fitted in.
+    def __init__(self, calculator, no_of_workers, batch_size, seed,
+                 stream_key, keep_fits=True):
+        self.calculator = calculator
+        # Fits are only looked up within each batch if keep_fits is False,
+        # so that memory does not grow with the number of replicates
+        self.keep_fits = keep_fits
+        self.no_of_workers = no_of_workers
+        self.seed = seed
+        self.stream_key = stream_key
+        # The replicates of each batch are published to the workers through
+        # shared memory, along with the calculator through the pool
+        # initializer
+        self.counts_memory = SharedMemory(
+            create=True,
+            size=max(batch_size * len(calculator.values), 1) * 8)
+        self.count_matrix = ndarray((batch_size, len(calculator.values)),
+                                    dtype='i8',
+                                    buffer=self.counts_memory.buf)
+        self.fitted_counts = empty((0, len(calculator.values)), dtype='i8')
+        self.fitted_records = empty(0, dtype=RESULT_DTYPE)
+        self.n_lookups = 0
+        self.n_fitted = 0
+        self.n_not_converged = 0
+        self.n_serial_fallbacks = 0
+        self.n_errors = {error_type.__name__ : 0 for error_type in FIT_ERRORS}
+        self.evals = {model : 0 for model in FITTED_MODELS}
+        self.pool = Pool(no_of_workers,
+                         initializer=init_worker,
+                         initargs=(calculator,
+                                   self.counts_memory.name,
+                                   self.count_matrix.shape,
+                                   self.count_matrix.dtype))
+
+    def close(self):
+        self.pool.terminate()
+        del self.count_matrix
+        self.counts_memory.close()
+        self.counts_memory.unlink()
+
+    def fit(self, replicates):
+        calculator = self.calculator
+        no_replicates = len(replicates)
+        if not self.keep_fits:
+            self.fitted_counts = self.fitted_counts[:0]
+            self.fitted_records = self.fitted_records[:0]
+        self.count_matrix[:no_replicates] = bootstrap_replicate_counts(
+            (calculator.values, calculator.counts), replicates, self.seed,
+            self.stream_key)[1]
+        results = failed_records(no_replicates)
+        pending = arange(no_replicates)
+        n_attempts = 0
+        while len(pending) > 0:
+            n_fitted = len(self.fitted_counts)
+            known_counts, first, inverse = unique(
+                vstack([self.fitted_counts, self.count_matrix[pending]]),
+                axis=0,
+                return_index=True,
+                return_inverse=True)
+            known_records = empty(len(known_counts), dtype=RESULT_DTYPE)
+            # Vectors which first appear among the pending replicates have not
+            # been fitted yet
+            new = first >= n_fitted
+            known_records[~new] = self.fitted_records[first[~new]]
+            new_counts = known_counts[new]
+            if len(new_counts) > 0:
+                # New vectors are split into one block per worker and each
+                # block is fitted as a batch. The fit of each vector depends
+                # on nothing else, and in particular not on which vectors
+                # share its block.
+                new_rows = pending[first[new] - n_fitted]
+                no_blocks = min(self.no_of_workers, len(new_rows))
+                new_records = concatenate(self.pool.map(
+                                fit_task, array_split(new_rows, no_blocks)))
+                known_records[new] = new_records
+                self.n_fitted += len(new_records)
+                self.n_not_converged += count_nonzero(
+                    new_records['status'] == FIT_NOT_CONVERGED)
+                self.n_serial_fallbacks += count_nonzero(
+                    new_records['serial fallback'])
+                for name, n in count_fit_errors(new_records).items():
+                    self.n_errors[name] += n
+                for model in FITTED_MODELS:
+                    self.evals[model] += new_records[model + ' evals'].sum()
+            self.fitted_counts, self.fitted_records = known_counts, known_records
+            results[pending] = known_records[inverse.ravel()[n_fitted:]]
+            self.n_lookups += len(pending)
+            pending = pending[results['status'][pending] == FIT_FAILED]
+            n_attempts += 1
+            if len(pending) > 0:
+                if n_attempts >= MAX_SAMPLE_ATTEMPTS:
+                    print('Failed to generate successful bootstrap samples, discarding',
+                          len(pending), 'samples.')
+                    break
+                # Replace replicates which could not be fitted with new draws
+                # from their own streams
+                self.count_matrix[pending] = bootstrap_replicate_counts(
+                    (calculator.values, calculator.counts),
+                    replicates[pending], self.seed, self.stream_key,
+                    attempts=n_attempts)[1]
+        return results
+
+class BootstrapStore:
+    # Append-only store of the records of a bootstrap run, kept in
+    # outputs/bootstrap/<data_name>. Each committed batch of replicates is
+    # written to a file of its own, first under a temporary name which is
+    # then atomically replaced, so that an interrupted run leaves only whole
+    # batches behind. The seed and settings of the run are kept alongside,
+    # so that the run can be resumed, or extended with further replicates,
+    # with the same results as a single uninterrupted run.
+    def __init__(self, data_name, seed):
+        self.path = BOOTSTRAP_STORE_DIR + '/' + data_name
+        settings = {
+            'stream_key' : (crc32(data_name.encode()),),
+            'dtype' : RESULT_DTYPE.descr
+            }
+        fname = self.path + '/run.pkl'
+        if isfile(fname):
+            with open(fname, 'rb') as f:
+                stored = load(f)
+            if seed is not None and seed != stored['seed']:
+                raise ValueError('Bootstrap store ' + self.path +
+                    ' was started with seed ' + str(stored['seed']) +
+                    ', remove it to start a run with a new seed.')
+            for setting, value in settings.items():
+                if stored[setting] != value:
+                    raise ValueError('Bootstrap store ' + self.path +
+                        ' was started with a different ' + setting +
+                        ', remove it to start a new run.')
+            self.seed = stored['seed']
+        else:
+            if seed is None:
+                seed = SeedSequence().entropy
+            self.seed = seed
+            makedirs(self.path, exist_ok=True)
+            self._write(fname, lambda f: dump(dict(settings, seed=seed), f))
+        self.stream_key = settings['stream_key']
+        self.batch_names = sorted(name for name in listdir(self.path)
+                                  if name.startswith('batch_') and
+                                     name.endswith('.npz'))
+        # Range of replicate indices held by each batch
+        self.batch_ranges = {}
+        for name in self.batch_names:
+            with load_npz(self.path + '/' + name) as batch:
+                self.batch_ranges[name] = (batch['replicates'].min(),
+                                           batch['replicates'].max())
+
+    def _write(self, fname, write):
+        with open(fname + '.tmp', 'wb') as f:
+            write(f)
+        replace(fname + '.tmp', fname)
+
+    def load(self, start, stop):
+        # Records of the stored replicates with indices in [start, stop),
+        # read only from the batches which hold any of them
+        replicates = []
+        records = []
+        for name in self.batch_names:
+            first, last = self.batch_ranges[name]
+            if first >= stop or last < start:
+                continue
+            with load_npz(self.path + '/' + name) as batch:
+                in_range = ((batch['replicates'] >= start) &
+                            (batch['replicates'] < stop))
+                replicates.append(batch['replicates'][in_range])
+                records.append(batch['records'][in_range])
+        if len(replicates) == 0:
+            return empty(0, dtype=int), empty(0, dtype=RESULT_DTYPE)
+        return concatenate(replicates), concatenate(records)
+
+    def append(self, replicates, records):
+        name = 'batch_{0:06d}.npz'.format(len(self.batch_names))
+        self._write(self.path + '/' + name,
+                    lambda f: savez(f, replicates=replicates, records=records))
+        self.batch_names.append(name)
+        self.batch_ranges[name] = (replicates.min(), replicates.max())
+
+    def write_partial_cis(self, sketches, no_samples):
+        # Confidence intervals from the replicates committed so far, which can
+        # be read while the run is still in progress
+        self._write(self.path + '/partial_cis.pkl',
+                    lambda f: dump(
+                        {'no_samples' : no_samples,
+                         'ci' : {name : ci_from_bootstrap_samples(
+                                            sketch, None, confidence_level)
+                                 for name, sketch in sketches.items()}},
+                        f))
+
+def check_batch_fits(no_samples, seed=None):
+    # Fits the bootstrap replicates of every dataset, drawn as in a run with
+    # this seed, both together with the batched fitters and one at a time,
+    # and compares the beta-Poisson log likelihoods of the two fits. Returns
+    # the number of replicates on which they differ by more than
+    # BP_FIT_LLH_TOL.
+    if seed is None:
+        seed = SeedSequence().entropy
+    print('Bootstrap seed', seed)
+    no_disagreements = 0
+    for data_name, data_set in data_dict.items():
+        calculator = MLECalculator(data_set)
+        replicate_rows = bootstrap_replicate_counts(
+            (calculator.values, calculator.counts), arange(no_samples), seed,
+            (crc32(data_name.encode()),))[1]
+        batched = calculator.fit_batch(replicate_rows)
+        serial = array([calculator(p) for p in replicate_rows],
+                       dtype=RESULT_DTYPE)
+        fitted = nonzero((batched['status'] != FIT_FAILED) &
+                         (serial['status'] != FIT_FAILED))[0]
+        llh_diff = zeros(len(fitted))
+        for i, row in enumerate(fitted):
+            data_now = (calculator.values, replicate_rows[row])
+            llh_batched, llh_serial = beta_poisson_loglh(
+                data_now,
+                histogram_mean(data_now),
+                [batched[row]['beta-Poisson phi'],
+                 serial[row]['beta-Poisson phi']],
+                [batched[row]['beta-Poisson nu'],
+                 serial[row]['beta-Poisson nu']])
+            llh_diff[i] = llh_batched - llh_serial
+        worse = count_nonzero(llh_diff < -BP_FIT_LLH_TOL)
+        better = count_nonzero(llh_diff > BP_FIT_LLH_TOL)
+        no_disagreements += worse + better
+        print(data_name + ':', len(fitted), 'of', no_samples,
+              'replicates fitted by both.',
+              'Batched fit worse on', worse, 'and better on', better,
+              'by up to', max(abs(llh_diff), default=0),
+              'in log likelihood.',
+              'Beta-Poisson likelihood evaluations',
+              batched['beta-Poisson evals'][fitted].sum(), 'batched and',
+              serial['beta-Poisson evals'][fitted].sum(), 'serial.')
+    return no_disagreements
 
 def main(no_of_workers,
          no_samples,
-         data_name):
+         data_name,
+         seed=None,
+         batch_size=1000,
+         ci_tolerance=None,
+         time_budget=None,
+         quantile_sketch=False,
+         profile_cis=False,
+         wald_cis=False,
+         bca=False):
     main_start = get_time()
 
     data_set = data_dict[data_name]
 
-    results = []
+    # Profile likelihood, Wald and delta method confidence intervals only need
+    # the fit to the full dataset and its likelihood, so no replicates are
+    # taken, and either or both can be asked for in one run
+    if profile_cis or wald_cis:
+        mle_dict = MLECalculator(data_set).mle_dict
+    if profile_cis:
+        ci_dict, no_fits = generate_profile_ci_dict(data_set,
+                                                    mle_dict,
+                                                    confidence_level,
+                                                    full_output=True)
+        print('Profile likelihood intervals took', no_fits, 'refits and',
+              get_time() - main_start, 'seconds.')
+        fname = 'outputs/mles/'+data_name+'_profile_cis.pkl'
+        with open(fname, 'wb') as f:
+            dump((mle_dict, ci_dict), f)
+    if wald_cis:
+        wald_ci_dicts = generate_wald_ci_dicts(data_set,
+                                               mle_dict,
+                                               confidence_level)
+        print('Wald intervals took', get_time() - main_start, 'seconds.')
+        fname = 'outputs/mles/'+data_name+'_wald_cis.pkl'
+        with open(fname, 'wb') as f:
+            dump((mle_dict,) + wald_ci_dicts, f)
+    if profile_cis or wald_cis:
+        return -1
+
+    # Replicates already stored by an earlier run with the same settings are
+    # reused, so that an interrupted run resumes where it stopped and a run
+    # asked for more samples only fits the new ones
+    store = BootstrapStore(data_name, seed)
+    print('Bootstrap seed', store.seed)
+
+    # Replicates are taken in rounds of batch_size. The run stops at the end
+    # of the first round after which the Monte Carlo error of every confidence
+    # interval endpoint is within ci_tolerance of the width of its interval,
+    # if a tolerance is given, or after which time_budget seconds have passed,
+    # if a budget is given, and otherwise once no_samples replicates have been
+    # taken.
+    # Each round is summarised by a quantile sketch of every statistic, from
+    # which partial confidence intervals are written as the run goes, and if
+    # quantile_sketch is True the final intervals are also taken from these
+    # sketches and the records of each round are discarded once summarised.
     calculator = MLECalculator(data_set)
-    params = arange(no_samples)
-
-    with Pool(no_of_workers) as pool:
-        results = pool.map(calculator, params)
-
-    dict_samples = [r[0] for r in results]
-    var_samples = [r[1] for r in results]
-    superspread_samples = [r[2] for r in results]
-    p0_samples = [r[3] for r in results]
+    fitter = None
+    sketches = {}
+    rounds = []
+    samples_taken = 0
+    n_loaded = 0
+    stop_reason = 'sample limit reached'
+    try:
+        while samples_taken < no_samples:
+            round_start = samples_taken
+            samples_taken = min(samples_taken + batch_size, no_samples)
+            round_records = failed_records(samples_taken - round_start)
+            stored = zeros(samples_taken - round_start, dtype=bool)
+            replicates, records = store.load(round_start, samples_taken)
+            round_records[replicates - round_start] = records
+            stored[replicates - round_start] = True
+            n_loaded += len(replicates)
+            replicates = round_start + nonzero(~stored)[0]
+            if len(replicates) > 0:
+                if fitter is None:
+                    fitter = ReplicateFitter(calculator,
+                                             no_of_workers,
+                                             min(batch_size, no_samples),
+                                             store.seed,
+                                             store.stream_key,
+                                             keep_fits=not quantile_sketch)
+                records = fitter.fit(replicates)
+                round_records[replicates - round_start] = records
+                store.append(replicates, records)
+                print('Committed', samples_taken, 'of', no_samples,
+                      'replicates,', get_time() - main_start,
+                      'seconds elapsed.')
+            update_sketches(sketches, round_records)
+            store.write_partial_cis(sketches, samples_taken)
+            if not quantile_sketch:
+                rounds.append(round_records)
+            if ci_tolerance is not None:
+                if quantile_sketch:
+                    precision, degenerate = ci_precision(sketches)
+                else:
+                    results = concatenate(rounds)
+                    precision, degenerate = ci_precision(bootstrap_statistics(
+                        results[results['status'] != FIT_FAILED]))
+                worst, error = largest_error(precision)
+                print('Largest relative Monte Carlo error', error, 'for',
+                      worst, 'after', samples_taken, 'replicates,',
+                      len(degenerate), 'degenerate intervals left out.')
+                if error <= ci_tolerance:
+                    stop_reason = 'tolerance reached'
+                    break
+            if (time_budget is not None and
+                    get_time() - main_start > time_budget):
+                stop_reason = 'time budget exhausted'
+                break
+    finally:
+        if fitter is not None:
+            fitter.close()
+
+    print(n_loaded, 'bootstrap replicates loaded from', store.path + '.')
+    if fitter is not None:
+        print('Fitted', fitter.n_fitted, 'distinct count vectors for',
+              fitter.n_lookups, 'bootstrap replicates,',
+              fitter.n_lookups - fitter.n_fitted, 'fits saved.')
+        for model in FITTED_MODELS:
+            print('Fitting', model, 'used', fitter.evals[model],
+                  'function evaluations, mean',
+                  fitter.evals[model] / max(fitter.n_fitted, 1),
+                  'per distinct vector.')
+        print(fitter.n_not_converged,
+              'distinct vectors had beta-Poisson fits which did not converge.')
+        print(fitter.n_serial_fallbacks,
+              'distinct vectors were fitted one at a time after their batched',
+              'fit failed.')
+        print('Distinct vectors which could not be fitted, by reason:',
+              ', '.join(name + ' ' + str(n)
+                        for name, n in fitter.n_errors.items()) + '.')
+
+    if quantile_sketch:
+        statistics = sketches
+    else:
+        results = concatenate(rounds)
+        statistics = bootstrap_statistics(
+            results[results['status'] != FIT_FAILED])
     mle_dict = calculator.mle_dict
     var_dict = calculator.var_dict
     od_dict = {
@@ -132,190 +689,92 @@ def main(no_of_workers,
     superspread_dict = calculator.superspread_dict
     p0_dict = calculator.p0_dict
 
-    poisson_lmbd_samples = array([d['poisson'] for d in dict_samples])
-    poisson_ci = ci_from_bootstrap_samples(poisson_lmbd_samples,
-                                           mle_dict['poisson'],
-                                           confidence_level)
-
-    geo_lmbd_samples = array([d['geometric'] for d in dict_samples])
-    geo_ci = ci_from_bootstrap_samples(geo_lmbd_samples,
-                                       mle_dict['geometric'],
-                                       confidence_level)
-
-    neg_bin_lmbd_samples = array(
-                            [d['negative binomial'][0] for d in dict_samples])
-    neg_bin_lmbd_ci = ci_from_bootstrap_samples(neg_bin_lmbd_samples,
-                                            mle_dict['negative binomial'][0],
-                                            confidence_level)
-    neg_bin_theta_samples = array(
-                            [d['negative binomial'][1] for d in dict_samples])
-    neg_bin_theta_ci = ci_from_bootstrap_samples(neg_bin_theta_samples,
-                                            mle_dict['negative binomial'][1],
-                                            confidence_level)
-
-    zip_lmbd_samples = array(
-                            [d['zip'][0] for d in dict_samples])
-    zip_lmbd_ci = ci_from_bootstrap_samples(zip_lmbd_samples,
-                                            mle_dict['zip'][0],
-                                            confidence_level)
-    zip_sigma_samples = array(
-                            [d['zip'][1] for d in dict_samples])
-    zip_sigma_ci = ci_from_bootstrap_samples(zip_sigma_samples,
-                                            mle_dict['zip'][1],
-                                            confidence_level)
-    zip_mean_samples = array(
-                            [d['zip'][0]*(1-d['zip'][1]) for d in dict_samples])
-    zip_mean_ci = ci_from_bootstrap_samples(zip_mean_samples,
-                                            mle_dict['zip'][1],
-                                            confidence_level)
-
-    beta_poi_lmbd_samples = array(
-                            [d['beta-Poisson'][0] for d in dict_samples])
-    beta_poi_lmbd_ci = ci_from_bootstrap_samples(beta_poi_lmbd_samples,
-                                                mle_dict['beta-Poisson'][0],
-                                                confidence_level)
-    beta_poi_phi_samples = array(
-                            [d['beta-Poisson'][1] for d in dict_samples])
-    beta_poi_phi_ci = ci_from_bootstrap_samples(beta_poi_phi_samples,
-                                                mle_dict['beta-Poisson'][1],
-                                                confidence_level)
-    beta_poi_nu_samples = array(
-                            [d['beta-Poisson'][2] for d in dict_samples])
-    beta_poi_nu_ci = ci_from_bootstrap_samples(beta_poi_nu_samples,
-                                                  mle_dict['beta-Poisson'][2],
-                                                  confidence_level)
+    # Every statistic of the fit to the full dataset, which BCa intervals are
+    # centred on
+    full_statistics = bootstrap_statistics(
+        result_record(mle_dict, var_dict, superspread_dict, p0_dict,
+                      {model : 0 for model in FITTED_MODELS})[None])
+
+    # The acceleration of BCa intervals is taken from a jackknife with one fit
+    # per distinct value in the data, weighted by its number of observations
+    if bca:
+        values, multiplicities, jackknife_rows = jackknife_count_matrix(
+            (calculator.values, calculator.counts))
+        jackknife_statistics = bootstrap_statistics(
+            calculator.fit_batch(jackknife_rows))
+        acceleration = {
+            name : jackknife_acceleration(estimates, multiplicities)
+            for name, estimates in jackknife_statistics.items()}
+        print('Jackknife took', len(jackknife_rows), 'fits for',
+              sum(multiplicities), 'observations.')
+
+    def bootstrap_ci(name):
+        mle = full_statistics[name][0]
+        if bca:
+            return bca_ci_from_bootstrap_samples(statistics[name], mle,
+                                                 confidence_level,
+                                                 acceleration[name])
+        return ci_from_bootstrap_samples(statistics[name], mle,
+                                         confidence_level)
+
+    param_ci_dict = {
+        model : [bootstrap_ci(model + ' ' + param)
+                 for param in MODEL_PARAMS[model]]
+        for model in MODELS}
 
     ci_dict = {
-        'poisson' : poisson_ci,
-        'geometric' : geo_ci,
-        'negative binomial' : [neg_bin_lmbd_ci, neg_bin_theta_ci],
-        'zip' : [zip_lmbd_ci, zip_sigma_ci],
-        'beta-Poisson' : [beta_poi_lmbd_ci,
-                          beta_poi_phi_ci,
-                          beta_poi_nu_ci]
+        'poisson' : param_ci_dict['poisson'][0],
+        'geometric' : param_ci_dict['geometric'][0],
+        'negative binomial' : param_ci_dict['negative binomial'],
+        'zip' : param_ci_dict['zip'],
+        'beta-Poisson' : param_ci_dict['beta-Poisson']
     }
 
     mean_ci_dict = {
-        'poisson' : poisson_ci,
-        'geometric' : geo_ci,
-        'negative binomial' : neg_bin_lmbd_ci,
-        'zip' : zip_mean_ci,
-        'beta-Poisson' : beta_poi_lmbd_ci
+        'poisson' : param_ci_dict['poisson'][0],
+        'geometric' : param_ci_dict['geometric'][0],
+        'negative binomial' : param_ci_dict['negative binomial'][0],
+        'zip' : bootstrap_ci('zip mean'),
+        'beta-Poisson' : param_ci_dict['beta-Poisson'][0]
     }
 
-    poisson_var_samples = array([d['poisson'] for d in var_samples])
-    poisson_var_ci = ci_from_bootstrap_samples(poisson_var_samples,
-                                           var_dict['poisson'],
-                                           confidence_level)
-    geo_var_samples = array([d['geometric'] for d in var_samples])
-    geo_var_ci = ci_from_bootstrap_samples(geo_var_samples,
-                                           var_dict['geometric'],
-                                           confidence_level)
-    neg_bin_var_samples = array([d['negative binomial'] for d in var_samples])
-    neg_bin_var_ci = ci_from_bootstrap_samples(neg_bin_var_samples,
-                                           var_dict['negative binomial'],
-                                           confidence_level)
-    zip_var_samples = array([d['zip'] for d in var_samples])
-    zip_var_ci = ci_from_bootstrap_samples(zip_var_samples,
-                                           var_dict['zip'],
-                                           confidence_level)
-    beta_poi_var_samples = array([d['beta-Poisson'] for d in var_samples])
-    beta_poi_var_ci = ci_from_bootstrap_samples(beta_poi_var_samples,
-                                           var_dict['beta-Poisson'],
-                                           confidence_level)
-
     var_ci_dict = {
-        'poisson' : poisson_var_ci,
-        'geometric' : geo_var_ci,
-        'negative binomial' : neg_bin_var_ci,
-        'zip' : zip_var_ci,
-        'beta-Poisson' : beta_poi_var_ci
-    }
-
-    geo_od_samples = (array([d['geometric'] for d in var_samples]) - array([d['geometric'] for d in dict_samples]))/ array([d['geometric'] for d in dict_samples])
-    geo_od_ci = ci_from_bootstrap_samples(geo_od_samples,
-                                           0,
-                                           confidence_level)
-    neg_bin_od_samples = array([d['negative binomial'][1] for d in dict_samples])
-    neg_bin_od_ci = ci_from_bootstrap_samples(neg_bin_od_samples,
-                                           0,
-                                           confidence_level)
-    zip_od_samples = (array([d['zip'] for d in var_samples]) - array([d['zip'][0]*(1-d['zip'][1]) for d in dict_samples]))/ array([d['zip'][0]*(1-d['zip'][1]) for d in dict_samples])
-    zip_od_ci = ci_from_bootstrap_samples(zip_od_samples,
-                                           0,
-                                           confidence_level)
-    beta_poi_od_samples = (array([d['beta-Poisson'] for d in var_samples]) - array([d['beta-Poisson'][0] for d in dict_samples]))/ array([d['beta-Poisson'][0] for d in dict_samples])
-    beta_poi_od_ci = ci_from_bootstrap_samples(beta_poi_od_samples,
-                                           0,
-                                           confidence_level)
+        model : bootstrap_ci(model + ' var')
+        for model in MODELS}
 
     od_ci_dict = {
-        'geometric' : geo_od_ci,
-        'negative binomial' : neg_bin_od_ci,
-        'zip' : zip_od_ci,
-        'beta-Poisson' : beta_poi_od_ci
-    }
-
-    poisson_superspread_samples = array([d['poisson'] for d in superspread_samples])
-    poisson_superspread_ci = ci_from_bootstrap_samples(poisson_superspread_samples,
-                                           superspread_dict['poisson'],
-                                           confidence_level)
-    geo_superspread_samples = array([d['geometric'] for d in superspread_samples])
-    geo_superspread_ci = ci_from_bootstrap_samples(geo_superspread_samples,
-                                           superspread_dict['geometric'],
-                                           confidence_level)
-    neg_bin_superspread_samples = array([d['negative binomial'] for d in superspread_samples])
-    neg_bin_superspread_ci = ci_from_bootstrap_samples(neg_bin_superspread_samples,
-                                           superspread_dict['negative binomial'],
-                                           confidence_level)
-    zip_superspread_samples = array([d['zip'] for d in superspread_samples])
-    zip_superspread_ci = ci_from_bootstrap_samples(zip_superspread_samples,
-                                           superspread_dict['zip'],
-                                           confidence_level)
-    beta_poi_superspread_samples = array([d['beta-Poisson'] for d in superspread_samples])
-    beta_poi_superspread_ci = ci_from_bootstrap_samples(beta_poi_superspread_samples,
-                                           superspread_dict['beta-Poisson'],
-                                           confidence_level)
+        model : bootstrap_ci(model + ' od')
+        for model in MODELS if model != 'poisson'}
 
     superspread_ci_dict = {
-        'poisson' : poisson_superspread_ci,
-        'geometric' : geo_superspread_ci,
-        'negative binomial' : neg_bin_superspread_ci,
-        'zip' : zip_superspread_ci,
-        'beta-Poisson' : beta_poi_superspread_ci
-    }
-
-    poisson_p0_samples = array([d['poisson'] for d in p0_samples])
-    poisson_p0_ci = ci_from_bootstrap_samples(poisson_p0_samples,
-                                           p0_dict['poisson'],
-                                           confidence_level)
-    geo_p0_samples = array([d['geometric'] for d in p0_samples])
-    geo_p0_ci = ci_from_bootstrap_samples(geo_p0_samples,
-                                           p0_dict['geometric'],
-                                           confidence_level)
-    neg_bin_p0_samples = array([d['negative binomial'] for d in p0_samples])
-    neg_bin_p0_ci = ci_from_bootstrap_samples(neg_bin_p0_samples,
-                                           p0_dict['negative binomial'],
-                                           confidence_level)
-    zip_p0_samples = array([d['zip'] for d in p0_samples])
-    zip_p0_ci = ci_from_bootstrap_samples(zip_p0_samples,
-                                           p0_dict['zip'],
-                                           confidence_level)
-    beta_poi_p0_samples = array([d['beta-Poisson'] for d in p0_samples])
-    beta_poi_p0_ci = ci_from_bootstrap_samples(beta_poi_p0_samples,
-                                           p0_dict['beta-Poisson'],
-                                           confidence_level)
+        model : bootstrap_ci(model + ' superspread')
+        for model in MODELS}
 
     p0_ci_dict = {
-        'poisson' : poisson_p0_ci,
-        'geometric' : geo_p0_ci,
-        'negative binomial' : neg_bin_p0_ci,
-        'zip' : zip_p0_ci,
-        'beta-Poisson' : beta_poi_p0_ci
-    }
+        model : bootstrap_ci(model + ' p0')
+        for model in MODELS}
 
     llh_dict = generate_llh_dict(data_set, mle_dict)
 
+    # The number of replicates used and the Monte Carlo error achieved for
+    # each confidence interval endpoint are reported separately from the
+    # results
+    precision, degenerate = ci_precision(statistics)
+    print('Used', samples_taken, 'bootstrap replicates,', stop_reason + ',',
+          'largest relative Monte Carlo error', largest_error(precision)[1])
+    if len(degenerate) > 0:
+        print('Left out of the precision as degenerate:',
+              ', '.join('{0} {1}'.format(name, ci)
+                        for name, ci in degenerate.items()))
+    fname = 'outputs/mles/'+data_name+'_bootstrap_precision.pkl'
+    with open(fname, 'wb') as f:
+        dump(
+            {'no_samples' : samples_taken,
+             'stop_reason' : stop_reason,
+             'ci_tolerance' : ci_tolerance,
+             'relative_mc_error' : precision,
+             'degenerate_cis' : degenerate},
+            f)
 
     print('Bootstrap took',get_time()-main_start,'seconds.')
 
@@ -347,8 +806,92 @@ if __name__ == '__main__':
     parser.add_argument('--data_name',
                         type=str,
                         default='plague_data')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=None,
+                        help='master seed of the bootstrap replicates')
+    parser.add_argument('--batch_size',
+                        type=int,
+                        default=1000,
+                        help='number of replicates committed to disk at a time')
+    parser.add_argument('--ci_tolerance',
+                        type=float,
+                        default=None,
+                        help='stop once the Monte Carlo error of every '
+                             'confidence interval endpoint is within this '
+                             'fraction of the width of its interval, with '
+                             '--no_samples as the maximum')
+    parser.add_argument('--time_budget',
+                        type=float,
+                        default=None,
+                        help='stop at the end of the first round after '
+                             'this many seconds, with --no_samples as the '
+                             'maximum')
+    parser.add_argument('--quantile_sketch',
+                        action='store_true',
+                        help='calculate confidence intervals from streaming '
+                             'quantile sketches rather than keeping every '
+                             'replicate in memory')
+    parser.add_argument('--profile_cis',
+                        action='store_true',
+                        help='calculate profile likelihood confidence '
+                             'intervals for the model parameters instead of '
+                             'bootstrapping, together with --wald_cis if it '
+                             'is given')
+    parser.add_argument('--wald_cis',
+                        action='store_true',
+                        help='calculate Wald and delta method confidence '
+                             'intervals instead of bootstrapping, together '
+                             'with --profile_cis if it is given')
+    parser.add_argument('--bca',
+                        action='store_true',
+                        help='calculate bias-corrected and accelerated '
+                             'bootstrap confidence intervals rather than '
+                             'percentile intervals')
+    parser.add_argument('--check_fits',
+                        action='store_true',
+                        help='check that the batched and serial beta-Poisson '
+                             'fits of --no_samples bootstrap replicates of '
+                             'every dataset agree in log likelihood instead '
+                             'of bootstrapping, exiting with status 1 if '
+                             'they do not')
     args = parser.parse_args()
+    if args.check_fits:
+        other_options = [
+            option for option, given in
+            [('--ci_tolerance', args.ci_tolerance is not None),
+             ('--time_budget', args.time_budget is not None),
+             ('--quantile_sketch', args.quantile_sketch),
+             ('--profile_cis', args.profile_cis),
+             ('--wald_cis', args.wald_cis),
+             ('--bca', args.bca)]
+            if given]
+        if len(other_options) > 0:
+            parser.error('--check_fits calculates no confidence intervals, '
+                         'so cannot be used with ' + ', '.join(other_options))
+        exit(1 if check_batch_fits(args.no_samples, args.seed) > 0 else 0)
+    if args.profile_cis or args.wald_cis:
+        bootstrap_options = [
+            option for option, given in
+            [('--seed', args.seed is not None),
+             ('--ci_tolerance', args.ci_tolerance is not None),
+             ('--time_budget', args.time_budget is not None),
+             ('--quantile_sketch', args.quantile_sketch),
+             ('--bca', args.bca)]
+            if given]
+        if len(bootstrap_options) > 0:
+            parser.error('--profile_cis and --wald_cis take no bootstrap '
+                         'replicates, so cannot be used with ' +
+                         ', '.join(bootstrap_options))
 
     main(args.no_of_workers,
          args.no_samples,
-         args.data_name)
+         args.data_name,
+         args.seed,
+         args.batch_size,
+         args.ci_tolerance,
+         args.time_budget,
+         args.quantile_sketch,
+         args.profile_cis,
+         args.wald_cis,
+         args.bca)
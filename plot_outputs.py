@@ -5,10 +5,9 @@ from os.path import isdir
 import matplotlib.pyplot as plt
 import numpy as np
 from pickle import load
-from scipy import stats
 from datasets import (plague_data, mpox_data, nigeria_ebola_data,
     guinea_ebola_data, singapore_sars_data, sk_mers_data, sa_mers_data, noro_data)
-from functions import beta_poisson_pmf, zip_pmf
+from functions import dist_pmf
 
 if isdir('outputs/mles') is True:
     fname_root = 'outputs/mles/'
@@ -174,29 +173,24 @@ for i, mle_dict in enumerate(mle_list):
     axes[i].set_aspect((xMax+1))
 
 
-    PoiLine=stats.poisson.pmf(xVals,mle_dict['poisson'])
+    PoiLine=dist_pmf('poisson',xVals,mle_dict['poisson'])
     axes[i].plot(xVals,PoiLine,':s', label='Poisson', lw=2, ms=12)
     # axes[i].bar(xVals,PoiLine, label='Poisson')
 
-    GeomLine=stats.geom.pmf(xVals,1/(mle_dict['geometric']+1),-1)
+    GeomLine=dist_pmf('geometric',xVals,mle_dict['geometric'])
     axes[i].plot(xVals,GeomLine,'--v', label='Geometric', lw=2, ms=12)
     # axes[i].bar(xVals,GeomLine, label='Geometric')
 
-    NegBinLine=stats.nbinom.pmf(xVals,
-        mle_dict['negative binomial'][0]/mle_dict['negative binomial'][1],
-        1/(mle_dict['negative binomial'][1]+1))
+    NegBinLine=dist_pmf('negative binomial',xVals,mle_dict['negative binomial'])
     axes[i].plot(xVals,NegBinLine,'-.x', label='Negative Binomial', lw=2, ms=12)
     # axes[i].bar(xVals,NegBinLine, label='Negative Binomial')
 
-    ZIPLine=zip_pmf(xVals,mle_dict['zip'][0],mle_dict['zip'][1])
+    ZIPLine=dist_pmf('zip',xVals,mle_dict['zip'])
     axes[i].plot(xVals,ZIPLine,'^',linestyle=(0, (3, 5, 1, 5)), label='ZIP', lw=2, ms=12)
     # axes[i].bar(xVals,ZIPLine,linestyle=(0, (3, 5, 1, 5)), label='ZIP')
 
     if mle_dict['beta-Poisson'][2]>1e-4:
-        BetaPoiLine=beta_poisson_pmf(xVals,
-            mle_dict['beta-Poisson'][0],
-            mle_dict['beta-Poisson'][1],
-            1/mle_dict['beta-Poisson'][2])
+        BetaPoiLine=dist_pmf('beta-Poisson',xVals,mle_dict['beta-Poisson'])
         axes[i].plot(xVals,BetaPoiLine,'-o', label='Beta Poisson', lw=2, ms=12)
         # axes[i].bar(xVals,BetaPoiLine, label='Beta Poisson')
 
@@ -5,7 +5,7 @@ import numpy as np
 from pickle import load
 from scipy import stats
 from datasets import plague_data
-from functions import beta_poisson_pmf, zip_pmf
+from functions import dist_pmf
 
 
 with open('outputs/plague/results.pkl','rb') as f:
@@ -19,15 +19,15 @@ fig, ax=plt.subplots(figsize=(5,5))
 
 xVals=range(max(plague_data)+1)
 
-PoiLine=stats.poisson.pmf(xVals,np.mean(plague_data))
+PoiLine=dist_pmf('poisson',xVals,np.mean(plague_data))
 ax.plot(xVals,PoiLine,':s', label='Poisson')
-GeomLine=stats.geom.pmf(xVals,1/(np.mean(plague_data)+1),-1)
+GeomLine=dist_pmf('geometric',xVals,np.mean(plague_data))
 ax.plot(xVals,GeomLine,'--v', label='Geometric')
-NegBinLine=stats.nbinom.pmf(xVals,np.mean(plague_data)/theta_mle,1/(theta_mle+1))
+NegBinLine=dist_pmf('negative binomial',xVals,(np.mean(plague_data),theta_mle))
 ax.plot(xVals,NegBinLine,'-.x', label='Negative Binomial')
-ZIPLine=zip_pmf(xVals,lmbd_mle,sigma_mle)
+ZIPLine=dist_pmf('zip',xVals,(lmbd_mle,sigma_mle))
 ax.plot(xVals,ZIPLine,'^',linestyle=(0, (3, 5, 1, 5)), label='ZIP')
-BetaPoiLine=beta_poisson_pmf(xVals,np.mean(plague_data),phi_mle,1/N_inv_mle)
+BetaPoiLine=dist_pmf('beta-Poisson',xVals,(np.mean(plague_data),phi_mle,N_inv_mle))
 ax.plot(xVals,BetaPoiLine,'-o', label='Beta Poisson')
 counts,bins=np.histogram(plague_data,7)
 dist=counts/len(plague_data)
@@ -7,7 +7,6 @@ from scipy import stats
 from scipy.stats.distributions import chi2
 from datasets import (plague_data, mpox_data, nigeria_ebola_data,
     guinea_ebola_data, singapore_sars_data, sk_mers_data, sa_mers_data, noro_data)
-from functions import beta_poisson_pmf, zip_pmf
 
 np.set_printoptions(precision=2)
 
@@ -1,5 +1,6 @@
 from argparse import ArgumentParser
-from numpy import array, isnan, linspace, mean, meshgrid, percentile, size, var, where, zeros
+from numpy import (array_split, concatenate, isnan, linspace, mean, meshgrid,
+    nan, percentile, size)
 from os import mkdir
 from os.path import isdir, isfile
 from pickle import dump, load
@@ -9,7 +10,8 @@ from multiprocessing import Pool
 from time import time as get_time
 from datasets import (plague_data, mpox_data, nigeria_ebola_data,
     guinea_ebola_data, singapore_sars_data, sk_mers_data, sa_mers_data, noro_data)
-from functions import (beta_poisson_loglh, neg_bin_loglh)
+from functions import (beta_poisson_loglh_grid, count_histogram,
+    neg_bin_loglh)
 
 data_dict = {
     'plague_data' : plague_data,
@@ -27,104 +29,101 @@ if isdir('outputs') is False:
 if isdir('outputs/sensitivity_analyses') is False:
     mkdir('outputs/sensitivity_analyses')
 
+# Log likelihood recorded for the curves and grids at infeasible parameter
+# combinations (nu>1/lambda), where the beta-Poisson distribution is not
+# defined. Plots leave these points out.
+INFEASIBLE_LLH = nan
+
 class LmbdGridCalculator:
     def __init__(self, data_set, mle_dict):
-        sample_var = var(data_set)
-
-        self.data_set = data_set
+        self.histogram = count_histogram(data_set)
         self.mle_dict = mle_dict
         self.lmbd_mle = mle_dict['beta-Poisson'][0]
 
     def __call__(self, p):
-        try:
-            results = self._sensitivity_calculations(p)
-        except ValueError as err:
-            print(
-                'Exception raised for parameters={0}\n\tException: {1}'.format(
-                p, err)
-                )
-            return 0.0
-        return results
+        # Points outside the parameter space are filled in by
+        # beta_poisson_loglh_grid, so an exception here is a bug and is
+        # raised rather than written into the grid
+        return self._sensitivity_calculations(p)
 
     def _sensitivity_calculations(self, p):
 
         phi_p = p[0]
         nu_p = p[1]
 
-        if nu_p <= 1/self.lmbd_mle:
-            lmbd_grid_val = beta_poisson_loglh(self.data_set,
-                                            self.lmbd_mle,
-                                            phi_p,
-                                            nu_p)
-            return lmbd_grid_val
-        else:
-            return 1000
+        lmbd_grid_vals = beta_poisson_loglh_grid(self.histogram,
+                                        self.lmbd_mle,
+                                        phi_p,
+                                        nu_p,
+                                        fill_value=INFEASIBLE_LLH)
+        return lmbd_grid_vals
 
 class PhiGridCalculator:
     def __init__(self, data_set, mle_dict):
-        sample_var = var(data_set)
-
-        self.data_set = data_set
+        self.histogram = count_histogram(data_set)
         self.mle_dict = mle_dict
         self.phi_mle = mle_dict['beta-Poisson'][1]
 
     def __call__(self, p):
-        try:
-            results = self._sensitivity_calculations(p)
-        except ValueError as err:
-            print(
-                'Exception raised for parameters={0}\n\tException: {1}'.format(
-                p, err)
-                )
-            return 0.0
-        return results
+        # Points outside the parameter space are filled in by
+        # beta_poisson_loglh_grid, so an exception here is a bug and is
+        # raised rather than written into the grid
+        return self._sensitivity_calculations(p)
 
     def _sensitivity_calculations(self, p):
 
         lmbd_p = p[0]
         nu_p = p[1]
 
-        if nu_p <= 1/lmbd_p:
-            phi_grid_val = beta_poisson_loglh(self.data_set,
-                                          lmbd_p,
-                                          self.phi_mle,
-                                          nu_p)
-            return phi_grid_val
-        else:
-            return 1000
+        phi_grid_vals = beta_poisson_loglh_grid(self.histogram,
+                                        lmbd_p,
+                                        self.phi_mle,
+                                        nu_p,
+                                        fill_value=INFEASIBLE_LLH)
+        return phi_grid_vals
 
 class NuGridCalculator:
     def __init__(self, data_set, mle_dict):
-        sample_var = var(data_set)
-
-        self.data_set = data_set
+        self.histogram = count_histogram(data_set)
         self.mle_dict = mle_dict
         self.nu_mle = mle_dict['beta-Poisson'][2]
 
     def __call__(self, p):
-        try:
-            results = self._sensitivity_calculations(p)
-        except ValueError as err:
-            print(
-                'Exception raised for parameters={0}\n\tException: {1}'.format(
-                p, err)
-                )
-            return 0.0
-        return results
+        # Points outside the parameter space are filled in by
+        # beta_poisson_loglh_grid, so an exception here is a bug and is
+        # raised rather than written into the grid
+        return self._sensitivity_calculations(p)
 
     def _sensitivity_calculations(self, p):
 
         lmbd_p = p[0]
         phi_p = p[1]
 
-        if self.nu_mle <= 1/lmbd_p:
-            nu_grid_val = beta_poisson_loglh(self.data_set,
-                                         lmbd_p,
-                                         phi_p,
-                                         self.nu_mle)
-            return nu_grid_val
-        else:
-            return 1000
+        nu_grid_vals = beta_poisson_loglh_grid(self.histogram,
+                                        lmbd_p,
+                                        phi_p,
+                                        self.nu_mle,
+                                        fill_value=INFEASIBLE_LLH)
+        return nu_grid_vals
+
+# Grid calculators of each worker process, built once by init_worker when the
+# pool starts and kept for the life of the pool, so that tasks only carry
+# their block of grid parameters
+worker_calculators = {}
+
+def init_worker(data_set, mle_dict):
+    worker_calculators['lmbd'] = LmbdGridCalculator(data_set, mle_dict)
+    worker_calculators['phi'] = PhiGridCalculator(data_set, mle_dict)
+    worker_calculators['nu'] = NuGridCalculator(data_set, mle_dict)
+
+def lmbd_grid_task(p):
+    return worker_calculators['lmbd'](p)
+
+def phi_grid_task(p):
+    return worker_calculators['phi'](p)
+
+def nu_grid_task(p):
+    return worker_calculators['nu'](p)
 
 def main(no_of_workers,
          data_name):
@@ -150,9 +149,6 @@ def main(no_of_workers,
     lmbd_results = []
     phi_results = []
     nu_results = []
-    lmbd_calculator = LmbdGridCalculator(data_set, mle_dict)
-    phi_calculator = PhiGridCalculator(data_set, mle_dict)
-    nu_calculator = NuGridCalculator(data_set, mle_dict)
 
     lmbd_vals = linspace(.05, 5.05, 100)
     phi_vals = linspace(.025, 5.025, 100)
@@ -174,34 +170,45 @@ def main(no_of_workers,
     nu_grid_lmbd = nu_grid_lmbd.reshape(no_nu_vals)
     nu_grid_phi = nu_grid_phi.reshape(no_nu_vals)
 
-    lmbd_params = [[lmbd_grid_phi[i], lmbd_grid_nu[i]] for i in range(no_lmbd_vals)]
-    phi_params = [[phi_grid_lmbd[i], phi_grid_nu[i]] for i in range(no_phi_vals)]
-    nu_params = [[nu_grid_lmbd[i], nu_grid_phi[i]] for i in range(no_nu_vals)]
-
-    with Pool(no_of_workers) as pool:
-        lmbd_results = pool.map(lmbd_calculator, lmbd_params)
-        phi_results = pool.map(phi_calculator, phi_params)
-        nu_results = pool.map(nu_calculator, nu_params)
-
-
-    lmbd_curve = [beta_poisson_loglh(
+    # Each task evaluates a whole block of the grid in one vectorised call
+    lmbd_params = list(zip(array_split(lmbd_grid_phi, no_of_workers),
+                           array_split(lmbd_grid_nu, no_of_workers)))
+    phi_params = list(zip(array_split(phi_grid_lmbd, no_of_workers),
+                          array_split(phi_grid_nu, no_of_workers)))
+    nu_params = list(zip(array_split(nu_grid_lmbd, no_of_workers),
+                         array_split(nu_grid_phi, no_of_workers)))
+
+    with Pool(no_of_workers,
+              initializer=init_worker,
+              initargs=(data_set, mle_dict)) as pool:
+        lmbd_results = pool.map(lmbd_grid_task, lmbd_params)
+        phi_results = pool.map(phi_grid_task, phi_params)
+        nu_results = pool.map(nu_grid_task, nu_params)
+
+
+    # The curves are masked like the grids, rather than left to whatever
+    # beta_poisson_loglh returns outside the parameter space
+    lmbd_curve = beta_poisson_loglh_grid(
                     data_set,
-                    lmbd_p,
+                    lmbd_vals,
                     mle_dict['beta-Poisson'][1],
-                    mle_dict['beta-Poisson'][2]) for lmbd_p in lmbd_vals]
-    phi_curve = [beta_poisson_loglh(
+                    mle_dict['beta-Poisson'][2],
+                    fill_value=INFEASIBLE_LLH)
+    phi_curve = beta_poisson_loglh_grid(
                     data_set,
                     mle_dict['beta-Poisson'][0],
-                    phi_p,
-                    mle_dict['beta-Poisson'][2]) for phi_p in phi_vals]
-    nu_curve = [beta_poisson_loglh(
+                    phi_vals,
+                    mle_dict['beta-Poisson'][2],
+                    fill_value=INFEASIBLE_LLH)
+    nu_curve = beta_poisson_loglh_grid(
                     data_set,
                     mle_dict['beta-Poisson'][0],
                     mle_dict['beta-Poisson'][1],
-                    nu_p) for nu_p in nu_vals]
-    lmbd_grid = array([r for r in lmbd_results]).reshape(len(nu_vals), len(phi_vals))
-    phi_grid = array([r for r in phi_results]).reshape(len(nu_vals), len(lmbd_vals))
-    nu_grid = array([r for r in nu_results]).reshape(len(phi_vals), len(lmbd_vals))
+                    nu_vals,
+                    fill_value=INFEASIBLE_LLH)
+    lmbd_grid = concatenate(lmbd_results).reshape(len(nu_vals), len(phi_vals))
+    phi_grid = concatenate(phi_results).reshape(len(nu_vals), len(lmbd_vals))
+    nu_grid = concatenate(nu_results).reshape(len(phi_vals), len(lmbd_vals))
 
     print('Sensitivity analysis took',get_time()-main_start,'seconds.')
 
@@ -0,0 +1,442 @@
+'''This script contains checks on the behaviour of the functions used in our
+study, which can be run with pytest.'''
+
+import numpy as np
+import pytest
+from scipy import optimize as opt
+from scipy import special as spsp
+from scipy import stats
+from datasets import guinea_ebola_data, plague_data, sk_mers_data
+from functions import (batch_solve_theta_mles, batch_solve_zip_mles,
+    bca_ci_from_bootstrap_samples, beta_poisson_extinction_prob,
+    beta_poisson_loglh, beta_poisson_loglh_grid, beta_poisson_logpmf_support,
+    beta_poisson_pgf, bootstrap_count_matrix, count_histogram, dist_cdf,
+    dist_pmf, dist_ppf, dist_sf, dist_table_cache_clear, dist_table_cache_info,
+    generate_mle_dict, generate_superspread_dict, generate_wald_ci_dicts,
+    geom_extinction_prob, geom_pgf, get_theta_mle, highest_density_region,
+    jackknife_acceleration, jackknife_count_matrix, log_hyp1f1_neg,
+    merge_quantile_sketches, neg_bin_extinction_prob, neg_bin_loglh_theta,
+    neg_bin_pgf, neg_bin_theta_score, poisson_extinction_prob, poisson_loglh,
+    poisson_pgf, profile_likelihood_ci, quantile_sketch, scott_bin_widths,
+    sketch_quantile, solve_theta_mle, solve_zip_mles, sparse_histogram,
+    superspread_prop, zip_extinction_prob, zip_loglh, zip_pgf)
+
+def test_solve_theta_mle_finds_root_of_score():
+    for data in [plague_data, sk_mers_data]:
+        theta = solve_theta_mle(data)
+        assert abs(neg_bin_theta_score(data, theta)) < 1e-8 * len(data)
+        lmbd = np.mean(data)
+        llh = neg_bin_loglh_theta(count_histogram(data), lmbd, theta)
+        for step in [0.99, 1.01]:
+            assert neg_bin_loglh_theta(count_histogram(data), lmbd,
+                                       step * theta) < llh
+
+def test_solve_theta_mle_returns_poisson_limit_without_overdispersion():
+    # Equi- and underdispersed data, and all-zero data, have their maximum
+    # likelihood in the Poisson limit theta->0
+    for data in [[1, 1, 1, 1], [0, 1, 2, 1, 0, 2], [0, 0, 0]]:
+        assert solve_theta_mle(data, theta_min=1e-6) == 1e-6
+
+def test_solve_theta_mle_is_not_bounded_by_initial_estimate():
+    theta = solve_theta_mle(sk_mers_data, theta_0=1.)
+    assert theta > 5
+    assert theta == pytest.approx(solve_theta_mle(sk_mers_data))
+
+def test_get_theta_mle_wraps_solve_theta_mle():
+    theta = get_theta_mle(plague_data, 1.)
+    assert isinstance(theta, float)
+    assert theta == solve_theta_mle(plague_data, 1.)
+
+def test_solve_zip_mles_maximises_likelihood():
+    lmbd, sigma = solve_zip_mles(sk_mers_data)
+    assert (1 - sigma) * lmbd == pytest.approx(np.mean(sk_mers_data))
+    llh = zip_loglh(sk_mers_data, lmbd, sigma)
+    for d_lmbd, d_sigma in [(1e-3, 0), (-1e-3, 0), (0, 1e-4), (0, -1e-4)]:
+        assert zip_loglh(sk_mers_data, lmbd + d_lmbd, sigma + d_sigma) < llh
+
+def test_solve_zip_mles_returns_poisson_fit_on_boundary():
+    # Data with no excess zeros, or with only zeros and ones, are fitted best
+    # by the Poisson distribution with the sample mean, sigma=0
+    for data in [[1, 2, 3, 2, 1], [0, 0, 0, 1, 1, 0, 1]]:
+        assert solve_zip_mles(data) == (pytest.approx(np.mean(data)), 0.0)
+    assert solve_zip_mles([0, 0, 0]) == (0.0, 0.0)
+
+def beta_poisson_logpmf_direct(x, lmbd, Phi, N):
+    # Each probability evaluated on its own from its 1F1 term
+    a = Phi * lmbd
+    b = Phi * N
+    return (x * np.log(N) - spsp.gammaln(x + 1) + spsp.gammaln(a + x) -
+            spsp.gammaln(a) - spsp.gammaln(b + x) + spsp.gammaln(b) +
+            log_hyp1f1_neg(a + x, b + x, N))
+
+@pytest.mark.parametrize('lmbd, Phi, N', [(1.3, 0.6, 5.), (0.8, 20., 1.5),
+                                          (2., 0.05, 400.)])
+def test_beta_poisson_logpmf_support_matches_direct_evaluation(lmbd, Phi, N):
+    x = np.arange(41)
+    logP = beta_poisson_logpmf_support(40, lmbd, Phi, N)
+    assert np.max(np.abs(logP - beta_poisson_logpmf_direct(x, lmbd, Phi, N))) < 1e-9
+    assert np.exp(logP).sum() <= 1 + 1e-12
+
+def test_beta_poisson_logpmf_support_matches_mpmath():
+    mpmath = pytest.importorskip('mpmath')
+    mpmath.mp.dps = 30
+    lmbd, Phi, N = 1.3, 0.6, 5.
+    logP = beta_poisson_logpmf_support(10, lmbd, Phi, N)
+    a = Phi * lmbd
+    b = Phi * N
+    for x in range(11):
+        P = (mpmath.power(N, x) / mpmath.factorial(x) * mpmath.rf(a, x) /
+             mpmath.rf(b, x) * mpmath.hyp1f1(a + x, b + x, -N))
+        assert logP[x] == pytest.approx(float(mpmath.log(P)), abs=1e-10)
+
+def test_beta_poisson_loglh_grid_masks_infeasible_parameters():
+    lmbd = 2.
+    nu = np.linspace(0., 1., 11)
+    llh = beta_poisson_loglh_grid(plague_data, lmbd, 0.5, nu)
+    feasible = nu <= 1 / lmbd
+    assert np.isnan(llh[~feasible]).all()
+    assert llh[feasible] == pytest.approx(
+        beta_poisson_loglh(plague_data, lmbd, 0.5, nu[feasible]))
+    assert (beta_poisson_loglh_grid(plague_data, lmbd, 0.5, nu,
+                                    fill_value=0.)[~feasible] == 0).all()
+
+DIST_PARAMS = [('poisson', 1.5),
+               ('geometric', 1.5),
+               ('negative binomial', (1.5, 2.)),
+               ('zip', (3., 0.4)),
+               ('beta-Poisson', (1.5, 0.5, 0.2)),
+               ('beta-Poisson', (1.5, 0.5, 0.))]
+
+@pytest.mark.parametrize('model, params', DIST_PARAMS)
+def test_dist_functions_are_consistent(model, params):
+    x = np.arange(60)
+    pmf = dist_pmf(model, x, params)
+    cdf = dist_cdf(model, x, params)
+    sf = dist_sf(model, x, params)
+    assert np.all(pmf >= 0)
+    assert np.all(np.diff(cdf) >= 0)
+    assert np.all(np.diff(sf) <= 0)
+    assert np.max(np.abs(cdf + sf - 1)) < 1e-10
+    assert np.max(np.abs(np.cumsum(pmf) - cdf)) < 1e-12
+    # The ppf inverts the cdf at every point of the support with positive mass
+    support = x[pmf > 1e-10]
+    assert np.all(dist_ppf(model, dist_cdf(model, support, params),
+                           params) == support)
+    assert dist_pmf(model, 2.5, params) == 0
+    assert dist_cdf(model, -1, params) == 0
+
+def test_dist_pmf_matches_scipy():
+    # Points beyond the end of the table, with mass below its tolerance, have
+    # probability zero
+    x = np.arange(30)
+    assert np.allclose(dist_pmf('poisson', x, 1.5), stats.poisson.pmf(x, 1.5),
+                       rtol=1e-12, atol=1e-12)
+    assert np.allclose(dist_pmf('negative binomial', x, (1.5, 2.)),
+                       stats.nbinom.pmf(x, 0.75, 1 / 3), rtol=1e-12, atol=1e-12)
+
+def test_dist_tables_are_cached():
+    dist_table_cache_clear()
+    dist_cdf('poisson', 3, 1.5)
+    dist_sf('poisson', 3, 1.5)
+    info = dist_table_cache_info()
+    assert info['misses'] == 1
+    assert info['hits'] == 1
+
+PGFS = [(poisson_pgf, (1.5,), 1.5),
+        (geom_pgf, (1.5,), 1.5),
+        (neg_bin_pgf, (1.5, 2.), 1.5),
+        (zip_pgf, (3., 0.4), 1.8),
+        (beta_poisson_pgf, (1.5, 0.5, 5.), 1.5)]
+
+@pytest.mark.parametrize('pgf, params, mean', PGFS)
+def test_pgf_derivatives_match_finite_differences(pgf, params, mean):
+    s = np.linspace(0, 0.99, 12)
+    h = 1e-5
+    G, dG, d2G = pgf(s, *params, derivatives=True)
+    assert np.allclose(dG, (pgf(s + h, *params) - pgf(s - h, *params)) / (2 * h),
+                       rtol=1e-7, atol=1e-9)
+    assert np.allclose(d2G, (pgf(s + h, *params, derivatives=True)[1] -
+                             pgf(s - h, *params, derivatives=True)[1]) / (2 * h),
+                       rtol=1e-6, atol=1e-8)
+    assert pgf(1., *params) == pytest.approx(1)
+    assert pgf(1., *params, derivatives=True)[1] == pytest.approx(mean)
+
+EXTINCTION = [(poisson_extinction_prob, poisson_pgf, [(0.8,), (1.5,), (4.,)]),
+              (geom_extinction_prob, geom_pgf, [(0.8,), (1.5,), (4.,)]),
+              (neg_bin_extinction_prob, neg_bin_pgf,
+               [(0.8, 2.), (1.5, 0.3), (4., 2.)]),
+              (zip_extinction_prob, zip_pgf,
+               [(1.5, 0.4), (3., 0.4), (6., 0.1)]),
+              (beta_poisson_extinction_prob, beta_poisson_pgf,
+               [(0.8, 0.5, 5.), (1.5, 0.5, 5.), (4., 2., 30.)])]
+
+def scalar_extinction_prob(pgf, params):
+    # The scalar solve the batched solver replaced
+    mean = pgf(1., *params, derivatives=True)[1]
+    if mean <= 1:
+        return 1
+    return opt.brentq(lambda s: pgf(s, *params) - s, 0, 1 - 1e-6, xtol=1e-14)
+
+@pytest.mark.parametrize('extinction_prob, pgf, param_sets', EXTINCTION)
+def test_batched_extinction_matches_scalar_solver(extinction_prob, pgf,
+                                                  param_sets):
+    expected = [scalar_extinction_prob(pgf, params) for params in param_sets]
+    for params, q in zip(param_sets, expected):
+        assert extinction_prob(*params) == pytest.approx(q, abs=1e-12)
+    batch = extinction_prob(*[np.array(p) for p in zip(*param_sets)])
+    assert np.allclose(batch, expected, rtol=0, atol=1e-12)
+
+def bootstrap_rows(data, no_samples):
+    values, count_matrix = bootstrap_count_matrix(
+        data, no_samples, rng=np.random.default_rng(1))
+    return values, count_matrix
+
+def test_batch_solve_theta_mles_matches_serial_solver():
+    values, count_matrix = bootstrap_rows(sk_mers_data, 40)
+    # A row without overdispersion is solved by the Poisson limit
+    count_matrix[0] = 0
+    count_matrix[0, values == 1] = 10
+    theta = batch_solve_theta_mles(values, count_matrix, theta_min=1e-6)
+    assert theta[0] == 1e-6
+    for i in range(len(count_matrix)):
+        assert theta[i] == pytest.approx(
+            solve_theta_mle((values, count_matrix[i]), theta_min=1e-6),
+            rel=1e-8)
+
+def test_batch_solve_zip_mles_matches_serial_solver():
+    values, count_matrix = bootstrap_rows(sk_mers_data, 40)
+    # Rows with no excess zeros, and with only zeros, are on the boundary
+    # sigma=0
+    count_matrix[0] = 0
+    count_matrix[0, values == 1] = 10
+    count_matrix[1] = 0
+    count_matrix[1, values == 0] = 10
+    lmbd, sigma = batch_solve_zip_mles(values, count_matrix)
+    assert (lmbd[0], sigma[0]) == (1., 0.)
+    assert (lmbd[1], sigma[1]) == (0., 0.)
+    for i in range(len(count_matrix)):
+        serial = solve_zip_mles((values, count_matrix[i]))
+        assert lmbd[i] == pytest.approx(serial[0], rel=1e-10, abs=1e-12)
+        assert sigma[i] == pytest.approx(serial[1], rel=1e-8, abs=1e-12)
+
+def merged_sketch(samples, no_chunks):
+    sketch = None
+    for chunk in np.array_split(samples, no_chunks):
+        sketch = merge_quantile_sketches([sketch, quantile_sketch(chunk)])
+    return sketch
+
+def test_merged_quantile_sketch_matches_numpy_quantile():
+    samples = np.random.default_rng(2).standard_normal(20000)
+    sketch = merged_sketch(samples, 20)
+    assert sketch[1].sum() == len(samples)
+    q = np.array([0.001, 0.025, 0.25, 0.5, 0.75, 0.975, 0.999])
+    estimate = sketch_quantile(sketch, q)
+    # The error is measured in rank, which the t-digest bounds most tightly in
+    # the tails
+    rank_error = np.searchsorted(np.sort(samples), estimate) / len(samples) - q
+    assert np.all(np.abs(rank_error) < 1e-3 + 0.01 * q * (1 - q))
+    assert sketch_quantile(sketch, 0) == samples.min()
+    assert sketch_quantile(sketch, 1) == samples.max()
+
+def test_merged_quantile_sketch_is_exact_for_tied_samples():
+    samples = np.random.default_rng(3).poisson(4., 5000).astype(float)
+    samples[::100] = np.nan
+    sketch = merged_sketch(samples, 7)
+    q = np.array([0.025, 0.3, 0.5, 0.975])
+    assert np.array_equal(sketch_quantile(sketch, q),
+                          np.quantile(samples[np.isfinite(samples)], q))
+
+def test_highest_density_region_is_smallest_covering_set():
+    weights = np.random.default_rng(4).gamma(0.5, size=(30, 40))
+    region, bounds = highest_density_region(weights, 0.9)
+    total = weights.sum()
+    assert weights[region].sum() >= 0.9 * total
+    # Every cell in the region outweighs every cell outside it, and the
+    # lightest cell in it is needed to reach the mass
+    assert weights[region].min() > weights[~region].max()
+    assert weights[region].sum() - weights[region].min() < 0.9 * total
+    rows, cols = np.nonzero(region)
+    assert bounds == [[rows.min(), rows.max()], [cols.min(), cols.max()]]
+
+def test_highest_density_region_keeps_tied_cells_together():
+    region, bounds = highest_density_region([1., 3., 3., 2., 1.], 0.5)
+    assert list(region) == [False, True, True, False, False]
+    assert bounds == [[1, 2]]
+
+def test_highest_density_region_of_normal_density():
+    x = np.linspace(-5, 5, 10001)
+    region, bounds = highest_density_region(stats.norm.pdf(x), 0.95, [x])
+    assert bounds[0] == pytest.approx([-1.96, 1.96], abs=2e-3)
+
+def test_sparse_histogram_matches_dense_histogram():
+    samples = np.random.default_rng(5).gamma(2., size=(5000, 2))
+    # A far outlier only adds one cell
+    samples[0] = [1e6, 1e6]
+    widths = np.array([0.25, 0.5])
+    cells, counts = sparse_histogram(samples, widths)
+    assert counts.sum() == len(samples)
+    assert len(np.unique(cells, axis=0)) == len(cells)
+    dense, edges = np.histogramdd(samples[1:], bins=[
+        np.arange(0, 201) * widths[0], np.arange(0, 201) * widths[1]])
+    assert dense.sum() == len(samples) - 1
+    for cell, count in zip(cells[:-1], counts[:-1]):
+        assert dense[tuple(cell)] == count
+    assert list(cells[-1]) == [4000000, 2000000]
+
+def test_sparse_highest_density_region_covers_samples():
+    samples = np.random.default_rng(6).standard_normal((20000, 2))
+    cells, counts = sparse_histogram(samples, scott_bin_widths(samples))
+    region, bounds = highest_density_region(counts, 0.95, cells=cells)
+    assert counts[region].sum() >= 0.95 * len(samples)
+    assert counts[region].min() > counts[~region].max()
+    assert bounds == [[cells[region, 0].min(), cells[region, 0].max()],
+                      [cells[region, 1].min(), cells[region, 1].max()]]
+
+def test_scott_bin_widths():
+    samples = np.random.default_rng(7).standard_normal((1000, 3))
+    samples[:, 2] = 1.
+    widths = scott_bin_widths(samples)
+    assert widths[:2] == pytest.approx(np.std(samples[:, :2], axis=0) *
+                                       1000**(-1 / 7))
+    assert widths[2] == 0.01
+
+def test_profile_likelihood_ci_matches_likelihood_ratio_interval():
+    # The Poisson model has no other parameters to profile out, so its
+    # interval is where the log likelihood drops by half the chi-square
+    # critical value
+    lmbd = np.mean(plague_data)
+    drop = stats.chi2.ppf(0.95, 1) / 2
+    def excess(x):
+        return (poisson_loglh(plague_data, x) -
+                poisson_loglh(plague_data, lmbd) + drop)
+    expected = [opt.brentq(excess, 1e-3, lmbd, xtol=1e-12),
+                opt.brentq(excess, lmbd, 10 * lmbd, xtol=1e-12)]
+    ci = profile_likelihood_ci(plague_data, 'poisson', lmbd, 0)
+    assert ci == pytest.approx(expected, rel=1e-6)
+
+def test_profile_likelihood_ci_uses_chi_square_mixture_at_boundary():
+    # Without excess zeros the ZIP fit is on the boundary sigma=0, so the
+    # interval for sigma starts there and its upper end uses the critical
+    # value of the 50:50 mixture of chi-square(0) and chi-square(1)
+    data = [1, 2, 3, 2, 1] * 4
+    mle = solve_zip_mles(data)
+    assert mle[1] == 0
+    ci = profile_likelihood_ci(data, 'zip', mle, 1)
+    assert ci[0] == 0
+    profile = opt.minimize_scalar(lambda x: -zip_loglh(data, x, ci[1]),
+                                  bounds=(0.1, 20), method='bounded',
+                                  options={'xatol': 1e-10})
+    drop = zip_loglh(data, *mle) + profile.fun
+    assert drop == pytest.approx(stats.chi2.ppf(0.9, 1) / 2, rel=1e-5)
+
+def test_wald_intervals_of_poisson_model():
+    # The Poisson information is n/lambda, and its P[0] is exp(-lambda)
+    data = sk_mers_data
+    lmbd = np.mean(data)
+    mle_dict = {'poisson' : lmbd}
+    ci_dict, var_ci_dict, od_ci_dict, superspread_ci_dict, p0_ci_dict, \
+        extinction_ci_dict = generate_wald_ci_dicts(data, mle_dict)
+    se = np.sqrt(lmbd / len(data))
+    z = stats.norm.ppf(0.975)
+    assert ci_dict['poisson'] == pytest.approx([lmbd - z * se, lmbd + z * se],
+                                               rel=1e-6)
+    assert var_ci_dict['poisson'] == pytest.approx(ci_dict['poisson'],
+                                                   rel=1e-6)
+    assert p0_ci_dict['poisson'] == pytest.approx(
+        [np.exp(-lmbd) * (1 - z * se), np.exp(-lmbd) * (1 + z * se)], rel=1e-6)
+    assert 'poisson' not in od_ci_dict
+
+def test_count_jackknife_matches_full_jackknife():
+    # For the sample mean the acceleration is the sample skewness term
+    # sum(d^3)/(6 sum(d^2)^1.5), which the count-based jackknife reproduces
+    # with one row per distinct value
+    values, counts, count_matrix = jackknife_count_matrix(sk_mers_data)
+    assert np.all(count_matrix.sum(axis=1) == len(sk_mers_data) - 1)
+    estimates = count_matrix @ values / count_matrix.sum(axis=1)
+    acceleration = jackknife_acceleration(estimates, counts)
+    data = np.asarray(sk_mers_data, dtype=float)
+    full = np.array([np.delete(data, i).mean() for i in range(len(data))])
+    assert acceleration == pytest.approx(
+        jackknife_acceleration(full, np.ones(len(full))), rel=1e-10)
+    d = data - data.mean()
+    assert acceleration == pytest.approx(
+        np.sum(d**3) / (6 * np.sum(d**2)**1.5), rel=1e-10)
+
+def test_bca_interval_without_bias_or_acceleration_is_percentile_interval():
+    samples = np.arange(-1000., 1001.)
+    assert bca_ci_from_bootstrap_samples(samples, 0., 95, 0.) == \
+        pytest.approx(np.percentile(samples, [2.5, 97.5]))
+
+def test_bca_interval_corrects_normal_bias():
+    # Bootstrap samples which are normal about mle + shift give the bias
+    # correction -shift, and with no acceleration the interval is the normal
+    # interval reflected about the MLE
+    shift = 0.3
+    samples = stats.norm.ppf((np.arange(200000) + 0.5) / 200000) + shift
+    ci = bca_ci_from_bootstrap_samples(samples, 0., 95, 0.)
+    z = stats.norm.ppf(0.975)
+    assert ci == pytest.approx([-shift - z, -shift + z], abs=1e-3)
+
+def test_bca_interval_applies_acceleration():
+    # With no bias correction the endpoints of normal samples are
+    # z/(1-a z) for the normal quantiles z
+    samples = stats.norm.ppf((np.arange(200000) + 0.5) / 200000)
+    ci = bca_ci_from_bootstrap_samples(samples, 0., 95, 0.1)
+    z = stats.norm.ppf(0.975)
+    assert ci == pytest.approx([-z / (1 + 0.1 * z), z / (1 - 0.1 * z)],
+                               abs=1e-3)
+
+def test_wald_intervals_are_clipped_to_natural_bounds():
+    # A small, highly overdispersed dataset whose Wald intervals run past the
+    # bounds of several quantities
+    data = [0] * 8 + [1, 9]
+    mle_dict = generate_mle_dict(data, 1., 1., 0.1, 1., 0.5)
+    ci_dict, var_ci_dict, od_ci_dict, superspread_ci_dict, p0_ci_dict, \
+        extinction_ci_dict = generate_wald_ci_dicts(data, mle_dict)
+    assert ci_dict['negative binomial'][0][0] == 0.0
+    assert ci_dict['beta-Poisson'][0][0] == 0.0
+    assert ci_dict['zip'][1][1] == 1.0
+    assert p0_ci_dict['negative binomial'][1] == 1.0
+    lmbd = mle_dict['beta-Poisson'][0]
+    assert ci_dict['beta-Poisson'][2][1] <= 1 / lmbd
+    for ci in [ci_dict['poisson'], ci_dict['geometric']] + [
+            param_ci for model in ['negative binomial', 'zip', 'beta-Poisson']
+            for param_ci in ci_dict[model]]:
+        assert all(type(x) is float for x in ci)
+        assert 0 <= ci[0] <= ci[1]
+    for derived_ci_dict in [p0_ci_dict, superspread_ci_dict,
+                            extinction_ci_dict]:
+        for ci in derived_ci_dict.values():
+            assert all(type(x) is float for x in ci)
+            assert 0 <= ci[0] <= ci[1] <= 1
+
+def test_superspread_dict_uses_beta_poisson_parameters_near_limit():
+    # Point estimates and Wald intervals share superspread_prop, so a
+    # beta-Poisson fit close to, but outside, the negative binomial limit is
+    # described by its own parameters in both
+    data = guinea_ebola_data
+    mle_dict = generate_mle_dict(data, 1., 1., 0.1, 1., 0.5)
+    assert 1e-4 < mle_dict['beta-Poisson'][2] < 5e-2
+    superspread_dict = generate_superspread_dict(data, mle_dict)
+    bd = superspread_dict['boundary']
+    for model in ['geometric', 'negative binomial', 'zip', 'beta-Poisson']:
+        assert superspread_dict[model] == superspread_prop(model, bd,
+                                                           mle_dict[model])
+        assert superspread_dict[model] == dist_sf(model, bd, mle_dict[model])
+    assert superspread_dict['poisson'] == .01
+    superspread_ci_dict = generate_wald_ci_dicts(data, mle_dict)[3]
+    for model, ci in superspread_ci_dict.items():
+        assert ci[0] <= superspread_dict[model] <= ci[1]
+
+def test_wald_intervals_of_zip_on_sigma_boundary():
+    # Underdispersed data put the ZIP fit on sigma=0, where sigma has no Wald
+    # interval and lambda has that of the Poisson
+    data = [0, 1, 1, 1, 1, 2, 2, 1, 1, 2]
+    mle_dict = generate_mle_dict(data, 1., 1., 0.1, 1., 0.5)
+    assert mle_dict['zip'][1] == 0
+    mle_dict = {model : mle_dict[model] for model in ['poisson', 'zip']}
+    ci_dict, var_ci_dict, od_ci_dict, superspread_ci_dict, p0_ci_dict, \
+        extinction_ci_dict = generate_wald_ci_dicts(data, mle_dict)
+    assert np.isnan(ci_dict['zip'][1]).all()
+    assert ci_dict['zip'][0] == pytest.approx(ci_dict['poisson'], rel=1e-6)
+    assert p0_ci_dict['zip'] == pytest.approx(p0_ci_dict['poisson'], rel=1e-6)
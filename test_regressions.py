@@ -0,0 +1,129 @@
+'''This script contains regression checks on the numerics of our analysis,
+which can be run with pytest.'''
+
+import importlib.util
+import numpy as np
+import pytest
+import sys
+from os.path import abspath, dirname
+from functions import log_hyp1f1_neg
+
+DRIVER_PATH = dirname(abspath(__file__)) + '/parallel-confidence-intervals.py'
+
+@pytest.fixture
+def driver(tmp_path, monkeypatch):
+    # The bootstrap driver writes its outputs under the working directory, so
+    # it is loaded and run from a temporary one. It is registered under a
+    # module name so that its worker tasks can be found by the pool.
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location(
+        'parallel_confidence_intervals', DRIVER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, spec.name, module)
+    spec.loader.exec_module(module)
+    return module
+
+def test_log_hyp1f1_neg_matches_mpmath():
+    # Arguments are drawn from the ranges explored by the beta-Poisson fits,
+    # a=x+Phi*lambda, b=x+Phi*N and z=N with nu>=1e-4, Phi<=50 and counts up
+    # to 100
+    mpmath = pytest.importorskip('mpmath')
+    mpmath.mp.dps = 30
+    rng = np.random.default_rng(0)
+    no_points = 200
+    x = rng.integers(0, 101, no_points)
+    lmbd = 10**rng.uniform(-1, 1, no_points)
+    phi = 10**rng.uniform(-4, np.log10(50), no_points)
+    N = lmbd * 10**rng.uniform(0, 4 - np.log10(lmbd), no_points)
+    a = x + phi * lmbd
+    b = x + phi * N
+    z = N
+    log_hyp = log_hyp1f1_neg(a, b, z)
+    expected = np.array([float(mpmath.log(mpmath.hyp1f1(a[i], b[i], -z[i])))
+                         for i in range(no_points)])
+    assert np.max(np.abs(log_hyp - expected)) < 1e-10
+
+def test_log_hyp1f1_neg_undefined_for_a_above_b():
+    assert np.isnan(log_hyp1f1_neg(5., 1., 10.))
+    assert np.all(np.isnan(log_hyp1f1_neg([2., 3.], 1., [0.5, 100.])))
+
+def test_batched_fits_agree_with_serial_fits(driver):
+    # Over bootstrap replicates of every dataset, the batched beta-Poisson
+    # fits agree with those made one at a time to within BP_FIT_LLH_TOL in
+    # log likelihood
+    assert driver.check_batch_fits(40, seed=1) == 0
+
+def run_bootstrap(driver, path, monkeypatch, no_of_workers, no_samples):
+    # Runs a short bootstrap in path and returns the bytes of its outputs
+    (path / 'outputs' / 'mles').mkdir(parents=True, exist_ok=True)
+    monkeypatch.chdir(path)
+    driver.main(no_of_workers, no_samples, 'plague_data', seed=1,
+                batch_size=20)
+    return [(path / 'outputs' / 'mles' / ('plague_data' + suffix)).read_bytes()
+            for suffix in ['_results.pkl', '_bootstrap_precision.pkl']]
+
+def test_bootstrap_outputs_do_not_depend_on_how_they_are_run(driver,
+                                                             tmp_path,
+                                                             monkeypatch):
+    # Outputs are the same whatever the number of workers, and whether the
+    # run is interrupted and resumed or extended from a shorter run
+    serial = run_bootstrap(driver, tmp_path / 'serial', monkeypatch, 1, 60)
+    assert run_bootstrap(driver, tmp_path / 'parallel', monkeypatch,
+                         4, 60) == serial
+
+    store_path = tmp_path / 'parallel' / driver.BOOTSTRAP_STORE_DIR / 'plague_data'
+    last_batch = sorted(store_path.glob('batch_*.npz'))[-1]
+    last_batch.unlink()
+    assert run_bootstrap(driver, tmp_path / 'parallel', monkeypatch,
+                         4, 60) == serial
+
+    run_bootstrap(driver, tmp_path / 'extended', monkeypatch, 4, 20)
+    assert run_bootstrap(driver, tmp_path / 'extended', monkeypatch,
+                         4, 60) == serial
+
+def test_failed_batched_fit_falls_back_only_for_failing_row(driver,
+                                                            monkeypatch):
+    # A batched fit which raises on one row is refitted one row at a time
+    # only for that row, and a row which also fails on its own is recorded
+    # with the reason it failed
+    calculator = driver.MLECalculator(driver.data_dict['plague_data'])
+    replicate_rows = driver.bootstrap_replicate_counts(
+        (calculator.values, calculator.counts), np.arange(8), 1, (0,))[1]
+    bad_row = replicate_rows[5].copy()
+    fit_batch = driver.MLECalculator._fit_batch
+    fit_replicate = driver.MLECalculator._fit_replicate
+
+    def failing_fit_batch(self, rows):
+        if (rows == bad_row).all(axis=1).any():
+            raise FloatingPointError
+        return fit_batch(self, rows)
+
+    def failing_fit_replicate(self, row):
+        if (row == bad_row).all():
+            raise np.linalg.LinAlgError
+        return fit_replicate(self, row)
+
+    monkeypatch.setattr(driver.MLECalculator, '_fit_batch', failing_fit_batch)
+    monkeypatch.setattr(driver.MLECalculator, '_fit_replicate',
+                        failing_fit_replicate)
+    records = calculator.fit_batch(replicate_rows)
+    failed = (replicate_rows == bad_row).all(axis=1)
+    assert (records['serial fallback'] == failed).all()
+    assert (records['status'][failed] == driver.FIT_FAILED).all()
+    assert (records['status'][~failed] != driver.FIT_FAILED).all()
+    assert driver.count_fit_errors(records) == {
+        'LinAlgError' : failed.sum(), 'FloatingPointError' : 0,
+        'ZeroDivisionError' : 0, 'ValueError' : 0}
+
+def test_fits_do_not_swallow_keyboard_interrupt(driver, monkeypatch):
+    def interrupted_fit(self, rows):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(driver.MLECalculator, '_fit_batch', interrupted_fit)
+    monkeypatch.setattr(driver.MLECalculator, '_fit_replicate',
+                        interrupted_fit)
+    calculator = driver.MLECalculator(driver.data_dict['plague_data'])
+    with pytest.raises(KeyboardInterrupt):
+        calculator.fit_batch(calculator.counts[None, :])
+    with pytest.raises(KeyboardInterrupt):
+        calculator(calculator.counts)